@@ -0,0 +1,152 @@
+import re
+import gzip
+import hashlib
+import logging
+import mimetypes
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 这些类型压缩收益明显，图片、音频等已压缩格式不再处理
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# 太小的文件压缩后可能反而变大，不值得
+MIN_COMPRESS_SIZE = 256
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+_STATIC_REF = re.compile(r'(["\'])/static/([^"\'?#]+)\1')
+
+
+class Asset:
+    def __init__(self, rel_path: str, content: bytes, content_type: str):
+        self.rel_path = rel_path
+        self.content_type = content_type
+        digest = hashlib.sha256(content).hexdigest()
+        self.digest = digest[:12]
+        # 不同编码的表示各自使用独立的强ETag
+        self.variants: Dict[str, bytes] = {"identity": content}
+        self.etags: Dict[str, str] = {"identity": f'"{digest[:32]}"'}
+
+        if content_type.startswith(COMPRESSIBLE_TYPES) and len(content) >= MIN_COMPRESS_SIZE:
+            gz = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(gz) < len(content):
+                self.variants["gzip"] = gz
+                self.etags["gzip"] = f'"{digest[:32]}-gz"'
+            if brotli is not None:
+                br = brotli.compress(content, quality=11)
+                if len(br) < len(content):
+                    self.variants["br"] = br
+                    self.etags["br"] = f'"{digest[:32]}-br"'
+
+    @property
+    def hashed_path(self) -> str:
+        path = Path(self.rel_path)
+        return str(path.with_name(f"{path.stem}.{self.digest}{path.suffix}")).replace("\\", "/")
+
+    def choose_encoding(self, accept_encoding: str) -> str:
+        """根据 Accept-Encoding 选择编码：在有预压缩版本的编码中选q值最高的，q值相同时优先 br"""
+        accepted = {}
+        for part in accept_encoding.split(","):
+            name, *params = [item.strip() for item in part.split(";")]
+            q = 1.0
+            for param in params:
+                if param.lower().startswith("q="):
+                    try:
+                        q = float(param[2:])
+                    except ValueError:
+                        q = 0.0
+            if name:
+                accepted[name.lower()] = q
+        best, best_q = "identity", 0.0
+        for encoding in ("br", "gzip"):
+            q = accepted.get(encoding, accepted.get("*", 0.0))
+            if encoding in self.variants and q > best_q:
+                best, best_q = encoding, q
+        return best
+
+
+class StaticAssetStore:
+    """
+    启动时把静态资源读入内存并预压缩（gzip/brotli），生成带内容哈希的文件名
+    带哈希的地址永久缓存，原始地址与HTML页面通过ETag协商缓存
+    """
+
+    def __init__(self, static_dir: Path):
+        self.static_dir = static_dir
+        self.assets: Dict[str, Asset] = {}
+        self.hashed: Dict[str, Asset] = {}
+        self.pages: Dict[str, Asset] = {}
+        self.load()
+
+    def load(self):
+        self.assets.clear()
+        self.hashed.clear()
+        self.pages.clear()
+        for file_path in sorted(self.static_dir.rglob("*")):
+            if not file_path.is_file():
+                continue
+            rel_path = file_path.relative_to(self.static_dir).as_posix()
+            content_type = mimetypes.guess_type(file_path.name)[0] or "application/octet-stream"
+            if content_type.startswith("text/") or content_type == "application/javascript":
+                content_type += "; charset=utf-8"
+            asset = Asset(rel_path, file_path.read_bytes(), content_type)
+            self.assets[rel_path] = asset
+            self.hashed[asset.hashed_path] = asset
+        logger.info(f"静态资源加载完成，共 {len(self.assets)} 个文件，brotli可用: {brotli is not None}")
+
+    def url_for(self, rel_path: str) -> str:
+        asset = self.assets.get(rel_path)
+        return f"/static/{asset.hashed_path}" if asset else f"/static/{rel_path}"
+
+    def page(self, rel_path: str) -> Asset:
+        """返回引用已替换为带哈希地址的HTML页面"""
+        page = self.pages.get(rel_path)
+        if page is None:
+            html = self.assets[rel_path].variants["identity"].decode("utf-8")
+            html = _STATIC_REF.sub(lambda m: f"{m.group(1)}{self.url_for(m.group(2))}{m.group(1)}", html)
+            page = Asset(rel_path, html.encode("utf-8"), "text/html; charset=utf-8")
+            self.pages[rel_path] = page
+        return page
+
+    def lookup(self, path: str) -> Optional[Asset]:
+        return self.hashed.get(path) or self.assets.get(path)
+
+    def is_hashed(self, path: str) -> bool:
+        return path in self.hashed
+
+
+def asset_response(request: Request, asset: Asset, cache_control: str) -> Response:
+    """
+    构造静态资源响应，处理编码协商与 If-None-Match 条件请求
+    :param request: 请求
+    :param asset: 静态资源
+    :param cache_control: Cache-Control 头
+    :return: 200 或 304 响应
+    """
+    encoding = asset.choose_encoding(request.headers.get("accept-encoding", ""))
+    etag = asset.etags[encoding]
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in candidates or etag in candidates:
+            return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    body = b"" if request.method == "HEAD" else asset.variants[encoding]
+    response = Response(content=body, media_type=asset.content_type, headers=headers)
+    if request.method == "HEAD":
+        response.headers["Content-Length"] = str(len(asset.variants[encoding]))
+    return response
@@ -0,0 +1,206 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def file_digest(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """计算文件内容的SHA-1摘要"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AudioStore:
+    """
+    音频存储管理：按哈希分片的子目录 + SQLite索引 + 容量上限内的LRU淘汰
+    仍被有效播客引用的文件不会被淘汰，查找与清理都只走索引，不扫描目录
+    """
+
+    def __init__(self, root: Path, max_bytes: int, pin_ttl_seconds: int = 30 * 24 * 3600):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.pin_ttl_seconds = pin_ttl_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.root / "index.db"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                content_id TEXT PRIMARY KEY,
+                rel_path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                kind TEXT NOT NULL DEFAULT 'segment',
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                digest TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_lru ON entries(kind, last_access);
+            CREATE TABLE IF NOT EXISTS pins (
+                podcast_id TEXT NOT NULL,
+                content_id TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (podcast_id, content_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_pins_content ON pins(content_id, expires_at);
+        """)
+        # 兼容早期没有 digest 列的索引
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(entries)")}
+        if "digest" not in columns:
+            self._db.execute("ALTER TABLE entries ADD COLUMN digest TEXT")
+        # 早期的历史版本清单（{podcast_id}_v{n}）与最新清单同属 podcast，改为可淘汰的 podcast_version
+        self._db.execute("UPDATE entries SET kind = 'podcast_version' WHERE kind = 'podcast' AND content_id GLOB '*_v[0-9]*'")
+        self._db.commit()
+        self.total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        logger.info(f"音频存储初始化完成: {self.root}，已用 {self.total_bytes} 字节，上限 {self.max_bytes} 字节")
+
+    @staticmethod
+    def _shard(content_id: str) -> str:
+        digest = hashlib.md5(content_id.encode()).hexdigest()
+        return f"{digest[:2]}/{digest[2:4]}"
+
+    def path_for(self, content_id: str, ext: str) -> Path:
+        """
+        返回内容ID对应的存储路径（两级哈希分片），并确保目录存在
+        :param content_id: 内容ID
+        :param ext: 文件扩展名
+        :return: 文件路径
+        """
+        path = self.root / self._shard(content_id) / f"{content_id}.{ext}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def add(self, content_id: str, path: Path, kind: str = "segment", digest: Optional[str] = None) -> None:
+        """
+        登记新写入的文件，超出容量上限时触发淘汰
+        :param content_id: 内容ID
+        :param path: 文件路径（必须位于存储目录内）
+        :param kind: 类型，segment 与 podcast_version（历史版本清单）参与LRU淘汰，podcast 清单不参与
+        :param digest: 文件内容摘要，用作强ETag；不传时在登记时计算
+        """
+        if digest is None:
+            digest = file_digest(path)
+        size = Path(path).stat().st_size
+        rel_path = Path(path).relative_to(self.root).as_posix()
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT size FROM entries WHERE content_id = ?", (content_id,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (content_id, rel_path, size, kind, created_at, last_access, digest) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (content_id, rel_path, size, kind, now, now, digest)
+            )
+            self._db.commit()
+            self.total_bytes += size - (row[0] if row else 0)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def get(self, content_id: str) -> Optional[Path]:
+        """
+        按内容ID查找文件并刷新访问时间；文件已被外部删除时同步清理索引
+        :param content_id: 内容ID
+        :return: 文件路径，不存在时返回 None
+        """
+        entry = self.get_entry(content_id)
+        return entry["path"] if entry else None
+
+    def get_entry(self, content_id: str) -> Optional[Dict]:
+        """
+        按内容ID查找索引记录并刷新访问时间
+        :param content_id: 内容ID
+        :return: 包含 path、size、kind、digest 的记录，不存在时返回 None
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT rel_path, size, kind, digest FROM entries WHERE content_id = ?", (content_id,)
+            ).fetchone()
+            if not row:
+                return None
+            path = self.root / row[0]
+            if not path.exists():
+                self._db.execute("DELETE FROM entries WHERE content_id = ?", (content_id,))
+                self._db.commit()
+                self.total_bytes -= row[1]
+                return None
+            self._db.execute("UPDATE entries SET last_access = ? WHERE content_id = ?", (time.time(), content_id))
+            self._db.commit()
+        return {"content_id": content_id, "path": path, "size": row[1], "kind": row[2], "digest": row[3]}
+
+    def content_id_for(self, path: str) -> Optional[str]:
+        """根据文件路径反查内容ID（文件名即内容ID）"""
+        if not path:
+            return None
+        return Path(path).stem
+
+    def pin(self, podcast_id: str, content_ids: Iterable[str]) -> None:
+        """
+        标记播客引用的文件，在有效期内不会被淘汰
+        :param podcast_id: 播客ID
+        :param content_ids: 被引用的内容ID
+        """
+        expires_at = time.time() + self.pin_ttl_seconds
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO pins (podcast_id, content_id, expires_at) VALUES (?, ?, ?)",
+                [(podcast_id, cid, expires_at) for cid in content_ids if cid]
+            )
+            self._db.commit()
+
+    def release(self, podcast_id: str) -> None:
+        """解除播客对文件的引用"""
+        with self._lock:
+            self._db.execute("DELETE FROM pins WHERE podcast_id = ?", (podcast_id,))
+            self._db.commit()
+
+    def evict(self) -> List[str]:
+        """
+        按最近最少使用顺序删除未被有效播客引用的音频，直到回到容量上限以内
+        历史版本清单排在所有可淘汰音频之后，音频淘汰完仍超出上限时才删除
+        :return: 被淘汰的内容ID
+        """
+        evicted = []
+        with self._lock:
+            # 工作进程也会写入同一个索引，以数据库中的实际占用为准
+            self.total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            now = time.time()
+            self._db.execute("DELETE FROM pins WHERE expires_at < ?", (now,))
+            cursor = self._db.execute("""
+                SELECT content_id, rel_path, size FROM entries
+                WHERE kind IN ('segment', 'podcast_version')
+                  AND NOT EXISTS (SELECT 1 FROM pins WHERE pins.content_id = entries.content_id)
+                ORDER BY kind = 'podcast_version', last_access
+            """)
+            for content_id, rel_path, size in cursor.fetchall():
+                if self.total_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self.root / rel_path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"删除音频文件失败: {rel_path}, {e}")
+                    continue
+                self._db.execute("DELETE FROM entries WHERE content_id = ?", (content_id,))
+                self.total_bytes -= size
+                evicted.append(content_id)
+            self._db.commit()
+        if evicted:
+            logger.info(f"音频存储淘汰 {len(evicted)} 个文件，当前占用 {self.total_bytes} 字节")
+        if self.total_bytes > self.max_bytes:
+            logger.warning(f"音频存储仍超出上限（{self.total_bytes}/{self.max_bytes} 字节），剩余文件均被播客引用")
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, pinned = self._db.execute("""
+                SELECT COUNT(*), (SELECT COUNT(DISTINCT content_id) FROM pins WHERE expires_at >= ?) FROM entries
+            """, (time.time(),)).fetchone()
+        return {"entries": entries, "pinned": pinned, "total_bytes": self.total_bytes, "max_bytes": self.max_bytes}
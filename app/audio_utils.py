@@ -0,0 +1,339 @@
+import os
+import uuid
+import shutil
+import logging
+import subprocess
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 各输出格式对应的 ffmpeg 编码器
+_FFMPEG_CODECS = {
+    "mp3": ["-c:a", "libmp3lame"],
+    "opus": ["-c:a", "libopus", "-application", "voip"],
+    "wav": ["-c:a", "pcm_s16le"],
+}
+
+
+def ffmpeg_path() -> Optional[str]:
+    """返回可用的 ffmpeg 路径，可通过 FFMPEG_PATH 指定，未安装时返回 None"""
+    return os.getenv("FFMPEG_PATH") or shutil.which("ffmpeg")
+
+
+def transcode(src: Path, dst: Path, audio_format: str, sample_rate: int, bitrate_kbps: Optional[int] = None,
+              timeout: float = 120.0) -> bool:
+    """
+    使用 ffmpeg 将音频转码为单声道的目标格式
+    :param src: 源文件
+    :param dst: 目标文件
+    :param audio_format: 目标格式（mp3/opus/wav）
+    :param sample_rate: 目标采样率
+    :param bitrate_kbps: 目标码率（kbps），为空时使用编码器默认值
+    :param timeout: 超时时间（秒）
+    :return: 是否转码成功
+    """
+    ffmpeg = ffmpeg_path()
+    if not ffmpeg:
+        logger.warning("未找到ffmpeg，无法进行服务端转码")
+        return False
+    cmd = [ffmpeg, "-y", "-loglevel", "error", "-i", str(src), "-ac", "1", "-ar", str(sample_rate)]
+    cmd += _FFMPEG_CODECS.get(audio_format, [])
+    if bitrate_kbps:
+        cmd += ["-b:a", f"{bitrate_kbps}k"]
+    cmd += ["-f", "ogg" if audio_format == "opus" else audio_format, str(dst)]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=timeout)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.error(f"ffmpeg转码失败: {e}")
+        return False
+    if result.returncode != 0:
+        logger.error(f"ffmpeg转码失败: {result.stderr.decode('utf-8', errors='replace')[:500]}")
+        return False
+    return True
+
+
+# MP3 Layer III 码率表（kbps）与采样率表，按 MPEG 版本区分
+_MP3_BITRATES = {
+    "1": [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    "2": [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+# 可以在服务端直接拼接的格式，其余格式（如opus）需要整段合成
+CONCAT_FORMATS = ("mp3", "wav", "pcm")
+
+
+def _id3v2_size(data: bytes) -> int:
+    """返回开头ID3v2标签的长度，没有标签时返回0"""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = ((data[6] & 0x7F) << 21) | ((data[7] & 0x7F) << 14) | ((data[8] & 0x7F) << 7) | (data[9] & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _mp3_frame(data: bytes, pos: int) -> Optional[Tuple[int, int, int]]:
+    """
+    解析 pos 处的 MPEG Layer III 帧头
+    :return: (帧长度, 每帧采样数, 采样率)，不是合法帧头时返回 None
+    """
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return None
+    version = (data[pos + 1] >> 3) & 0x03
+    layer = (data[pos + 1] >> 1) & 0x03
+    bitrate_index = data[pos + 2] >> 4
+    sample_rate_index = (data[pos + 2] >> 2) & 0x03
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    padding = (data[pos + 2] >> 1) & 0x01
+    sample_rate = _MP3_SAMPLE_RATES[version][sample_rate_index]
+    bitrate = _MP3_BITRATES["1" if version == 3 else "2"][bitrate_index] * 1000
+    samples = 1152 if version == 3 else 576
+    length = samples // 8 * bitrate // sample_rate + padding
+    return length, samples, sample_rate
+
+
+def iter_mp3_frames(data: bytes) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    遍历MP3数据中的音频帧，跳过ID3标签，遇到无法识别的字节时向后重新同步
+    :param data: MP3数据
+    :return: (偏移, 帧长度, 每帧采样数, 采样率)
+    """
+    pos = _id3v2_size(data)
+    end = len(data) - 128 if data[-128:-125] == b"TAG" else len(data)
+    while pos < end:
+        frame = _mp3_frame(data, pos)
+        if frame is None or pos + frame[0] > end:
+            pos = data.find(b"\xff", pos + 1, end)
+            if pos < 0:
+                return
+            continue
+        yield (pos,) + frame
+        pos += frame[0]
+
+
+def _mp3_audio_range(data: bytes) -> Tuple[int, int]:
+    """返回去掉ID3标签与Xing/Info信息帧后的音频帧区间"""
+    frames = list(iter_mp3_frames(data))
+    if not frames:
+        return 0, 0
+    # 信息帧记录的是单个文件的总帧数，拼接后不再正确，直接去掉
+    first_offset, first_length = frames[0][0], frames[0][1]
+    if b"Xing" in data[first_offset:first_offset + 64] or b"Info" in data[first_offset:first_offset + 64]:
+        frames = frames[1:]
+    if not frames:
+        return 0, 0
+    return frames[0][0], frames[-1][0] + frames[-1][1]
+
+
+def _wav_layout(path: Path) -> Tuple[bytes, int, int]:
+    """
+    读取WAV文件的 fmt 块与 data 块位置
+    :return: (fmt块内容, data偏移, data长度)
+    """
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            raise ValueError(f"不是WAV文件: {path}")
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                raise ValueError(f"WAV文件缺少data块: {path}")
+            chunk_id, chunk_size = chunk[:4], int.from_bytes(chunk[4:], "little")
+            if chunk_id == b"fmt ":
+                fmt = f.read(chunk_size)
+                f.seek(chunk_size & 1, 1)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"WAV文件缺少fmt块: {path}")
+                offset = f.tell()
+                # 流式接口可能把长度写成占位值，以文件实际长度为准
+                size = min(chunk_size, os.path.getsize(path) - offset)
+                return fmt, offset, size
+            else:
+                f.seek(chunk_size + (chunk_size & 1), 1)
+
+
+def _copy_range(src: Path, dst, offset: int, length: int, chunk_size: int = 256 * 1024) -> None:
+    with open(src, "rb") as f:
+        f.seek(offset)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                break
+            dst.write(chunk)
+            length -= len(chunk)
+
+
+def audio_payload(path: Path, audio_format: str) -> Tuple[Optional[bytes], int, int]:
+    """
+    返回音频文件中可直接拼接的数据区间：mp3 为去掉ID3标签与信息帧后的音频帧，wav 为 data 块，pcm 为整个文件
+    :param path: 音频文件
+    :param audio_format: 音频格式
+    :return: (wav 的 fmt 块内容，其他格式为 None, 偏移, 长度)
+    """
+    if audio_format == "wav":
+        return _wav_layout(path)
+    if audio_format == "mp3":
+        start, end = _mp3_audio_range(Path(path).read_bytes())
+        return None, start, end - start
+    return None, 0, os.path.getsize(path)
+
+
+def write_audio(parts: List[Tuple[Path, int, int]], dst: Path, audio_format: str,
+                fmt: Optional[bytes] = None) -> Optional[List[int]]:
+    """
+    按顺序把各文件中的数据区间写入一个音频文件（先写临时文件再原子替换），不重新编码
+    :param parts: (文件, 偏移, 长度) 列表，区间内容须是 audio_payload 返回的可拼接数据
+    :param dst: 目标文件
+    :param audio_format: 音频格式
+    :param fmt: wav 的 fmt 块内容
+    :return: 各区间在目标文件中的起始偏移，写入失败时返回 None
+    """
+    # 临时文件名带随机后缀，同一目标的并发拼接不会写到同一个临时文件
+    temp_path = dst.with_name(f"{dst.name}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        with open(temp_path, "wb") as out:
+            if audio_format == "wav":
+                data_size = sum(length for _, _, length in parts)
+                out.write(b"RIFF" + (4 + 8 + len(fmt) + 8 + data_size).to_bytes(4, "little") + b"WAVE")
+                out.write(b"fmt " + len(fmt).to_bytes(4, "little") + fmt)
+                out.write(b"data" + data_size.to_bytes(4, "little"))
+            offsets = []
+            for path, offset, length in parts:
+                offsets.append(out.tell())
+                _copy_range(path, out, offset, length)
+        os.replace(temp_path, dst)
+        return offsets
+    except (OSError, ValueError) as e:
+        logger.error(f"音频拼接失败: {e}")
+        return None
+    finally:
+        if temp_path.exists():
+            os.remove(temp_path)
+
+
+def concat_audio(paths: List[Path], dst: Path, audio_format: str) -> bool:
+    """
+    把分段合成的音频无缝拼接为一个文件，不重新编码
+    mp3 去掉每段的ID3标签与信息帧后直接拼接音频帧；wav 合并PCM数据并重写文件头；pcm 直接拼接
+    :param paths: 按顺序排列的分段文件
+    :param dst: 目标文件
+    :param audio_format: 音频格式
+    :return: 是否拼接成功，格式不支持或各段参数不一致时返回 False
+    """
+    if audio_format not in CONCAT_FORMATS:
+        logger.warning(f"不支持直接拼接 {audio_format} 格式的音频")
+        return False
+    try:
+        payloads = [audio_payload(path, audio_format) for path in paths]
+    except (OSError, ValueError) as e:
+        logger.error(f"音频拼接失败: {e}")
+        return False
+    if audio_format == "wav" and any(fmt != payloads[0][0] for fmt, _, _ in payloads):
+        logger.error("分段WAV的采样参数不一致，无法拼接")
+        return False
+    parts = [(path, offset, length) for path, (_, offset, length) in zip(paths, payloads)]
+    return write_audio(parts, dst, audio_format, payloads[0][0] if payloads else None) is not None
+
+
+def split_audio(src: Path, dsts: List[Path], cut_ms: List[float], audio_format: str, sample_rate: int = 24000) -> bool:
+    """
+    在指定时间点把音频切成多个文件，不重新编码：mp3 在帧边界切分，wav/pcm 在采样点边界切分
+    :param src: 源文件
+    :param dsts: 目标文件，数量比切分点多一个
+    :param cut_ms: 递增的切分时间点（毫秒）
+    :param audio_format: 音频格式
+    :param sample_rate: pcm 格式的采样率（16位单声道）
+    :return: 是否切分成功，任一片段为空时返回 False
+    """
+    if audio_format not in CONCAT_FORMATS or len(dsts) != len(cut_ms) + 1:
+        return False
+    try:
+        fmt, offset, size = audio_payload(src, audio_format)
+        if audio_format == "mp3":
+            data = Path(src).read_bytes()
+            # 与 audio_payload 一致，跳过开头的信息帧
+            frames = [frame for frame in iter_mp3_frames(data) if frame[0] >= offset]
+            bounds, elapsed, clip = [offset], 0.0, 0
+            for frame_offset, _, samples, frame_rate in frames:
+                # 帧的起始时间越过切分点时，该帧属于下一个片段
+                while clip < len(cut_ms) and elapsed * 1000 >= cut_ms[clip]:
+                    bounds.append(frame_offset)
+                    clip += 1
+                elapsed += samples / frame_rate
+            bounds += [offset + size] * (len(dsts) + 1 - len(bounds))
+        else:
+            if audio_format == "wav":
+                byte_rate = int.from_bytes(fmt[8:12], "little")
+                block_align = int.from_bytes(fmt[12:14], "little") or 1
+            else:
+                byte_rate, block_align = sample_rate * 2, 2
+            bounds = [offset] + [
+                offset + min(size, int(ms / 1000 * byte_rate) // block_align * block_align) for ms in cut_ms
+            ] + [offset + size]
+    except (OSError, ValueError) as e:
+        logger.error(f"音频切分失败: {e}")
+        return False
+    if any(end <= start for start, end in zip(bounds, bounds[1:])):
+        logger.warning(f"音频切分点无效: {cut_ms}")
+        return False
+    for dst, start, end in zip(dsts, bounds, bounds[1:]):
+        if write_audio([(src, start, end - start)], dst, audio_format, fmt) is None:
+            return False
+    return True
+
+
+def range_duration(path: Path, offset: int, length: int, audio_format: str, fmt: Optional[bytes] = None,
+                   sample_rate: int = 24000) -> Optional[float]:
+    """
+    计算文件中一段可拼接音频数据（见 audio_payload）的时长，只解析帧头/文件头，不解码
+    :param path: 音频文件
+    :param offset: 数据偏移
+    :param length: 数据长度
+    :param audio_format: 音频格式
+    :param fmt: wav 的 fmt 块内容
+    :param sample_rate: pcm 格式的采样率（16位单声道）
+    :return: 时长（秒），无法识别的格式返回 None
+    """
+    if audio_format == "mp3":
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        return round(sum(samples / frame_rate for _, _, samples, frame_rate in iter_mp3_frames(data)), 3)
+    if audio_format == "wav" and fmt:
+        byte_rate = int.from_bytes(fmt[8:12], "little")
+        return round(length / byte_rate, 3) if byte_rate else None
+    if audio_format == "pcm":
+        return round(length / (sample_rate * 2), 3)
+    return None
+
+
+def audio_duration(path: Path, audio_format: Optional[str] = None, sample_rate: int = 24000) -> Optional[float]:
+    """
+    读取音频时长，只解析帧头/文件头，不解码
+    :param path: 音频文件
+    :param audio_format: 音频格式，为空时按扩展名判断
+    :param sample_rate: pcm 格式的采样率（16位单声道）
+    :return: 时长（秒），无法识别的格式返回 None
+    """
+    path = Path(path)
+    audio_format = (audio_format or path.suffix.lstrip(".")).lower()
+    try:
+        if audio_format == "mp3":
+            samples = 0.0
+            for _, _, frame_samples, frame_rate in iter_mp3_frames(path.read_bytes()):
+                samples += frame_samples / frame_rate
+            return round(samples, 3)
+        if audio_format == "wav":
+            fmt, _, size = _wav_layout(path)
+            # fmt 块第8~11字节是每秒字节数
+            byte_rate = int.from_bytes(fmt[8:12], "little")
+            return round(size / byte_rate, 3) if byte_rate else None
+        if audio_format == "pcm":
+            return round(path.stat().st_size / (sample_rate * 2), 3)
+    except (OSError, ValueError) as e:
+        logger.warning(f"读取音频时长失败: {path}, {e}")
+    return None
@@ -0,0 +1,181 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 任务与分段状态
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+
+
+class JobStore:
+    """
+    语音合成任务的持久化状态：每个分段单独记录，服务重启或连接中断后可以只补做未完成的分段
+    执行中的任务由执行进程定期刷新 updated_at（租约），超过 lease_seconds 未刷新才视为执行进程已退出
+    """
+
+    def __init__(self, db_path: Path, lease_seconds: float = 60.0):
+        self.db_path = Path(db_path)
+        self.lease_seconds = lease_seconds
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                profile TEXT,
+                total INTEGER NOT NULL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job_segments (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                item TEXT NOT NULL,
+                status TEXT NOT NULL,
+                audio_path TEXT,
+                audio_id TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (job_id, idx)
+            );
+        """)
+        self._db.commit()
+        logger.info(f"任务存储初始化完成: {self.db_path}")
+
+    def recover_interrupted(self, job_id: Optional[str] = None) -> int:
+        """
+        把租约已过期的执行中任务与其执行中的分段标记为已中断，等待恢复
+        Web进程与任务工作进程共用同一数据库，仍在刷新租约的任务属于正在运行的进程，不受影响
+        :param job_id: 只处理该任务，未指定时处理全部任务
+        :return: 中断的任务数
+        """
+        now = time.time()
+        with self._lock:
+            query = "SELECT job_id FROM jobs WHERE status = ? AND updated_at < ?"
+            params = [RUNNING, now - self.lease_seconds]
+            if job_id:
+                query += " AND job_id = ?"
+                params.append(job_id)
+            stale = [row["job_id"] for row in self._db.execute(query, params)]
+            for stale_id in stale:
+                self._db.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?", (INTERRUPTED, now, stale_id))
+                self._db.execute("UPDATE job_segments SET status = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+                                 (PENDING, now, stale_id, RUNNING))
+            self._db.commit()
+        if stale:
+            logger.info(f"{len(stale)} 个合成任务的执行进程已退出，标记为已中断，可通过恢复接口继续")
+        return len(stale)
+
+    def renew(self, job_id: str) -> None:
+        """刷新执行中任务的租约"""
+        with self._lock:
+            self._db.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ? AND status = ?", (time.time(), job_id, RUNNING))
+            self._db.commit()
+
+    def is_leased(self, job: Dict) -> bool:
+        """任务是否正由某个进程执行（状态为执行中且租约未过期）"""
+        return job["status"] == RUNNING and time.time() - job["updated_at"] < self.lease_seconds
+
+    def upsert(self, job_id: str, dialog: List[Dict], profile: Optional[str] = None) -> None:
+        """
+        创建任务，或与已有任务合并：文本与角色没有变化的分段保留原状态，其余分段重置为待处理
+        :param job_id: 任务ID
+        :param dialog: 对话列表
+        :param profile: 输出配置名称
+        """
+        now = time.time()
+        with self._lock:
+            existing = {
+                row["idx"]: row for row in
+                self._db.execute("SELECT idx, item, status FROM job_segments WHERE job_id = ?", (job_id,))
+            }
+            row = self._db.execute("SELECT profile FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            # 输出配置变化后已生成的语音都不能复用
+            reset_all = row is not None and row["profile"] != profile
+            for idx, item in enumerate(dialog):
+                item_json = json.dumps(
+                    {"role": item.get("role", "host"), "speaker": item.get("speaker", "主持人"), "text": item.get("text", "")},
+                    ensure_ascii=False, sort_keys=True
+                )
+                old = existing.get(idx)
+                if old is not None and old["item"] == item_json and not reset_all:
+                    continue
+                self._db.execute(
+                    "INSERT OR REPLACE INTO job_segments (job_id, idx, item, status, attempts, updated_at) VALUES (?, ?, ?, ?, 0, ?)",
+                    (job_id, idx, item_json, PENDING, now)
+                )
+            self._db.execute("DELETE FROM job_segments WHERE job_id = ? AND idx >= ?", (job_id, len(dialog)))
+            self._db.execute(
+                "INSERT INTO jobs (job_id, status, profile, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(job_id) DO UPDATE SET status = excluded.status, profile = excluded.profile, "
+                "total = excluded.total, error = NULL, updated_at = excluded.updated_at",
+                (job_id, PENDING, profile, len(dialog), now, now)
+            )
+            self._db.commit()
+
+    def exists(self, job_id: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)).fetchone() is not None
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?", (status, error, time.time(), job_id)
+            )
+            self._db.commit()
+
+    def mark_segment(self, job_id: str, idx: int, status: str, audio_path: Optional[str] = None,
+                     audio_id: Optional[str] = None, error: Optional[str] = None) -> None:
+        """
+        更新分段状态，开始执行（running）时累加尝试次数
+        :param job_id: 任务ID
+        :param idx: 分段序号
+        :param status: 新状态
+        :param audio_path: 生成的音频路径
+        :param audio_id: 生成的音频内容ID
+        :param error: 失败原因
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE job_segments SET status = ?, audio_path = ?, audio_id = ?, error = ?, "
+                "attempts = attempts + ?, updated_at = ? WHERE job_id = ? AND idx = ?",
+                (status, audio_path, audio_id, error, 1 if status == RUNNING else 0, time.time(), job_id, idx)
+            )
+            self._db.commit()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """
+        获取任务与全部分段的状态
+        :param job_id: 任务ID
+        :return: 任务信息，不存在时返回 None
+        """
+        # 执行进程在服务启动后才退出的任务，启动时的恢复处理不到，查询时发现租约过期再标记为已中断
+        self.recover_interrupted(job_id)
+        with self._lock:
+            job = self._db.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            rows = self._db.execute("SELECT * FROM job_segments WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall()
+        segments = []
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for row in rows:
+            segment = dict(json.loads(row["item"]), index=row["idx"], status=row["status"], audio_path=row["audio_path"],
+                           audio_id=row["audio_id"], error=row["error"], attempts=row["attempts"])
+            segments.append(segment)
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+        return dict(dict(job), counts=counts, segments=segments)
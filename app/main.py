@@ -1,30 +1,71 @@
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi import HTTPException
 from pydantic import BaseModel
+import os
+import re
+import uuid
+import asyncio
+import logging
+import mimetypes
 from pathlib import Path
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Dict
 
-from qwen import generate_dialog_script
+from qwen import generate_dialog_script, regenerate_segments
 from tts import tts_manager
+from pipeline import podcast_pipeline, synthesize_segment
+from model_router import model_router
+from scheduler import ClientContextMiddleware, INTERACTIVE, llm_scheduler, set_priority, tts_scheduler
+from responses import FastJSONResponse, RangeFileResponse, dumps_json
+from work_queue import TASK_PRIORITIES, WorkQueue
+from results_store import result_store
+from assets import StaticAssetStore, asset_response, IMMUTABLE_CACHE, REVALIDATE_CACHE
+
+logger = logging.getLogger(__name__)
 
 current_dir = Path(__file__).parent
 static_dir = current_dir / "static"
 
-app = FastAPI(title="播客对话生成器")
-
-app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 语音合成/模型调用在线程中执行，排队等待调度时也占用线程；默认线程池太小（CPU数+4）时，
+    # 排队的批量任务会占满线程，交互请求连进入调度器的机会都没有
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=int(os.getenv("APP_WORKER_THREADS", "64")), thread_name_prefix="app-worker")
+    loop.set_default_executor(executor)
+    # 上次退出时未完成的合成任务标记为已中断；工作进程共用任务库，只处理租约已过期的任务，工作进程正在执行的任务不受影响
+    tts_manager.job_store.recover_interrupted()
+    yield
+    executor.shutdown(wait=False)
+
+
+app = FastAPI(title="播客对话生成器", default_response_class=FastJSONResponse, lifespan=lifespan)
+# 标识调用方，供语音合成/模型调用的公平调度使用
+app.add_middleware(ClientContextMiddleware)
+
+# 耗时任务可提交到本地任务队列，由独立的工作进程执行（run.py start --workers N）
+work_queue = WorkQueue()
+
+# 静态资源启动时读入内存并预压缩，修改静态文件后需重启服务
+asset_store = StaticAssetStore(static_dir)
+
+@app.api_route("/static/{asset_path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def read_static(asset_path: str, request: Request):
+    asset = asset_store.lookup(asset_path)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    cache_control = IMMUTABLE_CACHE if asset_store.is_hashed(asset_path) else REVALIDATE_CACHE
+    return asset_response(request, asset, cache_control)
 
 @app.get("/", response_class=HTMLResponse)
-async def read_index():
-    index_path = static_dir / "html" / "index.html"
-    return FileResponse(str(index_path))
+async def read_index(request: Request):
+    return asset_response(request, asset_store.page("html/index.html"), REVALIDATE_CACHE)
 
 @app.get("/podcast-generator", response_class=HTMLResponse)
-async def read_podcast_generator():
-    podcast_path = static_dir / "html" / "podcast-generator.html"
-    return FileResponse(str(podcast_path))
+async def read_podcast_generator(request: Request):
+    return asset_response(request, asset_store.page("html/podcast-generator.html"), REVALIDATE_CACHE)
 
 @app.get("/health")
 async def health_check():
@@ -39,7 +80,33 @@ class GenerateRequest(BaseModel):
     text: str
     style: Optional[str] = "casual"
     participants: Optional[int] = 2
+    # auto 表示按输入长度、风格、人数与延迟目标自动选择模型
     model: Optional[str] = "deepseek-v3.2"
+    # 自动选择模型时的延迟目标（秒）
+    latency_slo: Optional[float] = None
+    # 目标节目时长（分钟），用于确定脚本篇幅与输出token预算；max_tokens 不指定时自动计算
+    target_minutes: Optional[float] = None
+    max_tokens: Optional[int] = None
+    # single（整篇一次生成）或 outline（先生成提纲再并行展开章节），不指定时长节目自动使用 outline
+    mode: Optional[str] = None
+    # 原文与已处理原文近似重复时是否直接复用其脚本，不指定时使用 NEAR_DUP_REUSE
+    reuse_similar: Optional[bool] = None
+    # 不使用缓存的脚本（包括近似重复原文的脚本），总是重新生成，用于“重新生成”
+    fresh: Optional[bool] = False
+    # 精简响应：去掉与 segments 重复的 raw 原文以及与顶层重复的 token_usage
+    compact: Optional[bool] = False
+
+
+def _compact_script(script: Dict) -> Dict:
+    """
+    去掉脚本中的重复字段，raw 仅在没有可用 segments 时保留（前端需要用它兜底拆分）
+    :param script: 完整脚本
+    :return: 精简后的脚本
+    """
+    compacted = {k: v for k, v in script.items() if k not in ("raw", "token_usage")}
+    if not script.get("segments") and "raw" in script:
+        compacted["raw"] = script["raw"]
+    return compacted
 
 
 @app.post("/generate-script")
@@ -48,31 +115,116 @@ async def generate_script(req: GenerateRequest):
         raise HTTPException(status_code=400, detail="text 为空")
 
     try:
-        result = generate_dialog_script(req.text, style=req.style or "casual", participants=req.participants or 2, model=req.model or "deepseek-v3.2")
-        return {"ok": True, "script": result, "token_usage": result.get("token_usage", {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0})}
+        set_priority(INTERACTIVE)
+        result = await asyncio.to_thread(generate_dialog_script, req.text, style=req.style or "casual",
+                                         participants=req.participants or 2, model=req.model or "deepseek-v3.2",
+                                         latency_slo=req.latency_slo, target_minutes=req.target_minutes,
+                                         max_tokens=req.max_tokens, mode=req.mode, reuse_similar=req.reuse_similar,
+                                         fresh=bool(req.fresh))
+        token_usage = result.get("token_usage", {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0})
+        script = _compact_script(result) if req.compact else result
+        # 直接返回响应对象，跳过 jsonable_encoder 对大脚本的逐层遍历
+        return FastJSONResponse({"ok": True, "script": script, "token_usage": token_usage})
+    except Exception as e:
+        return {"ok": False, "error": str(e), "token_usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
+
+
+class RegenerateSegmentsRequest(BaseModel):
+    # 当前脚本（至少包含 roles 与 segments）
+    script: dict
+    # 重新生成 [start, end) 范围内的对话段
+    start: int
+    end: int
+    # 修改要求，如"开场更有悬念"
+    instruction: Optional[str] = None
+    style: Optional[str] = "casual"
+    model: Optional[str] = "deepseek-v3.2"
+    latency_slo: Optional[float] = None
+
+
+@app.post("/regenerate-segments")
+async def regenerate_script_segments(req: RegenerateSegmentsRequest):
+    """
+    只重新生成脚本中的一段范围，返回替换 [start, end) 的新对话段，其余对话不变
+    """
+    try:
+        set_priority(INTERACTIVE)
+        result = await asyncio.to_thread(regenerate_segments, req.script, req.start, req.end,
+                                         instruction=req.instruction, style=req.style or "casual",
+                                         model=req.model or "deepseek-v3.2", latency_slo=req.latency_slo)
+        return FastJSONResponse({"ok": True, **result})
     except Exception as e:
         return {"ok": False, "error": str(e), "token_usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
 
 
 class SaveDialogRequest(BaseModel):
     content: str
-    filename: str
+    # 客户端建议的文件名，保存时去掉目录并只保留安全字符，同名时自动加后缀
+    filename: Optional[str] = None
     script: dict
+    # 原文，只记录其哈希，用于查找同一原文生成过的对话
+    source_text: Optional[str] = None
+    style: Optional[str] = None
+    model: Optional[str] = None
+    token_usage: Optional[Dict] = None
+
+
+class PipelineRequest(BaseModel):
+    text: str
+    style: Optional[str] = "casual"
+    participants: Optional[int] = 2
+    model: Optional[str] = "deepseek-v3.2"
+    latency_slo: Optional[float] = None
+    target_minutes: Optional[float] = None
+    reuse_similar: Optional[bool] = None
+    fresh: Optional[bool] = False
+    profile: Optional[str] = None
+    # 同时合成的分段数
+    concurrency: Optional[int] = 3
+    compact: Optional[bool] = True
 
 
 class TTSRequest(BaseModel):
     text: str
     speaker_id: str
     audio_format: Optional[str] = "mp3"
+    # 输出配置（standard/preview/speech/archive），指定后覆盖 audio_format
+    profile: Optional[str] = None
 
 
 class ProcessDialogRequest(BaseModel):
     dialog: List[Dict]
+    profile: Optional[str] = None
+    # 任务ID：不传时自动生成；以同一ID重试只合成未完成或失败的分段
+    job_id: Optional[str] = None
+
+
+class BatchTTSItem(BaseModel):
+    text: str
+    speaker_id: str
+    audio_format: Optional[str] = "mp3"
+
+
+class BatchTTSRequest(BaseModel):
+    items: List[BatchTTSItem]
+    profile: Optional[str] = None
+    # 同时合成的条数
+    concurrency: Optional[int] = 4
+
+
+class SubmitTaskRequest(BaseModel):
+    # 任务类型：script（生成脚本）、speech（单句语音）、dialog_tts（整段对话语音）
+    kind: str
+    payload: Dict
+    priority: Optional[str] = "batch"
 
 
 class CreatePodcastRequest(BaseModel):
     dialog: List[Dict]
     podcast_title: str
+    profile: Optional[str] = None
+    # 章节，每个元素包含 title 与 start（起始分段序号），如提纲模式脚本的 sections；不指定时按时长自动划分
+    chapters: Optional[List[Dict]] = None
 
 
 class UpdateSpeakerRequest(BaseModel):
@@ -84,30 +236,63 @@ class UpdateSpeakerRequest(BaseModel):
 @app.post("/save-dialog")
 async def save_dialog(req: SaveDialogRequest):
     try:
-        # 创建result目录
-        result_dir = current_dir.parent / "results"
-        result_dir.mkdir(exist_ok=True)
-        
-        # 保存文本文件
-        file_path = result_dir / req.filename
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(req.content)
-        
-        return {"ok": True, "message": "对话已保存"}
+        # 文件写入与建立索引在线程中执行，不阻塞事件循环
+        record = await asyncio.to_thread(result_store.save, req.content, req.script, filename=req.filename,
+                                         source_text=req.source_text, style=req.style, model=req.model,
+                                         token_usage=req.token_usage)
+        return {"ok": True, "message": "对话已保存", "id": record["id"], "filename": record["filename"]}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+@app.get("/results")
+async def list_results(limit: int = 20, cursor: Optional[int] = None, style: Optional[str] = None,
+                       model: Optional[str] = None, source_hash: Optional[str] = None):
+    """
+    按保存时间倒序列出已保存的对话，翻页时传入上一页返回的 next_cursor
+    """
+    try:
+        page = await asyncio.to_thread(result_store.list, limit=limit, cursor=cursor, style=style, model=model,
+                                       source_hash=source_hash)
+        return {"ok": True, **page}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+@app.get("/results/search")
+async def search_results(q: str, limit: int = 20, cursor: Optional[int] = None):
+    """
+    在已保存对话的文本中检索，多个检索词用空格分隔
+    """
+    try:
+        page = await asyncio.to_thread(result_store.search, q, limit=limit, cursor=cursor)
+        return {"ok": True, **page}
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
 
+@app.get("/results/{result_id}")
+async def get_result(result_id: int):
+    record = await asyncio.to_thread(result_store.get, result_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="对话不存在")
+    return {"ok": True, "result": record}
+
+
 @app.post("/generate-speech")
 async def generate_speech(req: TTSRequest):
     """
     生成语音文件
     """
     try:
-        audio_path = tts_manager.generate_speech(req.text, req.speaker_id, req.audio_format)
+        # 单句试听是用户在等待的交互请求，优先于整期合成
+        set_priority(INTERACTIVE)
+        audio_path = await asyncio.to_thread(tts_manager.generate_speech, req.text, req.speaker_id, req.audio_format,
+                                             profile=req.profile)
         if not audio_path:
             raise HTTPException(status_code=500, detail="语音生成失败")
-        return {"ok": True, "audio_path": audio_path}
+        audio_id = tts_manager.audio_store.content_id_for(audio_path)
+        return {"ok": True, "audio_path": audio_path, "audio_id": audio_id, "audio_url": f"/audio/{audio_id}"}
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
@@ -118,8 +303,176 @@ async def process_dialog_tts(req: ProcessDialogRequest):
     处理对话，为每个对话生成语音
     """
     try:
-        processed_dialog = tts_manager.process_dialog(req.dialog)
-        return {"ok": True, "dialog": processed_dialog}
+        job_id = req.job_id or uuid.uuid4().hex
+        if not _CONTENT_ID.match(job_id):
+            return {"ok": False, "error": "任务ID只能包含字母、数字、下划线和短横线"}
+        processed_dialog = await asyncio.to_thread(tts_manager.process_dialog, req.dialog, req.profile, job_id)
+        return {"ok": True, "job_id": job_id, "dialog": processed_dialog,
+                "failed": sum(1 for item in processed_dialog if not item["audio_path"])}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+@app.get("/tts-jobs/{job_id}")
+async def get_tts_job(job_id: str):
+    """
+    查询合成任务的进度与各分段状态
+    """
+    try:
+        # get 可能顺带回收过期租约（写库并提交），放到线程池中避免阻塞事件循环
+        job = await asyncio.to_thread(tts_manager.job_store.get, job_id)
+        if job is None:
+            # 多实例部署时任务可能由其他实例创建，读取共享存储中的状态快照
+            job = await asyncio.to_thread(tts_manager.shared.get_json, "job", job_id)
+        if job is None:
+            return {"ok": False, "error": "任务不存在"}
+        return {"ok": True, "job": job}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+@app.post("/tts-jobs/{job_id}/resume")
+async def resume_tts_job(job_id: str):
+    """
+    继续执行中断或部分失败的合成任务，只合成未完成的分段
+    """
+    try:
+        exists = await asyncio.to_thread(tts_manager.job_store.exists, job_id)
+        if not exists and not await asyncio.to_thread(tts_manager.adopt_job, job_id):
+            return {"ok": False, "error": "任务不存在"}
+        processed_dialog = await asyncio.to_thread(tts_manager.run_job, job_id)
+        return {"ok": True, "job_id": job_id, "dialog": processed_dialog,
+                "failed": sum(1 for item in processed_dialog if not item["audio_path"])}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+@app.post("/batch-tts")
+async def batch_tts(req: BatchTTSRequest):
+    """
+    批量合成语音，以NDJSON逐行返回，每条完成即输出一行（按完成顺序，用 index 对应请求中的位置），
+    最后一行为汇总 {"done": true, ...}
+    """
+    concurrency = max(1, min(req.concurrency or 4, 16))
+    
+    async def stream():
+        semaphore = asyncio.Semaphore(concurrency)
+        # 条目位置 -> 其所在的合并合成请求
+        batched: Dict[int, asyncio.Task] = {}
+        
+        async def run(index: int, item: BatchTTSItem) -> Dict:
+            if index in batched:
+                # 等所在的合并请求结束再合成，通常直接命中切分出的语音，合并失败时照常单独合成
+                await asyncio.wait([batched[index]])
+            async with semaphore:
+                return await asyncio.to_thread(synthesize_segment, index, item.text, item.speaker_id,
+                                               req.profile, item.audio_format)
+        
+        batch_tasks, tasks = [], []
+        succeeded = 0
+        try:
+            # 同一音色的短句合并合成，与其余条目同时进行，只有被合并的条目需要等待
+            try:
+                for audio_format in {item.audio_format for item in req.items}:
+                    positions = [i for i, item in enumerate(req.items) if item.audio_format == audio_format]
+                    batches = await asyncio.to_thread(tts_manager.plan_batches,
+                                                      [{"text": req.items[i].text, "role": req.items[i].speaker_id}
+                                                       for i in positions], req.profile, audio_format)
+                    for batch in batches:
+                        batch_task = asyncio.create_task(asyncio.to_thread(tts_manager.synthesize_batch, batch))
+                        batch_tasks.append(batch_task)
+                        for index in batch["indexes"]:
+                            batched[positions[index]] = batch_task
+            except Exception as e:
+                logger.warning(f"规划合并合成失败，全部条目单独合成: {e}")
+            tasks = [asyncio.create_task(run(i, item)) for i, item in enumerate(req.items)]
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                succeeded += 1 if result["ok"] else 0
+                yield dumps_json(result) + b"\n"
+            yield dumps_json({"done": True, "total": len(tasks), "succeeded": succeeded,
+                              "failed": len(tasks) - succeeded}) + b"\n"
+        finally:
+            # 客户端断开时取消尚未开始的条目
+            for task in tasks + batch_tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.post("/generate-podcast-stream")
+async def generate_podcast_stream(req: PipelineRequest):
+    """
+    流水线生成播客：模型边输出脚本边合成语音，以NDJSON逐行返回
+    事件类型：segment（解析出的对话段）、audio（分段语音完成）、script（完整脚本）、error、done（汇总与耗时）
+    """
+    concurrency = max(1, min(req.concurrency or 3, 16))
+    # 脚本生成与首段合成按交互优先级调度
+    set_priority(INTERACTIVE)
+    
+    async def stream():
+        try:
+            async for event in podcast_pipeline(req.text, req.style, req.participants, req.model,
+                                                profile=req.profile, concurrency=concurrency, latency_slo=req.latency_slo,
+                                                target_minutes=req.target_minutes, reuse_similar=req.reuse_similar,
+                                                fresh=bool(req.fresh)):
+                if event["type"] == "script" and req.compact:
+                    event = dict(event, script=_compact_script(event["script"]))
+                yield dumps_json(event) + b"\n"
+        except Exception as e:
+            yield dumps_json({"type": "error", "error": str(e)}) + b"\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+_TASK_KINDS = {"script": ("text",), "speech": ("text", "speaker_id"), "dialog_tts": ("dialog",)}
+
+
+@app.post("/tasks")
+async def submit_task(req: SubmitTaskRequest):
+    """
+    提交任务到工作进程队列，立即返回任务ID，通过 GET /tasks/{task_id} 查询结果
+    """
+    try:
+        required = _TASK_KINDS.get(req.kind)
+        if required is None:
+            return {"ok": False, "error": f"不支持的任务类型: {req.kind}"}
+        missing = [key for key in required if not req.payload.get(key)]
+        if missing:
+            return {"ok": False, "error": f"缺少参数: {', '.join(missing)}"}
+        if req.priority not in TASK_PRIORITIES:
+            return {"ok": False, "error": f"不支持的优先级: {req.priority}"}
+        payload = dict(req.payload)
+        if req.kind == "dialog_tts":
+            # 整段语音按可恢复任务执行，工作进程中断后重新领取只补做剩余分段
+            payload.setdefault("job_id", uuid.uuid4().hex)
+        task_id = await asyncio.to_thread(work_queue.submit, req.kind, payload, req.priority)
+        return {"ok": True, "task_id": task_id, "job_id": payload.get("job_id")}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+@app.get("/tasks/{task_id}")
+async def get_task(task_id: str):
+    """
+    查询任务状态（queued/running/done/failed）与结果
+    """
+    try:
+        task = await asyncio.to_thread(work_queue.get, task_id)
+        if task is None:
+            return {"ok": False, "error": "任务不存在"}
+        return {"ok": True, "task": task}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+@app.get("/task-queue")
+async def get_task_queue_stats():
+    """
+    任务队列概况：各状态任务数、排队最久的等待时间、正在执行任务的工作进程
+    """
+    try:
+        return {"ok": True, "queue": await asyncio.to_thread(work_queue.stats)}
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
@@ -130,14 +483,97 @@ async def create_podcast(req: CreatePodcastRequest):
     创建完整的播客节目
     """
     try:
-        podcast_path = tts_manager.create_podcast(req.dialog, req.podcast_title)
+        podcast_path = await asyncio.to_thread(tts_manager.create_podcast, req.dialog, req.podcast_title,
+                                               profile=req.profile, chapters=req.chapters)
         if not podcast_path:
             raise HTTPException(status_code=500, detail="播客创建失败")
-        return {"ok": True, "podcast_path": podcast_path}
+        podcast_id = tts_manager.audio_store.content_id_for(podcast_path)
+        audio = (await asyncio.to_thread(tts_manager.load_podcast, podcast_id, 1) or {}).get("audio")
+        return {"ok": True, "podcast_path": podcast_path, "podcast_id": podcast_id, "podcast_url": f"/audio/{podcast_id}",
+                "version": 1, "audio_url": f"/audio/{audio['content_id']}" if audio else None}
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
 
+class UpdatePodcastRequest(BaseModel):
+    # 修改后的完整对话，每个元素包含 role、speaker、text
+    dialog: List[Dict]
+    podcast_title: Optional[str] = None
+    profile: Optional[str] = None
+    chapters: Optional[List[Dict]] = None
+
+
+@app.post("/podcasts/{podcast_id}/versions")
+async def update_podcast(podcast_id: str, req: UpdatePodcastRequest):
+    """
+    按修改后的对话生成播客的新版本，只合成有变化的分段，未变化的分段复用上一版本的整期音频
+    """
+    if not _CONTENT_ID.match(podcast_id):
+        return {"ok": False, "error": "播客不存在"}
+    try:
+        result = await asyncio.to_thread(tts_manager.update_podcast, podcast_id, req.dialog,
+                                         podcast_title=req.podcast_title, profile=req.profile,
+                                         chapters=req.chapters)
+        return {"ok": True, **result, "podcast_url": f"/audio/{podcast_id}",
+                "version_url": f"/audio/{podcast_id}_v{result['version']}",
+                "audio_url": f"/audio/{result['audio_id']}" if result["audio_id"] else None}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+_CONTENT_ID = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+# 指定版本的播客清单与整期音频生成后不再改变
+_VERSIONED_ID = re.compile(r"_v\d+(_audio)?$")
+
+
+@app.api_route("/audio/{content_id}", methods=["GET", "HEAD"])
+async def get_audio(content_id: str, request: Request):
+    """
+    按内容ID下载音频（或播客清单），支持Range断点/拖动播放与ETag条件请求
+    """
+    if not _CONTENT_ID.match(content_id):
+        raise HTTPException(status_code=404, detail="音频不存在")
+    entry = tts_manager.audio_store.get_entry(content_id)
+    if not entry and await asyncio.to_thread(tts_manager.fetch_from_peer, content_id):
+        entry = tts_manager.audio_store.get_entry(content_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="音频不存在")
+    media_type = mimetypes.guess_type(entry["path"].name)[0] or "application/octet-stream"
+    etag = f'"{entry["digest"]}"' if entry["digest"] else f'"{content_id}-{entry["size"]}"'
+    # 播客ID本身始终指向最新版本的清单，编辑后内容会变，每次都要用ETag协商；分段语音与指定版本可以长期缓存
+    mutable = entry["kind"] == "podcast" and not _VERSIONED_ID.search(content_id)
+    cache_control = REVALIDATE_CACHE if mutable else "public, max-age=86400"
+    return RangeFileResponse(entry["path"], entry["size"], etag, media_type, request.headers, method=request.method,
+                             cache_control=cache_control)
+
+
+@app.get("/audio-profiles")
+async def get_audio_profiles():
+    """
+    获取可用的音频输出配置
+    """
+    try:
+        return {"ok": True, "profiles": tts_manager.get_profiles()}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+@app.get("/scheduler-metrics")
+async def get_scheduler_metrics():
+    """
+    调度指标：语音合成与模型调用的并发、各优先级排队数与等待时间
+    """
+    return {"ok": True, "tts": tts_scheduler.metrics(), "llm": llm_scheduler.metrics()}
+
+
+@app.get("/model-router")
+async def get_model_router():
+    """
+    模型路由状态：各模型的质量等级、成本与实际观测到的延迟、失败率
+    """
+    return {"ok": True, "models": model_router.metrics(), "slo_seconds": model_router.slo_seconds}
+
+
 @app.get("/get-speakers")
 async def get_speakers():
     """
@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 可路由的模型：tier 为质量等级（越大越好），cost 为每千token的相对成本，
+# ms_per_token 为生成一个输出token的预估耗时（毫秒，会按实际观测值持续修正），max_input_chars 为可处理的最大输入长度
+DEFAULT_MODELS = {
+    "qwen-turbo": {"tier": 1, "cost": 0.3, "ms_per_token": 12.0, "max_input_chars": 100000},
+    "qwen-plus": {"tier": 2, "cost": 0.8, "ms_per_token": 20.0, "max_input_chars": 100000},
+    "qwen-max": {"tier": 3, "cost": 2.4, "ms_per_token": 40.0, "max_input_chars": 24000},
+    "deepseek-v3.2": {"tier": 3, "cost": 1.0, "ms_per_token": 30.0, "max_input_chars": 100000},
+}
+
+# 各风格需要的基础质量等级
+STYLE_TIERS = {"entertainment": 1, "casual": 1, "professional": 2}
+
+# 输入超过该长度（字符）时提高一个质量等级，长文需要更强的模型保持结构与要点
+LONG_INPUT_CHARS = 3000
+
+
+class ModelRouter:
+    """
+    按输入长度、风格、参与人数、延迟目标与实际观测到的延迟选择模型：
+    先确定需要的质量等级，在满足等级且预计耗时不超过延迟目标的模型中选成本最低的；
+    都达不到延迟目标时降级为目标内质量最高的模型，仍没有则选预计最快的模型
+    """
+
+    def __init__(self, models: Optional[Dict[str, Dict]] = None, slo_seconds: Optional[float] = None, alpha: float = 0.3):
+        self.models = {name: dict(config) for name, config in (models or DEFAULT_MODELS).items()}
+        self.slo_seconds = slo_seconds
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        # 每个模型的观测统计：ms_per_token（EWMA）、error_rate（EWMA）、calls
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def required_tier(self, text_len: int, style: str, participants: int) -> int:
+        tier = STYLE_TIERS.get(style, 1)
+        if participants >= 3:
+            tier += 1
+        if text_len > LONG_INPUT_CHARS:
+            tier += 1
+        return min(tier, max(config["tier"] for config in self.models.values()))
+
+    def expected_output_tokens(self, text_len: int, participants: int) -> int:
+        # 脚本长度大致随输入长度增长，人数越多轮次越多
+        return int(min(4096, 300 + text_len * 0.8 + participants * 150))
+
+    def estimate_seconds(self, model: str, output_tokens: int) -> float:
+        with self._lock:
+            ms_per_token = self._stats.get(model, {}).get("ms_per_token", self.models[model]["ms_per_token"])
+        return output_tokens * ms_per_token / 1000.0
+
+    def route(self, text: str, style: str = "casual", participants: int = 2, slo_seconds: Optional[float] = None,
+              allowed: Optional[Iterable[str]] = None, output_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """
+        选择模型
+        :param text: 输入文本
+        :param style: 对话风格
+        :param participants: 参与人数
+        :param slo_seconds: 延迟目标（秒），未指定时使用默认值（MODEL_ROUTER_SLO_SECONDS），都没有时不限制
+        :param allowed: 当前接口可用的模型，未指定时为全部已配置模型
+        :param output_tokens: 预计输出token数，未指定时按输入长度估算
+        :return: {"model", "reason", "required_tier", "estimated_seconds", "slo_seconds"}
+        """
+        slo = slo_seconds or self.slo_seconds
+        allowed = set(allowed) if allowed is not None else None
+        candidates = [
+            name for name, config in self.models.items()
+            if (allowed is None or name in allowed) and len(text) <= config["max_input_chars"]
+        ]
+        if not candidates:
+            raise ValueError("没有可以处理该输入的模型")
+        required = self.required_tier(len(text), style, participants)
+        tokens = output_tokens or self.expected_output_tokens(len(text), participants)
+        estimates = {name: self.estimate_seconds(name, tokens) for name in candidates}
+        with self._lock:
+            # 近期失败率过高的模型暂不选择（全部都高时不排除）
+            healthy = [name for name in candidates if self._stats.get(name, {}).get("error_rate", 0.0) < 0.5] or candidates
+
+        eligible = [name for name in healthy if self.models[name]["tier"] >= required]
+        if not eligible:
+            best_tier = max(self.models[name]["tier"] for name in healthy)
+            eligible = [name for name in healthy if self.models[name]["tier"] == best_tier]
+        within_slo = [name for name in eligible if slo is None or estimates[name] <= slo]
+
+        if within_slo:
+            model = min(within_slo, key=lambda name: (self.models[name]["cost"], estimates[name]))
+            reason = f"需要质量等级 {required}，{model} 是满足等级" + \
+                (f"且预计耗时 {estimates[model]:.1f}s 不超过目标 {slo:.0f}s" if slo else "") + "的成本最低模型"
+        else:
+            # 降级：优先选达到延迟目标的模型中质量最高的，都达不到时选预计最快的
+            fast_enough = [name for name in healthy if estimates[name] <= slo]
+            if fast_enough:
+                model = min(fast_enough, key=lambda name: (-self.models[name]["tier"], self.models[name]["cost"]))
+                reason = f"满足质量等级 {required} 的模型预计耗时都超过目标 {slo:.0f}s，" \
+                         f"降级为目标内质量最高的 {model}（等级 {self.models[model]['tier']}，预计 {estimates[model]:.1f}s）"
+            else:
+                model = min(healthy, key=lambda name: estimates[name])
+                reason = f"所有模型预计耗时都超过目标 {slo:.0f}s，选择预计最快的 {model}（{estimates[model]:.1f}s）"
+        decision = {
+            "model": model,
+            "reason": reason,
+            "required_tier": required,
+            "estimated_seconds": round(estimates[model], 2),
+            "slo_seconds": slo,
+        }
+        logger.info(f"模型路由: {decision}")
+        return decision
+
+    def observe(self, model: str, seconds: float, output_tokens: int, ok: bool = True) -> None:
+        """
+        记录一次调用的耗时与结果，修正该模型的延迟与失败率估计
+        :param model: 模型名称
+        :param seconds: 调用耗时（秒）
+        :param output_tokens: 输出token数
+        :param ok: 是否调用成功
+        """
+        if model not in self.models:
+            return
+        with self._lock:
+            stats = self._stats.setdefault(model, {"ms_per_token": self.models[model]["ms_per_token"], "error_rate": 0.0, "calls": 0})
+            stats["calls"] += 1
+            stats["error_rate"] = (1 - self.alpha) * stats["error_rate"] + self.alpha * (0.0 if ok else 1.0)
+            if ok and output_tokens > 0:
+                stats["ms_per_token"] = (1 - self.alpha) * stats["ms_per_token"] + self.alpha * seconds * 1000.0 / output_tokens
+            stats["updated_at"] = time.time()
+
+    def metrics(self) -> Dict[str, Dict]:
+        """各模型的配置与观测到的延迟、失败率"""
+        with self._lock:
+            return {
+                name: dict(config, observed={k: round(v, 3) for k, v in self._stats.get(name, {}).items()})
+                for name, config in self.models.items()
+            }
+
+
+def _load_models() -> Dict[str, Dict]:
+    # MODEL_ROUTER_MODELS 可以补充或覆盖模型配置，如 {"qwen-long": {"tier": 2, "cost": 0.5, "ms_per_token": 25, "max_input_chars": 500000}}
+    models = {name: dict(config) for name, config in DEFAULT_MODELS.items()}
+    extra = os.getenv("MODEL_ROUTER_MODELS")
+    if extra:
+        try:
+            for name, config in json.loads(extra).items():
+                models[name] = dict(models.get(name, {"tier": 2, "cost": 1.0, "ms_per_token": 25.0, "max_input_chars": 100000}), **config)
+        except (ValueError, AttributeError) as e:
+            logger.error(f"MODEL_ROUTER_MODELS 配置无效，使用默认模型列表: {e}")
+    return models
+
+
+def _default_slo() -> Optional[float]:
+    value = os.getenv("MODEL_ROUTER_SLO_SECONDS")
+    return float(value) if value else None
+
+
+model_router = ModelRouter(_load_models(), slo_seconds=_default_slo())
+
+
+def allowed_models(provider: Optional[str]) -> List[str]:
+    """
+    当前接口提供商可用的模型：千问接口只支持 qwen 系列，其他接口可用全部已配置模型
+    MODEL_ROUTER_CANDIDATES（逗号分隔）可以进一步限定参与路由的模型
+    """
+    names = list(model_router.models)
+    if provider in ("dashscope", "dashscope_sdk"):
+        names = [name for name in names if name.startswith("qwen-")]
+    restricted = os.getenv("MODEL_ROUTER_CANDIDATES")
+    if restricted:
+        wanted = {name.strip() for name in restricted.split(",") if name.strip()}
+        names = [name for name in names if name in wanted] or names
+    return names
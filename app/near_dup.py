@@ -0,0 +1,151 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 指纹位数与分段数：64位指纹切成8段，每段8位，汉明距离不超过7的指纹至少有一段完全相同
+FINGERPRINT_BITS = 64
+BANDS = 8
+BAND_BITS = FINGERPRINT_BITS // BANDS
+
+DEFAULT_INDEX_DB = Path(__file__).parent.parent / "data" / "simhash.db"
+
+# 计算指纹前去掉空白与标点，不同来源转载时排版与标点的差异不影响结果
+_NOISE = re.compile(r"[\s\u3000-\u303f\uff00-\uff0f\uff1a-\uff20\uff3b-\uff40\uff5b-\uff65!-/:-@\[-`{-~]+")
+
+
+def simhash(text: str, ngram: int = 3) -> int:
+    """
+    计算文本的64位SimHash指纹：以字符n-gram为特征、出现次数为权重
+    只改了标题、导语或个别字句的同一篇稿件，指纹只有少数几位不同
+    :param text: 文本
+    :param ngram: 特征的字符长度
+    :return: 指纹
+    """
+    normalized = _NOISE.sub("", text)
+    if len(normalized) <= ngram:
+        features = Counter([normalized])
+    else:
+        features = Counter(normalized[i:i + ngram] for i in range(len(normalized) - ngram + 1))
+    weights = [0] * FINGERPRINT_BITS
+    for feature, count in features.items():
+        value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += count if value >> bit & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def similarity(a: int, b: int) -> float:
+    """两个指纹的相似度：1 - 汉明距离 / 64"""
+    return 1.0 - (a ^ b).bit_count() / FINGERPRINT_BITS
+
+
+def _signed(value: int) -> int:
+    # SQLite整数是有符号64位
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class SimHashIndex:
+    """
+    已处理原文的近似重复索引（SQLite，本地文件），用于把同一新闻的不同转载版本映射到已生成的脚本
+    指纹按段建索引，查询时只比较至少有一段相同的候选，不需要遍历全部记录
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, threshold: float = 0.9, ttl_seconds: Optional[int] = None):
+        self.db_path = Path(db_path or os.getenv("SIMHASH_DB") or DEFAULT_INDEX_DB)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        if threshold < 1.0 - (BANDS - 1) / FINGERPRINT_BITS:
+            logger.warning(f"近似重复阈值 {threshold} 过低，分段索引只能保证找到相似度不低于 "
+                           f"{1.0 - (BANDS - 1) / FINGERPRINT_BITS:.3f} 的原文")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        band_columns = ", ".join(f"b{i} INTEGER NOT NULL" for i in range(BANDS))
+        self._db.executescript(f"""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                cache_key TEXT PRIMARY KEY,
+                fingerprint INTEGER NOT NULL,
+                style TEXT NOT NULL,
+                participants INTEGER NOT NULL,
+                text_len INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                {band_columns}
+            );
+        """ + "".join(
+            f"CREATE INDEX IF NOT EXISTS idx_fingerprints_b{i} ON fingerprints(b{i});" for i in range(BANDS)
+        ))
+        self._db.commit()
+
+    @staticmethod
+    def _bands(fingerprint: int):
+        mask = (1 << BAND_BITS) - 1
+        return [fingerprint >> (i * BAND_BITS) & mask for i in range(BANDS)]
+
+    def add(self, text: str, style: str, participants: int, cache_key: str) -> None:
+        """
+        登记已生成脚本的原文
+        :param text: 原文
+        :param style: 对话风格
+        :param participants: 参与人数
+        :param cache_key: 脚本在缓存中的键
+        """
+        fingerprint = simhash(text)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO fingerprints (cache_key, fingerprint, style, participants, text_len, created_at, "
+                f"{', '.join(f'b{i}' for i in range(BANDS))}) VALUES (?, ?, ?, ?, ?, ?, {', '.join('?' * BANDS)})",
+                (cache_key, _signed(fingerprint), style, participants, len(text), now, *self._bands(fingerprint))
+            )
+            if self.ttl_seconds:
+                # 脚本缓存过期后索引也没有意义
+                self._db.execute("DELETE FROM fingerprints WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._db.commit()
+
+    def find(self, text: str, style: str, participants: int, threshold: Optional[float] = None) -> Optional[Dict]:
+        """
+        查找风格与人数相同、相似度不低于阈值的已处理原文
+        :param text: 原文
+        :param style: 对话风格
+        :param participants: 参与人数
+        :param threshold: 相似度阈值，未指定时使用默认值
+        :return: {"cache_key", "similarity"}，相似度最高的一条；没有时返回 None
+        """
+        threshold = self.threshold if threshold is None else threshold
+        fingerprint = simhash(text)
+        bands = self._bands(fingerprint)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT cache_key, fingerprint, text_len FROM fingerprints WHERE style = ? AND participants = ? AND ("
+                + " OR ".join(f"b{i} = ?" for i in range(BANDS)) + ")",
+                (style, participants, *bands)
+            ).fetchall()
+        best = None
+        for row in rows:
+            score = similarity(fingerprint, row["fingerprint"] & ((1 << 64) - 1))
+            if score >= threshold and (best is None or score > best["similarity"]):
+                best = {"cache_key": row["cache_key"], "similarity": round(score, 4), "text_len": row["text_len"]}
+        return best
+
+    def remove(self, cache_key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM fingerprints WHERE cache_key = ?", (cache_key,))
+            self._db.commit()
+
+
+simhash_index = SimHashIndex(
+    threshold=float(os.getenv("NEAR_DUP_THRESHOLD", "0.9")),
+    ttl_seconds=int(os.getenv("SCRIPT_CACHE_TTL", "86400")) or None
+)
@@ -0,0 +1,147 @@
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from typing import AsyncIterator, Dict, Optional
+
+from audio_utils import audio_duration
+from qwen import stream_dialog_script
+from tts import tts_manager
+from scheduler import BATCH, INTERACTIVE, priority as use_priority
+
+logger = logging.getLogger(__name__)
+
+
+def synthesize_segment(index: int, text: str, speaker_id: str, profile: Optional[str] = None,
+                       audio_format: str = "mp3", priority: Optional[str] = None) -> Dict:
+    """
+    合成一段语音，出错时记录错误而不抛出，便于批量/流水线场景逐条返回结果
+    :param index: 分段序号
+    :param text: 文本
+    :param speaker_id: 说话人ID
+    :param profile: 输出配置名称
+    :param audio_format: 音频格式（未指定输出配置时使用）
+    :param priority: 调度优先级，为空时沿用当前请求的优先级
+    :return: 结果，包含 index、ok、audio_id、audio_url、duration 或 error
+    """
+    try:
+        with use_priority(priority):
+            audio_path = tts_manager.generate_speech(text, speaker_id, audio_format, profile=profile)
+        if not audio_path:
+            return {"index": index, "ok": False, "error": "语音生成失败"}
+        audio_id = tts_manager.audio_store.content_id_for(audio_path)
+        return {"index": index, "ok": True, "audio_id": audio_id, "audio_path": audio_path,
+                "audio_url": f"/audio/{audio_id}", "duration": audio_duration(audio_path)}
+    except Exception as e:
+        return {"index": index, "ok": False, "error": str(e)}
+
+
+async def podcast_pipeline(text: str, style: str = "casual", participants: int = 2, model: str = "deepseek-v3.2",
+                           profile: Optional[str] = None, concurrency: int = 3, latency_slo: Optional[float] = None,
+                           target_minutes: Optional[float] = None, reuse_similar: Optional[bool] = None,
+                           fresh: bool = False) -> AsyncIterator[Dict]:
+    """
+    脚本生成与语音合成流水线：模型流式输出中每解析出一段对话就放入合成队列，边写脚本边合成
+    第一段不经过队列、立即单独合成，保证首段音频最快可播；其余分段按序号优先级由固定数量的协程合成
+    :param text: 新闻原文
+    :param style: 对话风格
+    :param participants: 参与人数
+    :param model: 模型名称
+    :param profile: 输出配置名称
+    :param concurrency: 同时合成的分段数
+    :param latency_slo: 模型为 auto 时脚本生成的延迟目标（秒）
+    :param target_minutes: 目标节目时长（分钟）
+    :param reuse_similar: 原文与已处理原文近似重复时是否直接复用其脚本
+    :param fresh: 不使用缓存的脚本，总是重新生成
+    :return: 事件序列：segment（解析出的分段）、audio（分段合成结果）、script（完整脚本）、error、done（汇总）
+    """
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    tts_queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+    stop = threading.Event()
+    started = time.perf_counter()
+
+    def produce():
+        try:
+            for event in stream_dialog_script(text, style=style, participants=participants, model=model,
+                                              latency_slo=latency_slo, target_minutes=target_minutes,
+                                              reuse_similar=reuse_similar, fresh=fresh):
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(events.put_nowait, ("llm", event))
+        except Exception as e:
+            loop.call_soon_threadsafe(events.put_nowait, ("llm", {"type": "error", "error": str(e)}))
+        finally:
+            loop.call_soon_threadsafe(events.put_nowait, ("llm_done", None))
+
+    async def synthesize(index: int, segment: Dict):
+        # 首段决定首次出声的时间，按交互优先级调度，其余分段按批量处理
+        result = await asyncio.to_thread(synthesize_segment, index, segment["text"], segment.get("role", "host"), profile,
+                                         priority=INTERACTIVE if index == 0 else BATCH)
+        result.pop("audio_path", None)
+        await events.put(("audio", result))
+
+    async def worker():
+        while True:
+            index, segment = await tts_queue.get()
+            try:
+                await synthesize(index, segment)
+            finally:
+                tts_queue.task_done()
+
+    def enqueue(index: int, segment: Dict):
+        if index == 0:
+            tasks.append(asyncio.create_task(synthesize(index, segment)))
+        else:
+            tts_queue.put_nowait((index, segment))
+
+    def segment_event(index: int, segment: Dict) -> Dict:
+        role = segment.get("role", "host")
+        speaker = tts_manager.speakers.get(role, {}).get("name", role)
+        return {"type": "segment", "index": index, "role": role, "speaker": speaker, "text": segment["text"]}
+
+    tasks = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    loop.run_in_executor(None, contextvars.copy_context().run, produce)
+    queued = pending = succeeded = 0
+    llm_done = False
+    first_audio_ms = script_ms = None
+    try:
+        while not llm_done or pending:
+            kind, event = await events.get()
+            if kind == "llm_done":
+                llm_done = True
+            elif kind == "audio":
+                pending -= 1
+                if event["ok"]:
+                    succeeded += 1
+                    if first_audio_ms is None:
+                        first_audio_ms = round((time.perf_counter() - started) * 1000, 1)
+                yield dict(event, type="audio")
+            elif event["type"] == "segment":
+                enqueue(event["index"], event["segment"])
+                queued += 1
+                pending += 1
+                yield segment_event(event["index"], event["segment"])
+            elif event["type"] == "script":
+                script_ms = round((time.perf_counter() - started) * 1000, 1)
+                # 增量解析没能取出的分段（如JSON外包了代码块以外的格式），以最终解析结果补齐；解析失败的原文不合成
+                segments = [] if event["script"].get("error") else event["script"].get("segments", [])
+                for index, segment in enumerate(segments[queued:], start=queued):
+                    if segment.get("text"):
+                        enqueue(index, segment)
+                        pending += 1
+                        yield segment_event(index, segment)
+                queued = max(queued, len(segments))
+                yield event
+            else:
+                yield event
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"流水线完成，共 {queued} 段，成功 {succeeded} 段，首段音频 {first_audio_ms} ms，脚本 {script_ms} ms，总计 {total_ms} ms")
+        yield {"type": "done", "segments": queued, "succeeded": succeeded, "failed": queued - succeeded,
+               "first_audio_ms": first_audio_ms, "script_ms": script_ms, "total_ms": total_ms}
+    finally:
+        # 客户端断开时停止模型输出并取消未完成的合成
+        stop.set()
+        for task in tasks:
+            task.cancel()
@@ -1,7 +1,12 @@
 import os
+import re
 import json
+import time
 import logging
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, List, Optional
+
+from scheduler import llm_scheduler
+from model_router import allowed_models, model_router
 
 try:
     from dotenv import load_dotenv
@@ -41,6 +46,35 @@ if not root_logger.handlers:
 
 logger = logging.getLogger(__name__)
 
+# 共享存储在日志配置之后导入，连接信息才能写入日志
+from shared_backend import shared_state
+from near_dup import simhash_index
+
+# 中文播客语速约每分钟240字
+SPEECH_CHARS_PER_MINUTE = 240
+# 每个输出token大约对应的字符数，用于计算输出预算，以及提前结束时估算token使用量
+CHARS_PER_TOKEN = 1.5
+# 单次生成的输出token上限
+SCRIPT_MAX_OUTPUT_TOKENS = int(os.getenv("SCRIPT_MAX_OUTPUT_TOKENS", "8192"))
+# 输出因长度上限被截断时最多续写的次数
+SCRIPT_MAX_CONTINUATIONS = int(os.getenv("SCRIPT_MAX_CONTINUATIONS", "2"))
+
+# 长节目先生成提纲再并行展开各章节（mode=outline）；未指定 mode 时目标字数达到 OUTLINE_MIN_CHARS 自动使用
+OUTLINE_MIN_CHARS = int(os.getenv("OUTLINE_MIN_CHARS", "3600"))
+# 每个章节的目标字数，决定章节数（2~8个）
+OUTLINE_SECTION_CHARS = int(os.getenv("OUTLINE_SECTION_CHARS", "1200"))
+# 同时展开的章节数（同时受 LLM_MAX_CONCURRENCY 限制）
+OUTLINE_PARALLELISM = int(os.getenv("OUTLINE_PARALLELISM", "4"))
+
+# 局部重新生成时，提供给模型作为上下文的前后各若干段对话
+REGENERATE_CONTEXT_SEGMENTS = int(os.getenv("REGENERATE_CONTEXT_SEGMENTS", "6"))
+
+# 脚本缓存有效期（秒），多个实例通过共享存储复用相同输入的生成结果，0 表示不缓存
+SCRIPT_CACHE_TTL = int(os.getenv("SCRIPT_CACHE_TTL", "86400"))
+# 原文与已处理过的原文近似重复（同一新闻的不同转载版本）且风格、人数相同时，是否直接复用其脚本；
+# 关闭时仍会在结果的 near_duplicate 中给出可复用的脚本，由调用方决定
+NEAR_DUP_REUSE = os.getenv("NEAR_DUP_REUSE", "true").lower() in ("1", "true", "yes")
+
 _CLIENT = None
 _CLIENT_PROVIDER = None
 
@@ -354,27 +388,240 @@ def _call_qwen_api(prompt: str, system_prompt: str = None, model: str = "qwen-pl
         raise
 
 
-def generate_dialog_script(text: str, style: str = "casual", participants: int = 2, max_tokens: int = 4096, model: str = "deepseek-v3.2") -> Dict[str, Any]:
-    logger.info("开始生成对话脚本...")
-    logger.info(f"输入文本长度: {len(text)}")
-    logger.info(f"风格: {style}")
-    logger.info(f"参与人数: {participants}")
-    logger.info(f"max_tokens: {max_tokens}")
-    logger.info(f"模型: {model}")
-    
-    # 根据API提供商选择合适的模型名称
-    if _CLIENT_PROVIDER == "dashscope" or _CLIENT_PROVIDER == "dashscope_sdk":
-        # 千问API支持的模型名称
-        logger.info("使用千问API，检查模型名称...")
-        if model not in ["qwen-plus", "qwen-turbo", "qwen-max"]:
-            # 默认使用qwen-turbo
-            logger.info(f"模型 {model} 不是千问API支持的模型，将使用默认模型 qwen-turbo")
-            model = "qwen-turbo"
-        logger.info(f"最终使用的模型: {model}")
-    system_prompt = _get_style_prompt(style, participants)
-    logger.info(f"system_prompt生成完成，长度: {len(system_prompt)}")
-    
-    user_prompt = f"""请基于以下新闻创作一个引人入胜的播客对话：
+def _stream_qwen_api(prompt: str, system_prompt: str, model: str, max_tokens: int, token_usage: Dict[str, int],
+                     stream_info: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """
+    以流式方式调用模型，逐块返回新生成的文本
+    :param prompt: 用户提示词
+    :param system_prompt: 系统提示词
+    :param model: 模型名称
+    :param max_tokens: 最大生成token数
+    :param token_usage: 调用结束后写入token使用量
+    :param stream_info: 调用结束后写入结束原因 finish_reason（length 表示达到 max_tokens 被截断）
+    :return: 文本增量
+    """
+    if _CLIENT is None:
+        logger.error("Qwen/OpenAI client 未配置（请设置 OPENAI_API_KEY 或 DASHSCOPE_API_KEY）")
+        raise RuntimeError("Qwen/OpenAI client 未配置（请设置 OPENAI_API_KEY 或 DASHSCOPE_API_KEY）")
+
+    logger.info(f"开始流式API调用，API提供商: {_CLIENT_PROVIDER}，模型: {model}，max_tokens: {max_tokens}")
+    if _CLIENT_PROVIDER == "dashscope_sdk":
+        from dashscope import Generation
+        responses = Generation.call(
+            model=model,
+            prompt=prompt,
+            system=system_prompt,
+            max_tokens=max_tokens,
+            temperature=0.7,
+            stream=True,
+            incremental_output=True,
+        )
+        try:
+            for response in responses:
+                if response.status_code != 200:
+                    raise RuntimeError(f"DashScope API调用失败: {response.message}")
+                text = getattr(response.output, "text", None)
+                if text:
+                    yield text
+                finish_reason = getattr(response.output, "finish_reason", None)
+                if finish_reason and finish_reason != "null" and stream_info is not None:
+                    stream_info["finish_reason"] = finish_reason
+                usage = getattr(response, "usage", None)
+                if usage is not None and hasattr(usage, "input_tokens"):
+                    token_usage.update(
+                        prompt_tokens=usage.input_tokens,
+                        completion_tokens=usage.output_tokens,
+                        total_tokens=usage.total_tokens
+                    )
+        finally:
+            if hasattr(responses, "close"):
+                responses.close()
+        return
+
+    request = dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ],
+        max_tokens=max_tokens,
+        temperature=0.7,
+        stream=True,
+    )
+    try:
+        stream = _CLIENT.chat.completions.create(stream_options={"include_usage": True}, **request)
+    except Exception as e:
+        # 部分兼容接口不支持 stream_options，去掉后重试（此时拿不到token使用量）
+        logger.warning(f"流式请求不支持 stream_options，去掉后重试: {e}")
+        stream = _CLIENT.chat.completions.create(**request)
+    try:
+        for chunk in stream:
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+                if chunk.choices[0].finish_reason and stream_info is not None:
+                    stream_info["finish_reason"] = chunk.choices[0].finish_reason
+            usage = getattr(chunk, "usage", None)
+            if usage:
+                token_usage.update(
+                    prompt_tokens=getattr(usage, "prompt_tokens", 0),
+                    completion_tokens=getattr(usage, "completion_tokens", 0),
+                    total_tokens=getattr(usage, "total_tokens", 0)
+                )
+    finally:
+        # 调用方提前结束时关闭连接，服务端随之停止生成
+        stream.close()
+
+
+class SegmentStreamParser:
+    """
+    从流式返回的JSON文本中增量提取 segments 数组里已经完整的对话段
+    只扫描新到达的字符，记录字符串与括号嵌套状态，每闭合一个对话段对象就解析并返回
+    同时跟踪最外层JSON对象，闭合后 complete 为 True，调用方可以据此提前结束生成
+    """
+
+    _SEGMENTS_KEY = re.compile(r'"segments"\s*:\s*\[')
+
+    def __init__(self):
+        self.buffer = ""
+        self.count = 0
+        self._pos = 0
+        self._in_array = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start = 0
+        # 最外层对象的扫描状态
+        self._outer_pos = 0
+        self._outer_depth = 0
+        self._outer_in_string = False
+        self._outer_escape = False
+        self.complete = False
+        # 最外层对象结束位置（不含之后的多余输出）
+        self.end = None
+
+    @property
+    def started(self) -> bool:
+        """最外层JSON对象是否已经开始（已开始但未闭合说明输出不完整）"""
+        return self._outer_depth > 0 or self.complete
+
+    def _scan_outer(self) -> None:
+        buffer = self.buffer
+        for i in range(self._outer_pos, len(buffer)):
+            ch = buffer[i]
+            if self._outer_in_string:
+                if self._outer_escape:
+                    self._outer_escape = False
+                elif ch == "\\":
+                    self._outer_escape = True
+                elif ch == '"':
+                    self._outer_in_string = False
+            elif ch == '"':
+                # 第一个对象开始之前（如代码块标记）的引号不计入
+                self._outer_in_string = self._outer_depth > 0
+            elif ch == "{":
+                self._outer_depth += 1
+            elif ch == "}" and self._outer_depth > 0:
+                self._outer_depth -= 1
+                if self._outer_depth == 0:
+                    self.complete = True
+                    self.end = i + 1
+                    break
+        self._outer_pos = len(buffer)
+
+    def feed(self, text: str) -> List[Dict]:
+        """
+        追加一段模型输出
+        :param text: 新生成的文本
+        :return: 本次新解析出的完整对话段
+        """
+        self.buffer += text
+        if not self.complete:
+            self._scan_outer()
+        if self._finished:
+            return []
+        if not self._in_array:
+            # 从上次位置往前留一点余量，避免键名被分块截断
+            match = self._SEGMENTS_KEY.search(self.buffer, max(0, self._pos - 16))
+            if not match:
+                self._pos = len(self.buffer)
+                return []
+            self._in_array = True
+            self._pos = match.end()
+
+        segments = []
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        segment = json.loads(buffer[self._start:i + 1])
+                    except ValueError:
+                        segment = None
+                    if isinstance(segment, dict) and segment.get("text"):
+                        segments.append(segment)
+                        self.count += 1
+            elif ch == "]" and self._depth == 0:
+                self._finished = True
+                break
+        self._pos = len(buffer)
+        return segments
+
+
+def script_length_target(text_len: int, participants: int, target_minutes: Optional[float] = None) -> int:
+    """
+    目标对话字数：指定节目时长时按语速换算，否则随原文长度与参与人数增长（600~6000字）
+    :param text_len: 原文长度
+    :param participants: 参与人数
+    :param target_minutes: 目标节目时长（分钟）
+    :return: 目标字数
+    """
+    if target_minutes:
+        return int(target_minutes * SPEECH_CHARS_PER_MINUTE)
+    return int(min(max(600, text_len * 0.7 + participants * 300), 6000))
+
+
+def expected_script_tokens(target_chars: int) -> int:
+    # 对话文本 + 每段的JSON结构（约60字一段，每段约20个token）+ 角色与备注
+    return int(target_chars / CHARS_PER_TOKEN + target_chars / 60 * 20 + 150)
+
+
+def script_token_budget(target_chars: int) -> int:
+    """
+    输出token预算：预计用量留30%余量，限制在 768 ~ SCRIPT_MAX_OUTPUT_TOKENS 之间
+    :param target_chars: 目标对话字数
+    :return: max_tokens
+    """
+    return int(min(max(expected_script_tokens(target_chars) * 1.3, 768), SCRIPT_MAX_OUTPUT_TOKENS))
+
+
+def _estimate_usage(prompt: str, completion: str) -> Dict[str, Any]:
+    # 提前结束生成时接口不会返回用量，按字符数估算
+    prompt_tokens = int(len(prompt) / CHARS_PER_TOKEN)
+    completion_tokens = int(len(completion) / CHARS_PER_TOKEN)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens, "estimated": True}
+
+
+def _build_user_prompt(text: str, style: str, target_chars: Optional[int] = None) -> str:
+    return f"""请基于以下新闻创作一个引人入胜的播客对话：
 
 **新闻标题**：{text[:100]}...
 
@@ -419,7 +666,7 @@ def generate_dialog_script(text: str, style: str = "casual", participants: int =
 - 体现你的独特理解和感悟
 - 加入互动：主持人引导话题，嘉宾发表观点
 - 根据风格（{style}）调整语气
-- **重要：不要擅自给主持人和嘉宾起名字，只能使用"主持人"、"嘉宾A"、"嘉宾B"等代称**
+{f"- 篇幅：全部对话合计约{target_chars}字，写完结尾后立即结束JSON" + chr(10) if target_chars else ""}- **重要：不要擅自给主持人和嘉宾起名字，只能使用"主持人"、"嘉宾A"、"嘉宾B"等代称**
 
 输出JSON格式：
 {{
@@ -438,53 +685,536 @@ def generate_dialog_script(text: str, style: str = "casual", participants: int =
 
 直接返回JSON，不要其他文字。确保对话自然流畅，每个角色发言有明显个性区别。"""
 
+
+def _parse_script_response(resp_text: str, token_usage: Dict[str, int], model: str) -> Dict[str, Any]:
+    """
+    将模型返回的文本解析为对话脚本，依次尝试直接解析JSON、正则提取JSON，最后退回原始文本
+    :param resp_text: 模型返回的文本
+    :param token_usage: token使用量
+    :param model: 使用的模型
+    :return: 对话脚本
+    """
+    try:
+        logger.info("尝试解析JSON响应...")
+        parsed = json.loads(resp_text)
+        logger.info("JSON解析成功！")
+        logger.info(f"解析后的角色数量: {len(parsed.get('roles', []))}")
+        logger.info(f"解析后的对话段数: {len(parsed.get('segments', []))}")
+        parsed.setdefault("raw", resp_text)
+        parsed.setdefault("token_usage", token_usage)
+        parsed.setdefault("model", model)
+        logger.info("对话脚本生成成功！")
+        return parsed
+    except Exception as e:
+        logger.warning(f"JSON解析失败: {e}")
+        logger.info("尝试使用正则表达式提取JSON...")
+        import re
+        json_match = re.search(r'\{[\s\S]*\}', resp_text)
+        if json_match:
+            try:
+                parsed = json.loads(json_match.group())
+                logger.info("正则表达式提取JSON成功！")
+                logger.info(f"解析后的角色数量: {len(parsed.get('roles', []))}")
+                logger.info(f"解析后的对话段数: {len(parsed.get('segments', []))}")
+                parsed.setdefault("raw", resp_text)
+                parsed.setdefault("token_usage", token_usage)
+                parsed.setdefault("model", model)
+                logger.info("对话脚本生成成功！")
+                return parsed
+            except Exception as e2:
+                logger.error(f"正则表达式提取JSON也失败: {e2}")
+
+        logger.info("返回原始响应文本...")
+        return {
+            "roles": [{"id": "host", "name": "主持人", "title": "资深媒体人"}, {"id": "guest", "name": "嘉宾", "title": "城市治理专家"}],
+            "segments": [{"role": "host", "text": resp_text}],
+            "raw": resp_text,
+            "token_usage": token_usage,
+            "model": model,
+            "error": "JSON解析失败"
+        }
+
+
+def _resolve_model(model: str) -> str:
+    # 根据API提供商选择合适的模型名称
+    if _CLIENT_PROVIDER == "dashscope" or _CLIENT_PROVIDER == "dashscope_sdk":
+        # 千问API支持的模型名称
+        logger.info("使用千问API，检查模型名称...")
+        if model not in ["qwen-plus", "qwen-turbo", "qwen-max"]:
+            # 默认使用qwen-turbo
+            logger.info(f"模型 {model} 不是千问API支持的模型，将使用默认模型 qwen-turbo")
+            model = "qwen-turbo"
+        logger.info(f"最终使用的模型: {model}")
+    return model
+
+
+def _script_cache_key(text: str, style: str, participants: int, max_tokens: int, model: str, target_chars: int,
+                      mode: str = "single") -> str:
+    import hashlib
+    key = json.dumps([model, style, participants, max_tokens, target_chars, mode, text], ensure_ascii=False)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _cached_script(cache_key: str):
+    if SCRIPT_CACHE_TTL <= 0:
+        return None
+    script = shared_state.get_json("script", cache_key)
+    if script is not None:
+        logger.info(f"命中脚本缓存: {cache_key[:12]}")
+        script["cached"] = True
+    return script
+
+
+def _cache_script(cache_key: str, script: Dict[str, Any], text: str, style: str, participants: int) -> None:
+    # 解析失败、调用出错或续写后仍不完整的结果不缓存，下次重新生成
+    if SCRIPT_CACHE_TTL > 0 and not script.get("error") and not script.get("truncated"):
+        shared_state.set_json("script", cache_key, value=script, ttl=SCRIPT_CACHE_TTL)
+        try:
+            simhash_index.add(text, style, participants, cache_key)
+        except Exception as e:
+            logger.warning(f"登记近似重复索引失败: {e}")
+
+
+def _find_similar_script(text: str, style: str, participants: int, reuse: Optional[bool]):
+    """
+    查找与原文近似重复、风格与人数相同的已缓存脚本
+    :param reuse: 是否直接复用，未指定时使用 NEAR_DUP_REUSE
+    :return: (script, near_duplicate)：可复用时 script 为缓存的脚本；
+             只提示不复用时 script 为 None、near_duplicate 为 {"cache_key", "similarity", "reused": False}；都没有时为 (None, None)
+    """
+    if SCRIPT_CACHE_TTL <= 0:
+        return None, None
+    try:
+        match = simhash_index.find(text, style, participants)
+    except Exception as e:
+        logger.warning(f"查询近似重复索引失败: {e}")
+        return None, None
+    if match is None:
+        return None, None
+    script = shared_state.get_json("script", match["cache_key"])
+    if script is None:
+        # 脚本缓存已过期
+        simhash_index.remove(match["cache_key"])
+        return None, None
+    reuse = NEAR_DUP_REUSE if reuse is None else reuse
+    near_duplicate = {"cache_key": match["cache_key"], "similarity": match["similarity"], "reused": reuse}
+    if not reuse:
+        return None, near_duplicate
+    logger.info(f"原文与已处理原文近似重复（相似度 {match['similarity']}），复用脚本: {match['cache_key'][:12]}")
+    script["cached"] = True
+    script["near_duplicate"] = near_duplicate
+    return script, None
+
+
+def _merge_usage(total: Dict[str, Any], usage: Dict[str, Any]) -> None:
+    for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        total[key] = total.get(key, 0) + (usage.get(key) or 0)
+    if usage.get("estimated"):
+        total["estimated"] = True
+
+
+def _prefix_roles(text: str) -> Optional[List[Dict]]:
+    # 从被截断的输出中取出已经完整的 roles 数组
+    match = re.search(r'"roles"\s*:\s*\[', text)
+    if not match:
+        return None
+    try:
+        roles, _ = json.JSONDecoder().raw_decode(text, match.end() - 1)
+    except ValueError:
+        return None
+    return roles if isinstance(roles, list) else None
+
+
+def _build_continuation_prompt(user_prompt: str, segments: List[Dict], keep: int = 4) -> str:
+    return user_prompt + f"""
+
+**续写说明：**
+上一次输出因长度限制中断，前{len(segments)}段对话已经保留，最近几段如下：
+{json.dumps(segments[-keep:], ensure_ascii=False, indent=2)}
+
+请从第{len(segments) + 1}段接着写，不要重复已有内容，并完成结尾。只输出以下格式的JSON，不要其他文字：
+{{"segments": [{{"role": "host", "text": "..."}}]}}"""
+
+
+def _stream_script(user_prompt: str, system_prompt: str, model: str, max_tokens: int, target_chars: int,
+                   result: Dict[str, Any], max_continuations: Optional[int] = None) -> Iterator[Dict]:
+    """
+    流式生成脚本，逐个返回已经完整的对话段；最外层JSON闭合后立即断开，不再为多余输出等待和计费
+    输出达到长度上限被截断时保留已完整的分段，发起续写请求只生成剩余部分（最多 SCRIPT_MAX_CONTINUATIONS 次）
+    :param result: 结束后写入 text（脚本JSON文本）、token_usage（各次请求合计）、continuations（续写次数）、truncated
+    :param max_continuations: 最多续写次数，未指定时为 SCRIPT_MAX_CONTINUATIONS；为0时截断的输出原样写入 text
+    :return: 对话段
+    """
+    if max_continuations is None:
+        max_continuations = SCRIPT_MAX_CONTINUATIONS
+    total_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    segments: List[Dict] = []
+    roles = None
+    prompt, budget = user_prompt, max_tokens
+    for attempt in range(max_continuations + 1):
+        token_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        stream_info: Dict[str, Any] = {}
+        parser = SegmentStreamParser()
+        deltas = _stream_qwen_api(prompt, system_prompt, model, budget, token_usage, stream_info)
+        try:
+            for delta in deltas:
+                result["received"] = True
+                for segment in parser.feed(delta):
+                    segments.append(segment)
+                    yield segment
+                if parser.complete:
+                    logger.info(f"脚本JSON已完整，提前结束生成（{len(parser.buffer)} 字）")
+                    break
+        finally:
+            deltas.close()
+        text = parser.buffer[:parser.end] if parser.complete else parser.buffer
+        if not token_usage["total_tokens"]:
+            token_usage = _estimate_usage(system_prompt + prompt, text)
+        _merge_usage(total_usage, token_usage)
+        # 接口没有返回结束原因时，以JSON已开始但未闭合判断为截断
+        finish_reason = stream_info.get("finish_reason")
+        truncated = not parser.complete and (finish_reason == "length" or (finish_reason is None and parser.started))
+        if attempt == 0:
+            if not truncated or not max_continuations:
+                result.update(text=text, token_usage=total_usage, continuations=0, truncated=truncated)
+                return
+            roles = _prefix_roles(text)
+        if not truncated:
+            break
+        if attempt == max_continuations:
+            logger.warning(f"续写 {attempt} 次后输出仍被截断，返回已完成的 {len(segments)} 段")
+            break
+        written = sum(len(segment.get("text", "")) for segment in segments)
+        budget = script_token_budget(max(target_chars - written, 300))
+        logger.info(f"输出达到长度上限被截断，保留已完成的 {len(segments)} 段（{written} 字），续写剩余部分，max_tokens: {budget}")
+        prompt = _build_continuation_prompt(user_prompt, segments)
+    script = {
+        "roles": roles or [{"id": "host", "name": "主持人", "title": "资深媒体人"}, {"id": "guest", "name": "嘉宾", "title": "城市治理专家"}],
+        "segments": segments,
+    }
+    result.update(text=json.dumps(script, ensure_ascii=False), token_usage=total_usage, continuations=attempt, truncated=truncated)
+
+
+def _mark_continuations(script: Dict[str, Any], generated: Dict[str, Any]) -> None:
+    if generated.get("continuations"):
+        script["continuations"] = generated["continuations"]
+    if generated.get("truncated"):
+        script["truncated"] = True
+
+
+def _generate_script_text(user_prompt: str, system_prompt: str, model: str, max_tokens: int, target_chars: int) -> Dict[str, Any]:
+    """
+    生成脚本文本，流式调用不可用时退回一次性调用
+    :return: {"text", "token_usage", "continuations", "truncated"}
+    """
+    result: Dict[str, Any] = {}
+    try:
+        for _ in _stream_script(user_prompt, system_prompt, model, max_tokens, target_chars, result):
+            pass
+    except Exception as e:
+        if result.get("received"):
+            raise
+        logger.warning(f"流式调用失败，改用一次性调用: {e}")
+        text, token_usage = _call_qwen_api(user_prompt, system_prompt=system_prompt, model=model, max_tokens=max_tokens)
+        return {"text": text, "token_usage": token_usage, "continuations": 0, "truncated": False}
+    return result
+
+
+def _choose_model(text: str, style: str, participants: int, model: str, latency_slo: Optional[float],
+                  output_tokens: Optional[int] = None) -> tuple:
+    """
+    model 为 auto 时由路由策略选择模型，否则按指定模型
+    :return: (模型名称, 路由决策或 None)
+    """
+    if model != "auto":
+        return _resolve_model(model), None
+    routing = model_router.route(text, style=style, participants=participants, slo_seconds=latency_slo,
+                                 allowed=allowed_models(_CLIENT_PROVIDER), output_tokens=output_tokens)
+    return _resolve_model(routing["model"]), routing
+
+
+def _build_outline_prompt(text: str, style: str, target_chars: int, sections: int) -> str:
+    return f"""请基于以下新闻为一期播客设计提纲，全部对话合计约{target_chars}字，分为{sections}个章节。
+
+**新闻完整内容**：
+{text}
+
+**提纲要求：**
+- 每个章节给出标题、3-5个要点（beats）、参与发言的角色，以及开头和收尾发言的角色（用于章节之间的衔接）
+- 第一个章节负责开场钩子，最后一个章节负责总结并给听众留下思考题
+- 章节之间内容不重复，层层递进：先讲现象，再挖原因，最后讨论影响与解决方案
+- 根据风格（{style}）安排节奏
+- 角色id使用 host、guest（多位嘉宾时用 guestA、guestB），不要擅自给主持人和嘉宾起名字，只能使用"主持人"、"嘉宾A"、"嘉宾B"等代称
+
+输出JSON格式：
+{{
+  "roles": [
+    {{"id": "host", "name": "主持人", "title": "资深媒体人"}},
+    {{"id": "guest", "name": "嘉宾", "title": "城市治理专家"}}
+  ],
+  "sections": [
+    {{"title": "章节标题", "beats": ["要点1", "要点2", "要点3"], "roles": ["host", "guest"], "start_role": "host", "end_role": "guest"}}
+  ]
+}}
+
+直接返回JSON，不要其他文字。"""
+
+
+def _build_section_prompt(text: str, style: str, outline: Dict[str, Any], index: int, section_chars: int) -> str:
+    sections = outline["sections"]
+    section = sections[index]
+    role_ids = "、".join(role["id"] for role in outline["roles"])
+    if index == 0:
+        opening = "以开场钩子开始节目"
+    else:
+        opening = f"不要重新开场或问候听众，直接承接上一章节「{sections[index - 1].get('title', '')}」"
+    if index == len(sections) - 1:
+        ending = "完成节目总结，并给听众留下思考题"
+    else:
+        ending = f"不要总结或结束节目，结尾自然引出下一章节「{sections[index + 1].get('title', '')}」"
+    return f"""你和其他编辑分工撰写同一期播客，你负责第{index + 1}/{len(sections)}个章节。
+
+**新闻完整内容**：
+{text}
+
+**整期提纲**：
+{json.dumps(outline, ensure_ascii=False, indent=2)}
+
+**你负责的章节**：
+{json.dumps(section, ensure_ascii=False, indent=2)}
+
+**写作要求：**
+- 只写本章节的对话，约{section_chars}字，覆盖本章节的全部要点，不要展开其他章节的内容
+- 由 {section.get("start_role") or "host"} 开始发言，由 {section.get("end_role") or "guest"} 收尾
+- {opening}
+- {ending}
+- 角色只能使用提纲中的角色id：{role_ids}
+- 口语化，像真实播客一样，每段对话2-5句，角色交替发言
+- 根据风格（{style}）调整语气
+
+输出JSON格式：
+{{"segments": [{{"role": "host", "text": "..."}}]}}
+
+直接返回JSON，不要其他文字。"""
+
+
+def _normalize_roles(segments: List[Dict], roles: List[Dict]) -> List[Dict]:
+    # 各章节分别生成，个别章节可能用角色名代替id，统一映射回提纲中的角色id
+    by_name = {role.get("name"): role["id"] for role in roles if role.get("name")}
+    ids = {role["id"] for role in roles}
+    for segment in segments:
+        role = segment.get("role")
+        if role not in ids and role in by_name:
+            segment["role"] = by_name[role]
+    return segments
+
+
+def _expand_section(text: str, style: str, system_prompt: str, outline: Dict[str, Any], index: int, section_chars: int,
+                    model: str, max_tokens: Optional[int]) -> Dict[str, Any]:
+    """
+    展开一个章节，失败时重试一次
+    :return: {"segments", "token_usage", "continuations", "elapsed_ms"}
+    """
+    prompt = _build_section_prompt(text, style, outline, index, section_chars)
+    budget = min(script_token_budget(section_chars), max_tokens or SCRIPT_MAX_OUTPUT_TOKENS)
+    for attempt in range(2):
+        generated: Dict[str, Any] = {}
+        with llm_scheduler.slot():
+            started = time.perf_counter()
+            try:
+                segments = list(_stream_script(prompt, system_prompt, model, budget, section_chars, generated))
+            except Exception as e:
+                model_router.observe(model, time.perf_counter() - started, 0, ok=False)
+                if attempt:
+                    raise
+                logger.warning(f"章节 {index + 1} 展开失败，重试: {e}")
+                continue
+            elapsed = time.perf_counter() - started
+        usage = generated["token_usage"]
+        model_router.observe(model, elapsed, usage.get("completion_tokens") or len(generated["text"]))
+        if not segments:
+            # 没有流式解析出分段（如输出不是预期格式），按完整文本再解析一次
+            segments = [item for item in _parse_script_response(generated["text"], usage, model).get("segments", [])
+                        if isinstance(item, dict) and item.get("text")]
+        return {"segments": segments, "token_usage": usage, "continuations": generated.get("continuations", 0),
+                "elapsed_ms": round(elapsed * 1000, 1)}
+
+
+def _generate_outlined_script(text: str, style: str, participants: int, target_chars: int, model: str,
+                              max_tokens: Optional[int]) -> Optional[Dict[str, Any]]:
+    """
+    先生成简短提纲（章节、要点、角色衔接），再按提纲并行展开各章节，合并为一份脚本
+    各章节共享同一份提纲与系统提示词，保证角色与语气一致；总耗时取决于最慢的章节而不是全文长度
+    :return: 对话脚本，提纲生成或解析失败时返回 None（调用方退回整篇生成）
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import contextvars
+
+    section_count = max(2, min(8, round(target_chars / OUTLINE_SECTION_CHARS)))
+    section_chars = target_chars // section_count
+    system_prompt = _get_style_prompt(style, participants)
+    outline_prompt = _build_outline_prompt(text, style, target_chars, section_count)
+    outline_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    budget = 400 + 200 * section_count
+    with llm_scheduler.slot():
+        started = time.perf_counter()
+        # 续写请求是为对话段设计的，补不回被截断的提纲JSON；截断时加大预算重新生成一次
+        for attempt in range(2):
+            outline_result: Dict[str, Any] = {}
+            for _ in _stream_script(outline_prompt, system_prompt, model, budget, 0, outline_result, max_continuations=0):
+                pass
+            _merge_usage(outline_usage, outline_result["token_usage"])
+            if not outline_result.get("truncated") or attempt:
+                break
+            budget *= 2
+            logger.warning(f"提纲输出被截断，加大预算重新生成，max_tokens: {budget}")
+        outline_result["token_usage"] = outline_usage
+        outline_ms = round((time.perf_counter() - started) * 1000, 1)
+    try:
+        outline = json.loads(re.search(r"\{[\s\S]*\}", outline_result["text"]).group(0))
+        if not outline.get("sections") or not outline.get("roles"):
+            raise ValueError("提纲缺少 sections 或 roles")
+    except Exception as e:
+        logger.warning(f"提纲解析失败，改为整篇生成: {e}")
+        return None
+    sections = outline["sections"]
+    logger.info(f"提纲生成完成，共 {len(sections)} 个章节，耗时 {outline_ms}ms，开始并行展开")
+
+    # 每个章节使用独立的上下文副本，保留调用方的优先级与客户端标识
+    with ThreadPoolExecutor(max_workers=min(OUTLINE_PARALLELISM, len(sections)), thread_name_prefix="outline") as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, _expand_section, text, style, system_prompt, outline, index,
+                        section_chars, model, max_tokens)
+            for index in range(len(sections))
+        ]
+        results = []
+        for index, future in enumerate(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(f"章节 {index + 1} 展开失败: {e}")
+                results.append({"segments": [], "token_usage": {}, "continuations": 0, "elapsed_ms": None, "error": str(e)})
+
+    token_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    _merge_usage(token_usage, outline_result["token_usage"])
+    segments: List[Dict] = []
+    section_info = []
+    for index, (section, result) in enumerate(zip(sections, results)):
+        _merge_usage(token_usage, result["token_usage"])
+        start = len(segments)
+        segments.extend(_normalize_roles(result["segments"], outline["roles"]))
+        info = {"title": section.get("title"), "beats": section.get("beats", []), "start": start, "end": len(segments),
+                "token_usage": result["token_usage"], "elapsed_ms": result["elapsed_ms"]}
+        if result.get("continuations"):
+            info["continuations"] = result["continuations"]
+        if result.get("error"):
+            info["error"] = result["error"]
+        section_info.append(info)
+
+    script = {
+        "roles": outline["roles"],
+        "segments": segments,
+        "mode": "outline",
+        "sections": section_info,
+        "outline_token_usage": outline_result["token_usage"],
+        "outline_ms": outline_ms,
+        "token_usage": token_usage,
+        "model": model,
+    }
+    failed = [str(index + 1) for index, info in enumerate(section_info) if info.get("error")]
+    if failed:
+        script["error"] = f"第 {'、'.join(failed)} 章节生成失败"
+    return script
+
+
+def _use_outline(mode: Optional[str], target_chars: int) -> bool:
+    if mode == "outline":
+        return True
+    if mode == "single":
+        return False
+    return target_chars >= OUTLINE_MIN_CHARS
+
+
+def generate_dialog_script(text: str, style: str = "casual", participants: int = 2, max_tokens: Optional[int] = None,
+                           model: str = "deepseek-v3.2", latency_slo: Optional[float] = None,
+                           target_minutes: Optional[float] = None, mode: Optional[str] = None,
+                           reuse_similar: Optional[bool] = None, fresh: bool = False) -> Dict[str, Any]:
+    """
+    生成对话脚本
+    :param max_tokens: 输出token上限，未指定时按原文长度、参与人数与目标时长计算
+    :param model: 模型名称，auto 表示按输入长度、风格、人数与延迟自动选择（结果中的 routing 说明选择原因）
+    :param latency_slo: 自动选择模型时的延迟目标（秒）
+    :param target_minutes: 目标节目时长（分钟）
+    :param mode: single（整篇一次生成）或 outline（先生成提纲再并行展开章节），未指定时按目标字数自动选择
+    :param reuse_similar: 原文与已处理原文近似重复时是否直接复用其脚本，未指定时使用 NEAR_DUP_REUSE；
+                          不复用时结果的 near_duplicate 给出可复用脚本的缓存键与相似度
+    :param fresh: 为 True 时不读取脚本缓存、不复用近似重复原文的脚本，总是重新生成（新脚本仍会写入缓存）
+    """
+    target_chars = script_length_target(len(text), participants, target_minutes)
+    outlined = _use_outline(mode, target_chars)
+    explicit_max_tokens = max_tokens
+    max_tokens = max_tokens or script_token_budget(target_chars)
+    logger.info("开始生成对话脚本...")
+    logger.info(f"输入文本长度: {len(text)}")
+    logger.info(f"风格: {style}")
+    logger.info(f"参与人数: {participants}")
+    logger.info(f"max_tokens: {max_tokens}")
+    logger.info(f"模型: {model}")
+    
+    model, routing = _choose_model(text, style, participants, model, latency_slo, expected_script_tokens(target_chars))
+    system_prompt = _get_style_prompt(style, participants)
+    logger.info(f"system_prompt生成完成，长度: {len(system_prompt)}")
+    
+    cache_key = _script_cache_key(text, style, participants, max_tokens, model, target_chars,
+                                  "outline" if outlined else "single")
+    cached, near_duplicate = None, None
+    if not fresh:
+        cached = _cached_script(cache_key)
+        if cached is None:
+            cached, near_duplicate = _find_similar_script(text, style, participants, reuse_similar)
+    if cached is not None:
+        return dict(cached, routing=routing) if routing else cached
+    
+    if outlined:
+        try:
+            script = _generate_outlined_script(text, style, participants, target_chars, model, explicit_max_tokens)
+        except Exception as e:
+            logger.error(f"提纲生成失败，改为整篇生成: {e}")
+            script = None
+        if script is not None:
+            _cache_script(cache_key, script, text, style, participants)
+            if routing:
+                script["routing"] = routing
+            if near_duplicate:
+                script["near_duplicate"] = near_duplicate
+            return script
+    
+    user_prompt = _build_user_prompt(text, style, target_chars)
+
     logger.info(f"user_prompt生成完成，长度: {len(user_prompt)}")
 
     try:
         logger.info("开始调用API生成对话...")
-        resp_text, token_usage = _call_qwen_api(user_prompt, system_prompt=system_prompt, model=model, max_tokens=max_tokens)
+        with llm_scheduler.slot():
+            started = time.perf_counter()
+            try:
+                generated = _generate_script_text(user_prompt, system_prompt, model, max_tokens, target_chars)
+            except Exception:
+                model_router.observe(model, time.perf_counter() - started, 0, ok=False)
+                raise
+        resp_text, token_usage = generated["text"], generated["token_usage"]
+        model_router.observe(model, time.perf_counter() - started, token_usage.get("completion_tokens") or len(resp_text))
         logger.info(f"API调用完成，响应文本长度: {len(resp_text)}")
         logger.info(f"Token使用量: {token_usage}")
         
-        try:
-            logger.info("尝试解析JSON响应...")
-            parsed = json.loads(resp_text)
-            logger.info("JSON解析成功！")
-            logger.info(f"解析后的角色数量: {len(parsed.get('roles', []))}")
-            logger.info(f"解析后的对话段数: {len(parsed.get('segments', []))}")
-            parsed.setdefault("raw", resp_text)
-            parsed.setdefault("token_usage", token_usage)
-            parsed.setdefault("model", model)
-            logger.info("对话脚本生成成功！")
-            return parsed
-        except Exception as e:
-            logger.warning(f"JSON解析失败: {e}")
-            logger.info("尝试使用正则表达式提取JSON...")
-            import re
-            json_match = re.search(r'\{[\s\S]*\}', resp_text)
-            if json_match:
-                try:
-                    parsed = json.loads(json_match.group())
-                    logger.info("正则表达式提取JSON成功！")
-                    logger.info(f"解析后的角色数量: {len(parsed.get('roles', []))}")
-                    logger.info(f"解析后的对话段数: {len(parsed.get('segments', []))}")
-                    parsed.setdefault("raw", resp_text)
-                    parsed.setdefault("token_usage", token_usage)
-                    parsed.setdefault("model", model)
-                    logger.info("对话脚本生成成功！")
-                    return parsed
-                except Exception as e2:
-                    logger.error(f"正则表达式提取JSON也失败: {e2}")
-            
-            logger.info("返回原始响应文本...")
-            return {
-                "roles": [{"id": "host", "name": "主持人", "title": "资深媒体人"}, {"id": "guest", "name": "嘉宾", "title": "城市治理专家"}],
-                "segments": [{"role": "host", "text": resp_text}],
-                "raw": resp_text,
-                "token_usage": token_usage,
-                "model": model,
-                "error": "JSON解析失败"
-            }
+        script = _parse_script_response(resp_text, token_usage, model)
+        _mark_continuations(script, generated)
+        _cache_script(cache_key, script, text, style, participants)
+        if routing:
+            script["routing"] = routing
+        if near_duplicate:
+            script["near_duplicate"] = near_duplicate
+        return script
     except Exception as e:
         # 当模型调用失败时，不再输出机械拆分的文本，而是返回明确的错误信息
         logger.error(f"模型调用失败: {e}")
@@ -498,5 +1228,166 @@ def generate_dialog_script(text: str, style: str = "casual", participants: int =
             "token_usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
             "error": error_msg,
             "model": model,
-            "model_error": True
+            "model_error": True,
+            **({"routing": routing} if routing else {})
         }
+
+
+def _build_regenerate_prompt(script: Dict[str, Any], start: int, end: int, style: str,
+                             instruction: Optional[str], target_chars: int, context: int) -> str:
+    segments = script["segments"]
+    before = segments[max(0, start - context):start]
+    after = segments[end:end + context]
+    role_ids = "、".join(role["id"] for role in script.get("roles", []) if role.get("id")) or "host、guest"
+    if start == 0:
+        position = "这是节目的开场，要用钩子（令人惊讶的事实、反问或个人故事）吸引听众"
+    elif end == len(segments):
+        position = "这是节目的结尾，要完成总结并给听众留下思考题"
+    else:
+        position = "这是节目中间的一段，不要重新开场，也不要提前总结"
+    target = f"第{start + 1}段" if end - start == 1 else f"第{start + 1}~{end}段"
+    omitted_before = f"（此前还有{start - len(before)}段对话，从略）\n" if start > len(before) else ""
+    omitted_after = f"\n（此后还有{len(segments) - end - len(after)}段对话，从略）" if len(segments) > end + len(after) else ""
+    return f"""下面是一期播客对话脚本的片段，请重写其中{target}，其余对话保持不变。
+
+**角色**：
+{json.dumps(script.get("roles", []), ensure_ascii=False, indent=2)}
+
+**需要重写的对话之前**：
+{omitted_before}{json.dumps(before, ensure_ascii=False, indent=2) if before else "（无，从节目开头开始）"}
+
+**需要重写的对话（原文）**：
+{json.dumps(segments[start:end], ensure_ascii=False, indent=2)}
+
+**需要重写的对话之后**：
+{json.dumps(after, ensure_ascii=False, indent=2) if after else "（无，重写部分就是节目结尾）"}{omitted_after}
+
+**重写要求：**
+- {instruction or "换一种表达方式，让内容更生动、更有信息量"}
+- {position}
+- 开头要自然承接前面的对话，结尾要能自然引出后面的对话，不要重复前后已经说过的内容
+- 篇幅与原文相近，合计约{target_chars}字，段数可以调整
+- 角色只能使用：{role_ids}，角色交替发言，口语化，每段对话2-5句
+- 根据风格（{style}）调整语气
+
+输出JSON格式：
+{{"segments": [{{"role": "host", "text": "..."}}]}}
+
+直接返回JSON，不要其他文字。"""
+
+
+def regenerate_segments(script: Dict[str, Any], start: int, end: int, instruction: Optional[str] = None,
+                        style: str = "casual", model: str = "deepseek-v3.2",
+                        latency_slo: Optional[float] = None) -> Dict[str, Any]:
+    """
+    只重新生成脚本中 [start, end) 范围内的对话段，前后各 REGENERATE_CONTEXT_SEGMENTS 段作为上下文，其余对话不变
+    提示词与输出都只与修改范围的大小有关，与整期节目长度无关
+    :param script: 当前脚本（roles、segments）
+    :param start: 起始段序号（包含）
+    :param end: 结束段序号（不包含）
+    :param instruction: 修改要求，如"开场更有悬念"
+    :param style: 对话风格
+    :param model: 模型名称，auto 表示自动选择
+    :param latency_slo: 自动选择模型时的延迟目标（秒）
+    :return: {"start", "end", "segments"（替换 [start, end) 的新对话段）, "token_usage", "model", "elapsed_ms"}
+    """
+    segments = script.get("segments") or []
+    if not 0 <= start < end <= len(segments):
+        raise ValueError(f"分段范围无效: [{start}, {end})，脚本共 {len(segments)} 段")
+    roles = script.get("roles") or []
+    target_chars = max(sum(len(segment.get("text", "")) for segment in segments[start:end]), 60)
+    original = "".join(segment.get("text", "") for segment in segments[start:end])
+    model, routing = _choose_model(original, style, max(len(roles), 2), model, latency_slo,
+                                   expected_script_tokens(target_chars))
+    system_prompt = _get_style_prompt(style, max(len(roles), 2))
+    prompt = _build_regenerate_prompt(script, start, end, style, instruction, target_chars, REGENERATE_CONTEXT_SEGMENTS)
+    budget = int(min(max(expected_script_tokens(target_chars) * 1.3, 256), SCRIPT_MAX_OUTPUT_TOKENS))
+    logger.info(f"局部重新生成对话段 [{start}, {end})，共 {len(segments)} 段，目标字数: {target_chars}，"
+                f"max_tokens: {budget}，提示词长度: {len(prompt)}")
+
+    generated: Dict[str, Any] = {}
+    with llm_scheduler.slot():
+        started = time.perf_counter()
+        try:
+            replaced = list(_stream_script(prompt, system_prompt, model, budget, target_chars, generated))
+        except Exception:
+            model_router.observe(model, time.perf_counter() - started, 0, ok=False)
+            raise
+        elapsed = time.perf_counter() - started
+    usage = generated["token_usage"]
+    model_router.observe(model, elapsed, usage.get("completion_tokens") or len(generated["text"]))
+    if not replaced:
+        replaced = [item for item in _parse_script_response(generated["text"], usage, model).get("segments", [])
+                    if isinstance(item, dict) and item.get("text")]
+    if not replaced:
+        raise ValueError("模型没有返回可用的对话段")
+    result = {
+        "start": start,
+        "end": end,
+        "segments": _normalize_roles(replaced, roles),
+        "token_usage": usage,
+        "model": model,
+        "elapsed_ms": round(elapsed * 1000, 1),
+    }
+    if generated.get("truncated"):
+        result["truncated"] = True
+    if routing:
+        result["routing"] = routing
+    return result
+
+
+def stream_dialog_script(text: str, style: str = "casual", participants: int = 2, max_tokens: Optional[int] = None,
+                         model: str = "deepseek-v3.2", latency_slo: Optional[float] = None,
+                         target_minutes: Optional[float] = None,
+                         reuse_similar: Optional[bool] = None, fresh: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    流式生成对话脚本，每解析出一个完整的对话段就立即返回，便于下游边生成边合成语音
+    近似重复原文的处理与跳过缓存的方式与 generate_dialog_script 相同（reuse_similar、fresh）
+    :return: 事件序列：{"type": "segment", "index", "segment"}，最后是 {"type": "script", "script"}；
+             调用失败时返回 {"type": "error", "error"}
+    """
+    target_chars = script_length_target(len(text), participants, target_minutes)
+    max_tokens = max_tokens or script_token_budget(target_chars)
+    logger.info(f"开始流式生成对话脚本，输入文本长度: {len(text)}，风格: {style}，参与人数: {participants}，"
+                f"目标字数: {target_chars}，max_tokens: {max_tokens}")
+    model, routing = _choose_model(text, style, participants, model, latency_slo, expected_script_tokens(target_chars))
+    cache_key = _script_cache_key(text, style, participants, max_tokens, model, target_chars)
+    cached, near_duplicate = None, None
+    if not fresh:
+        cached = _cached_script(cache_key)
+        if cached is None:
+            cached, near_duplicate = _find_similar_script(text, style, participants, reuse_similar)
+    if cached is not None:
+        for index, segment in enumerate(cached.get("segments", [])):
+            yield {"type": "segment", "index": index, "segment": segment}
+        yield {"type": "script", "script": dict(cached, routing=routing) if routing else cached}
+        return
+    system_prompt = _get_style_prompt(style, participants)
+    user_prompt = _build_user_prompt(text, style, target_chars)
+    generated: Dict[str, Any] = {}
+    count = 0
+
+    try:
+        with llm_scheduler.slot():
+            started = time.perf_counter()
+            for segment in _stream_script(user_prompt, system_prompt, model, max_tokens, target_chars, generated):
+                yield {"type": "segment", "index": count, "segment": segment}
+                count += 1
+            model_router.observe(model, time.perf_counter() - started,
+                                 generated["token_usage"].get("completion_tokens") or len(generated["text"]))
+    except Exception as e:
+        model_router.observe(model, 0.0, 0, ok=False)
+        logger.error(f"流式模型调用失败: {e}")
+        yield {"type": "error", "error": f"模型调用失败: {str(e)}"}
+        return
+
+    resp_text, token_usage = generated["text"], generated["token_usage"]
+    logger.info(f"流式生成完成，响应文本长度: {len(resp_text)}，增量解析出 {count} 段，Token使用量: {token_usage}")
+    script = _parse_script_response(resp_text, token_usage, model)
+    _mark_continuations(script, generated)
+    _cache_script(cache_key, script, text, style, participants)
+    if routing:
+        script["routing"] = routing
+    if near_duplicate:
+        script["near_duplicate"] = near_duplicate
+    yield {"type": "script", "script": script}
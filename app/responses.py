@@ -0,0 +1,135 @@
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import anyio
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def dumps_json(content: Any) -> bytes:
+    """
+    将数据序列化为JSON字节串，优先使用orjson
+    :param content: 要序列化的数据
+    :return: UTF-8编码的JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    import json
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """使用orjson序列化的JSON响应，未安装orjson时退回标准库json"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单个字节区间，返回闭区间 (start, end)
+    没有 Range 头或包含多个区间时返回 None（按完整文件响应），区间无法满足时抛出 ValueError
+    """
+    if not range_header or "," in range_header:
+        return None
+    match = _RANGE.match(range_header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+    if match.group(1):
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else size - 1
+    else:
+        # bytes=-N 表示最后N个字节
+        start = max(0, size - int(match.group(2)))
+        end = size - 1
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError("Range Not Satisfiable")
+    return start, end
+
+
+class RangeFileResponse(Response):
+    """
+    支持Range与条件请求的文件响应
+    ASGI服务器提供 zerocopy/pathsend 扩展时直接由服务器发送文件（sendfile），否则在线程中分块读取
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, path: Path, size: int, etag: str, media_type: str, request_headers: Dict[str, str],
+                 method: str = "GET", cache_control: str = "public, max-age=86400"):
+        self.path = Path(path)
+        self.size = size
+        self.media_type = media_type
+        self.background = None
+        self.send_body = method != "HEAD"
+        self.start, self.end = 0, size - 1
+        headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": cache_control}
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            self.status_code = 304
+            self.send_body = False
+            self.length = 0
+            self.init_headers(headers)
+            return
+
+        byte_range = None
+        if_range = request_headers.get("if-range")
+        # If-Range 与当前ETag不一致说明文件已变化，返回完整内容
+        if not if_range or if_range.strip() == etag:
+            try:
+                byte_range = parse_range(request_headers.get("range"), size)
+            except ValueError:
+                self.status_code = 416
+                self.send_body = False
+                self.length = 0
+                headers["Content-Range"] = f"bytes */{size}"
+                self.init_headers(headers)
+                return
+
+        if byte_range:
+            self.start, self.end = byte_range
+            self.status_code = 206
+            headers["Content-Range"] = f"bytes {self.start}-{self.end}/{size}"
+        else:
+            self.status_code = 200
+        self.length = self.end - self.start + 1
+        self.init_headers(headers)
+        self.headers["content-length"] = str(self.length)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or self.length <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopy" in extensions:
+            with open(self.path, "rb") as f:
+                await send({"type": "http.response.zerocopy", "file": f, "offset": self.start,
+                            "count": self.length, "more_body": False})
+            return
+        if "http.response.pathsend" in extensions and self.status_code == 200:
+            await send({"type": "http.response.pathsend", "path": os.fspath(self.path)})
+            return
+
+        async with await anyio.open_file(self.path, "rb") as f:
+            await f.seek(self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
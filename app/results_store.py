@@ -0,0 +1,309 @@
+import os
+import re
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESULT_DIR = Path(__file__).parent.parent / "results"
+DEFAULT_RESULTS_DB = Path(__file__).parent.parent / "data" / "results.db"
+
+# 文件名只保留文字（含中文）、数字、下划线、短横线与点，去掉目录部分，防止写到结果目录之外
+_UNSAFE_FILENAME = re.compile(r"[^\w.-]+")
+MAX_FILENAME_CHARS = 80
+MAX_PAGE_SIZE = 100
+
+# trigram 分词按连续3个字符建索引，中文不需要分词词典；含2个字符以内检索词（中文最常见的词长）的查询走二元索引：
+# 文本按连续2个字符切成以空格分隔的词元写入 unicode61 分词的全文表，检索词切分后按短语匹配，即相邻二元组依次出现；
+# 每段文字末尾再补一个单字词元，使每个字符都是某个词元的开头，单字检索词用前缀查询（有1字前缀索引）
+TRIGRAM_CHARS = 3
+# 二元切分只取文字与数字，标点、空白与下划线作为分隔
+_BIGRAM_RUN = re.compile(r"[^\W_]+")
+
+
+def sanitize_filename(filename: Optional[str], default: str = "播客对话") -> str:
+    """
+    把客户端提供的文件名整理为结果目录下安全的文件名（统一为 .txt）
+    :param filename: 客户端提供的文件名
+    :param default: 整理后为空时使用的文件名
+    :return: 文件名
+    """
+    name = Path((filename or "").replace("\\", "/")).name
+    stem = name[:-4] if name.lower().endswith(".txt") else name
+    stem = _UNSAFE_FILENAME.sub("_", stem).strip("._")[:MAX_FILENAME_CHARS]
+    return f"{stem or default}.txt"
+
+
+def bigrams(text: str, terminal: bool = True) -> List[str]:
+    """
+    把文本切成二元词元：每段连续的文字按相邻两个字符切分
+    :param text: 文本
+    :param terminal: 是否在每段末尾补上最后一个字符（建索引时使用；检索词切分时不补，否则短语无法与原文衔接）
+    :return: 词元列表
+    """
+    tokens = []
+    for run in _BIGRAM_RUN.findall(text.lower()):
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        if terminal or len(run) == 1:
+            tokens.append(run[-1])
+    return tokens
+
+
+def _snippet(text: str, terms: List[str], width: int = 40) -> str:
+    # 截取第一个命中检索词附近的文字作为摘要
+    lowered = text.lower()
+    positions = [lowered.find(term.lower()) for term in terms]
+    position = min((p for p in positions if p >= 0), default=0)
+    start = max(0, position - width // 2)
+    snippet = text[start:start + width].replace("\n", " ")
+    return ("…" if start > 0 else "") + snippet + ("…" if start + width < len(text) else "")
+
+
+class ResultStore:
+    """
+    已保存对话的索引（SQLite，本地文件）：文本文件保存在结果目录，元数据、脚本与全文索引保存在数据库
+    列表与检索按ID倒序分页（游标为上一页最后一条的ID），不使用 OFFSET，翻到很深的页也只读取一页的行
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, result_dir: Optional[Path] = None):
+        self.db_path = Path(db_path or os.getenv("RESULTS_DB") or DEFAULT_RESULTS_DB)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.result_dir = Path(result_dir or os.getenv("RESULTS_DIR") or DEFAULT_RESULT_DIR)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT NOT NULL,
+                title TEXT NOT NULL,
+                source_hash TEXT,
+                style TEXT,
+                model TEXT,
+                participants INTEGER NOT NULL,
+                segments INTEGER NOT NULL,
+                chars INTEGER NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                total_tokens INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_results_source ON results(source_hash, id);
+            CREATE INDEX IF NOT EXISTS idx_results_style ON results(style, id);
+            CREATE INDEX IF NOT EXISTS idx_results_model ON results(model, id);
+            CREATE TABLE IF NOT EXISTS result_scripts (
+                id INTEGER PRIMARY KEY,
+                script TEXT NOT NULL
+            );
+        """)
+        self.tokenizer = "trigram"
+        try:
+            self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(text, tokenize='trigram')")
+        except sqlite3.OperationalError:
+            # SQLite 3.34 之前没有 trigram 分词，中文检索只能逐行 LIKE 匹配
+            logger.warning(f"SQLite {sqlite3.sqlite_version} 不支持 trigram 分词，对话检索将逐行匹配")
+            self.tokenizer = "unicode61"
+            self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(text)")
+        # 二元索引只用于定位，不保存原文（contentless），摘要从 results_fts 读取
+        backfill = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'results_bigram'"
+        ).fetchone() is None
+        self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS results_bigram USING fts5(tokens, content='', prefix='1')")
+        if backfill:
+            self._backfill_bigrams()
+        self._db.commit()
+
+    def _backfill_bigrams(self) -> None:
+        # 建立二元索引之前保存的对话补建索引
+        count = 0
+        for row in self._db.execute("SELECT rowid, text FROM results_fts").fetchall():
+            self._db.execute("INSERT INTO results_bigram (rowid, tokens) VALUES (?, ?)", (row[0], " ".join(bigrams(row[1]))))
+            count += 1
+        if count:
+            logger.info(f"为 {count} 条已保存的对话建立二元索引")
+
+    # 文件写入
+    def _write_file(self, filename: str, content: str) -> str:
+        """
+        原子写入对话文本：先写临时文件再替换，读到的文件要么不存在要么是完整内容
+        同名文件已存在时加上随机后缀，不覆盖之前保存的对话
+        :return: 实际使用的文件名
+        """
+        self.result_dir.mkdir(parents=True, exist_ok=True)
+        stem = filename[:-4]
+        name = filename
+        while True:
+            try:
+                # 以独占方式占用文件名，并发保存同名对话时不会互相覆盖
+                os.close(os.open(self.result_dir / name, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                name = f"{stem}_{uuid.uuid4().hex[:6]}.txt"
+        path = self.result_dir / name
+        tmp = path.with_name(f".{name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            path.unlink(missing_ok=True)
+            raise
+        return name
+
+    def save(self, content: str, script: Dict, filename: Optional[str] = None, source_text: Optional[str] = None,
+             style: Optional[str] = None, model: Optional[str] = None,
+             token_usage: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        保存对话：写入文本文件，登记元数据并建立全文索引
+        :param content: 对话文本
+        :param script: 结构化脚本
+        :param filename: 客户端提供的文件名，会被整理为安全的文件名
+        :param source_text: 原文，只保存其哈希，用于查找同一原文生成的对话
+        :param style: 对话风格
+        :param model: 使用的模型，未指定时取脚本中的 model
+        :param token_usage: token使用量，未指定时取脚本中的 token_usage
+        :return: 保存记录的元数据
+        """
+        segments = [segment for segment in script.get("segments") or [] if isinstance(segment, dict)]
+        text = "\n".join(str(segment.get("text") or "") for segment in segments) or content
+        usage = token_usage or script.get("token_usage") or {}
+        title = (segments[0].get("text") if segments else content.strip()) or ""
+        record = {
+            "filename": self._write_file(sanitize_filename(filename), content),
+            "title": str(title)[:40],
+            "source_hash": hashlib.sha1(source_text.encode("utf-8")).hexdigest() if source_text else None,
+            "style": style,
+            "model": model or script.get("model"),
+            "participants": len(script.get("roles") or []),
+            "segments": len(segments),
+            "chars": len(text),
+            "prompt_tokens": int(usage.get("prompt_tokens") or 0),
+            "completion_tokens": int(usage.get("completion_tokens") or 0),
+            "total_tokens": int(usage.get("total_tokens") or 0),
+            "created_at": time.time(),
+        }
+        columns = ", ".join(record)
+        with self._lock:
+            try:
+                cursor = self._db.execute(
+                    f"INSERT INTO results ({columns}) VALUES ({', '.join('?' * len(record))})", tuple(record.values())
+                )
+                result_id = cursor.lastrowid
+                self._db.execute("INSERT INTO result_scripts (id, script) VALUES (?, ?)",
+                                 (result_id, json.dumps(script, ensure_ascii=False)))
+                self._db.execute("INSERT INTO results_fts (rowid, text) VALUES (?, ?)", (result_id, text))
+                self._db.execute("INSERT INTO results_bigram (rowid, tokens) VALUES (?, ?)",
+                                 (result_id, " ".join(bigrams(text))))
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                (self.result_dir / record["filename"]).unlink(missing_ok=True)
+                raise
+        logger.info(f"对话已保存: {record['filename']}（ID {result_id}）")
+        return {"id": result_id, **record}
+
+    # 查询
+    @staticmethod
+    def _page(rows: List[sqlite3.Row], limit: int) -> Dict[str, Any]:
+        items = [dict(row) for row in rows[:limit]]
+        return {"items": items, "next_cursor": items[-1]["id"] if len(rows) > limit else None}
+
+    def list(self, limit: int = 20, cursor: Optional[int] = None, style: Optional[str] = None,
+             model: Optional[str] = None, source_hash: Optional[str] = None) -> Dict[str, Any]:
+        """
+        按保存时间倒序列出对话
+        :param limit: 每页条数
+        :param cursor: 上一页返回的 next_cursor，为空时从最新的一条开始
+        :param style: 只列出该风格的对话
+        :param model: 只列出该模型生成的对话
+        :param source_hash: 只列出该原文生成的对话
+        :return: {"items", "next_cursor"}，没有下一页时 next_cursor 为 None
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        conditions, params = [], []
+        for column, value in (("style", style), ("model", model), ("source_hash", source_hash)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if cursor:
+            conditions.append("id < ?")
+            params.append(cursor)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT * FROM results {where} ORDER BY id DESC LIMIT ?", (*params, limit + 1)
+            ).fetchall()
+        return self._page(rows, limit)
+
+    def search(self, query: str, limit: int = 20, cursor: Optional[int] = None) -> Dict[str, Any]:
+        """
+        在对话文本中检索，多个检索词（空格分隔）需同时出现，结果按保存时间倒序
+        检索词都不少于3个字符时使用 trigram 索引，否则使用二元索引，都不需要逐条扫描
+        :param query: 检索词
+        :param limit: 每页条数
+        :param cursor: 上一页返回的 next_cursor
+        :return: {"items", "next_cursor"}，每条带命中位置附近的摘要 snippet
+        """
+        terms = [term for term in query.split() if term]
+        if not terms:
+            raise ValueError("检索词为空")
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        if self.tokenizer == "trigram" and all(len(term) >= TRIGRAM_CHARS for term in terms):
+            source, index, column = "results_fts f", "f", "f.text"
+            phrases = {term: '"' + term.replace('"', '""') + '"' for term in terms}
+        else:
+            source, index, column = "results_bigram b JOIN results_fts f ON f.rowid = b.rowid", "b", "b.tokens"
+            phrases = {}
+            for term in terms:
+                tokens = bigrams(term, terminal=False)
+                if len(tokens) == 1 and len(tokens[0]) == 1:
+                    phrases[term] = f'"{tokens[0]}"*'
+                elif tokens:
+                    phrases[term] = '"' + " ".join(tokens) + '"'
+        if not phrases:
+            raise ValueError("检索词中没有可检索的文字")
+        conditions = [f"{column} MATCH ?"]
+        params: List[Any] = [" ".join(phrases.values())]
+        # 只有标点等符号的检索词没有词元，在索引命中的结果中逐条过滤
+        for term in terms:
+            if term not in phrases:
+                conditions.append("f.text LIKE ? ESCAPE '\\'")
+                params.append("%" + re.sub(r"([\\%_])", r"\\\1", term) + "%")
+        if cursor:
+            conditions.append(f"{index}.rowid < ?")
+            params.append(cursor)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT r.*, f.text AS text FROM {source} JOIN results r ON r.id = {index}.rowid "
+                f"WHERE {' AND '.join(conditions)} ORDER BY {index}.rowid DESC LIMIT ?", (*params, limit + 1)
+            ).fetchall()
+        page = self._page(rows, limit)
+        for item in page["items"]:
+            item["snippet"] = _snippet(item.pop("text"), terms)
+        return page
+
+    def get(self, result_id: int) -> Optional[Dict[str, Any]]:
+        """读取一条保存记录的元数据与脚本"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT r.*, s.script FROM results r LEFT JOIN result_scripts s ON s.id = r.id WHERE r.id = ?",
+                (result_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record["script"] = json.loads(record["script"]) if record["script"] else None
+        return record
+
+
+result_store = ResultStore()
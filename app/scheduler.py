@@ -0,0 +1,195 @@
+import os
+import time
+import heapq
+import logging
+import itertools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 优先级：交互（用户点击试听、生成脚本）> 批量（整期合成）> 后台（预生成、重建等）
+INTERACTIVE = "interactive"
+BATCH = "batch"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BATCH, BACKGROUND)
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("priority", default=BATCH)
+_client_id: contextvars.ContextVar = contextvars.ContextVar("client_id", default="local")
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def current_client() -> str:
+    return _client_id.get()
+
+
+def set_priority(priority: str) -> None:
+    """设置当前请求（及其派生线程）的优先级"""
+    _priority.set(priority if priority in PRIORITIES else BATCH)
+
+
+@contextmanager
+def priority(priority: Optional[str]) -> Iterator[None]:
+    """在代码块内临时使用指定优先级，为空时保持不变"""
+    if not priority:
+        yield
+        return
+    token = _priority.set(priority if priority in PRIORITIES else BATCH)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class ClientContextMiddleware:
+    """
+    ASGI中间件：按 X-Client-Id 请求头（没有时用客户端IP）标识调用方，供公平调度使用
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            client_id = None
+            for name, value in scope.get("headers", []):
+                if name == b"x-client-id":
+                    client_id = value.decode("latin-1")[:64]
+                    break
+            if not client_id:
+                client = scope.get("client")
+                client_id = client[0] if client else "local"
+            _client_id.set(client_id)
+            _priority.set(BATCH)
+        await self.app(scope, receive, send)
+
+
+class _Waiter:
+    __slots__ = ("tag", "seq", "priority", "client_id", "enqueued_at", "granted")
+
+    def __init__(self, tag: float, seq: int, priority: str, client_id: str):
+        self.tag = tag
+        self.seq = seq
+        self.priority = priority
+        self.client_id = client_id
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.tag, self.seq) < (other.tag, other.seq)
+
+
+class FairScheduler:
+    """
+    限制对上游接口的并发调用：不同优先级之间严格按优先级放行，同一优先级内按调用方做加权公平排队（WFQ），
+    一个调用方提交大量任务不会挤占其他调用方；低优先级任务等待超过 starvation_seconds 后提前放行，避免饿死
+    """
+
+    def __init__(self, name: str, capacity: int, starvation_seconds: float = 10.0):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.starvation_seconds = starvation_seconds
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._queues: Dict[str, List[_Waiter]] = {p: [] for p in PRIORITIES}
+        # 每个优先级的虚拟时间，以及各调用方最近一次排队的完成标签
+        self._virtual: Dict[str, float] = {p: 0.0 for p in PRIORITIES}
+        self._finish: Dict[str, Dict[str, float]] = {p: {} for p in PRIORITIES}
+        self._waits: Dict[str, deque] = {p: deque(maxlen=2048) for p in PRIORITIES}
+        self._served: Dict[str, int] = {p: 0 for p in PRIORITIES}
+
+    @contextmanager
+    def slot(self, cost: float = 1.0) -> Iterator[None]:
+        """
+        占用一个并发名额，按当前上下文的优先级与调用方排队
+        :param cost: 本次调用的相对开销（如文本长度），开销大的调用方在公平排队中让出更多
+        """
+        self._acquire(current_priority(), current_client(), max(cost, 0.001))
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _acquire(self, priority: str, client_id: str, cost: float) -> None:
+        with self._cond:
+            if self.in_flight < self.capacity and not any(self._queues.values()):
+                self.in_flight += 1
+                self._served[priority] += 1
+                self._waits[priority].append(0.0)
+                return
+            finish = self._finish[priority]
+            tag = max(self._virtual[priority], finish.get(client_id, 0.0)) + cost
+            finish[client_id] = tag
+            waiter = _Waiter(tag, next(self._seq), priority, client_id)
+            heapq.heappush(self._queues[priority], waiter)
+            self._dispatch()
+            while not waiter.granted:
+                self._cond.wait()
+            self._waits[priority].append((time.monotonic() - waiter.enqueued_at) * 1000)
+
+    def _release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._dispatch()
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        now = time.monotonic()
+        for priority in PRIORITIES[1:]:
+            queue = self._queues[priority]
+            if queue and now - queue[0].enqueued_at > self.starvation_seconds:
+                return heapq.heappop(queue)
+        for priority in PRIORITIES:
+            if self._queues[priority]:
+                return heapq.heappop(self._queues[priority])
+        return None
+
+    def _dispatch(self) -> None:
+        # 调用方需持有锁
+        granted = False
+        while self.in_flight < self.capacity:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            waiter.granted = True
+            granted = True
+            self.in_flight += 1
+            self._served[waiter.priority] += 1
+            self._virtual[waiter.priority] = waiter.tag
+            if not self._queues[waiter.priority]:
+                # 队列清空后各调用方重新从同一起点排队
+                self._finish[waiter.priority].clear()
+        if granted:
+            self._cond.notify_all()
+
+    def metrics(self) -> Dict:
+        """
+        调度指标：各优先级的排队数、已放行数与等待时间分位数（毫秒，最近2048次）
+        """
+        with self._cond:
+            classes = {}
+            for priority in PRIORITIES:
+                waits = sorted(self._waits[priority])
+                classes[priority] = {
+                    "queued": len(self._queues[priority]),
+                    "served": self._served[priority],
+                    "wait_ms_p50": round(waits[len(waits) // 2], 1) if waits else 0.0,
+                    "wait_ms_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 1) if waits else 0.0,
+                    "wait_ms_max": round(waits[-1], 1) if waits else 0.0,
+                }
+            clients: Dict[str, int] = {}
+            for queue in self._queues.values():
+                for waiter in queue:
+                    clients[waiter.client_id] = clients.get(waiter.client_id, 0) + 1
+            return {"capacity": self.capacity, "in_flight": self.in_flight, "classes": classes, "queued_by_client": clients}
+
+
+# 语音合成与模型调用各自独立限流
+tts_scheduler = FairScheduler("tts", int(os.getenv("TTS_MAX_CONCURRENCY", "8")))
+llm_scheduler = FairScheduler("llm", int(os.getenv("LLM_MAX_CONCURRENCY", "4")))
@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import socket
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBackend:
+    """
+    进程内的共享存储实现，单机部署时使用，也用作测试替身
+    接口是 Redis 命令的一个子集：字符串键（可设过期时间）与哈希
+    写入时定期清理已过期的键；设了过期时间的键（如脚本缓存）超过 max_keys 个时，先淘汰最早过期的，没有过期时间的键不淘汰
+    """
+
+    shared = False
+
+    def __init__(self, max_keys: int = 10000, sweep_interval: float = 60.0):
+        self._lock = threading.Lock()
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.time()
+
+    def _alive(self, key: str) -> bool:
+        # 调用方需持有锁
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+            return False
+        return key in self._data
+
+    def _sweep(self) -> None:
+        # 调用方需持有锁。过期的键只在读到时才删除的话，不再读取的键会一直占用内存
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval and len(self._expires) <= self.max_keys:
+            return
+        self._last_sweep = now
+        expired = [key for key, expires_at in self._expires.items() if expires_at <= now]
+        if len(self._expires) - len(expired) > self.max_keys:
+            # 一次淘汰到上限的九成，达到上限后不必每次写入都排序
+            live = sorted((expires_at, key) for key, expires_at in self._expires.items() if expires_at > now)
+            expired += [key for _, key in live[:len(live) - self.max_keys * 9 // 10]]
+        for key in expired:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._data[key] if self._alive(key) and isinstance(self._data[key], str) else None
+
+    def set(self, key: str, value: str, ex: Optional[int] = None) -> None:
+        with self._lock:
+            self._data[key] = value
+            if ex:
+                self._expires[key] = time.time() + ex
+            else:
+                self._expires.pop(key, None)
+            self._sweep()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+    def hget(self, key: str, field: str) -> Optional[str]:
+        with self._lock:
+            return self._data[key].get(field) if self._alive(key) else None
+
+    def hset(self, key: str, field: str, value: str) -> None:
+        with self._lock:
+            if not self._alive(key):
+                self._data[key] = {}
+            self._data[key][field] = value
+
+    def hsetnx(self, key: str, field: str, value: str) -> bool:
+        with self._lock:
+            if not self._alive(key):
+                self._data[key] = {}
+            if field in self._data[key]:
+                return False
+            self._data[key][field] = value
+            return True
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._data[key]) if self._alive(key) else {}
+
+    def hdel(self, key: str, field: str) -> None:
+        with self._lock:
+            if self._alive(key):
+                self._data[key].pop(field, None)
+
+
+class RedisBackend:
+    """基于 Redis 协议的共享存储，多个实例通过同一个 Redis 共享缓存、音频索引、任务状态与说话人配置"""
+
+    shared = True
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError("使用 Redis 共享存储需要安装 redis：pip install redis")
+        self._client = redis.Redis.from_url(url, decode_responses=True, socket_timeout=2.0)
+        self._client.ping()
+
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: str, ex: Optional[int] = None) -> None:
+        self._client.set(key, value, ex=ex)
+
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+
+    def hget(self, key: str, field: str) -> Optional[str]:
+        return self._client.hget(key, field)
+
+    def hset(self, key: str, field: str, value: str) -> None:
+        self._client.hset(key, field, value)
+
+    def hsetnx(self, key: str, field: str, value: str) -> bool:
+        return bool(self._client.hsetnx(key, field, value))
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        return self._client.hgetall(key)
+
+    def hdel(self, key: str, field: str) -> None:
+        self._client.hdel(key, field)
+
+
+class SharedState:
+    """
+    面向业务的共享状态访问：脚本缓存、音频位置索引、任务状态快照、说话人配置
+    共享存储不可用时只记录日志，不影响本机功能
+    """
+
+    def __init__(self, backend, prefix: str = "podcast:", node_url: Optional[str] = None):
+        self.backend = backend
+        self.prefix = prefix
+        # 本实例对其他实例可访问的地址，用于共享本机生成的音频
+        self.node_url = node_url.rstrip("/") if node_url else None
+        self.node_id = os.getenv("NODE_ID") or self.node_url or socket.gethostname()
+
+    @property
+    def shared(self) -> bool:
+        return self.backend.shared
+
+    def _key(self, *parts: str) -> str:
+        return self.prefix + ":".join(parts)
+
+    def _call(self, method: str, *args, **kwargs):
+        try:
+            return getattr(self.backend, method)(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"共享存储操作失败（{method}）: {e}")
+            return None
+
+    def get_json(self, *key: str) -> Optional[Any]:
+        value = self._call("get", self._key(*key))
+        return json.loads(value) if value else None
+
+    def set_json(self, *key: str, value: Any, ttl: Optional[int] = None) -> None:
+        self._call("set", self._key(*key), json.dumps(value, ensure_ascii=False), ex=ttl)
+
+    # 音频位置索引：内容ID -> 生成该音频的实例地址、格式、大小与摘要
+    def publish_audio(self, content_id: str, audio_format: str, size: int, digest: Optional[str]) -> None:
+        if self.shared and self.node_url:
+            self._call("hset", self._key("audio"), content_id, json.dumps(
+                {"node": self.node_id, "url": self.node_url, "format": audio_format, "size": size, "digest": digest}
+            ))
+
+    def locate_audio(self, content_id: str) -> Optional[Dict]:
+        if not self.shared:
+            return None
+        value = self._call("hget", self._key("audio"), content_id)
+        location = json.loads(value) if value else None
+        # 索引指向本机说明本地文件已被淘汰，不能再从自己这里取
+        if location and location.get("url") == self.node_url:
+            return None
+        return location
+
+    def forget_audio(self, content_id: str) -> None:
+        if self.shared:
+            self._call("hdel", self._key("audio"), content_id)
+
+    # 说话人配置
+    def seed_speakers(self, speakers: Dict[str, Dict]) -> None:
+        for speaker_id, config in speakers.items():
+            self._call("hsetnx", self._key("speakers"), speaker_id, json.dumps(config, ensure_ascii=False))
+
+    def load_speakers(self) -> Optional[Dict[str, Dict]]:
+        values = self._call("hgetall", self._key("speakers"))
+        return {speaker_id: json.loads(value) for speaker_id, value in values.items()} if values else None
+
+    def save_speaker(self, speaker_id: str, config: Dict) -> None:
+        self._call("hset", self._key("speakers"), speaker_id, json.dumps(config, ensure_ascii=False))
+
+
+def create_shared_state() -> SharedState:
+    """
+    按 SHARED_BACKEND_URL 创建共享状态：redis://（或 rediss://）使用 Redis，未设置或 local:// 使用进程内实现
+    Redis 连接失败时退回进程内实现，服务仍可单机运行
+    """
+    url = os.getenv("SHARED_BACKEND_URL", "").strip()
+    prefix = os.getenv("SHARED_BACKEND_PREFIX", "podcast:")
+    node_url = os.getenv("NODE_URL")
+    backend = LocalBackend(max_keys=int(os.getenv("LOCAL_BACKEND_MAX_KEYS", "10000")))
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            backend = RedisBackend(url)
+            logger.info(f"共享存储: Redis ({url.split('@')[-1]})，本实例地址: {node_url or '未设置（不共享本机音频）'}")
+        except Exception as e:
+            logger.error(f"连接共享存储失败，退回单机模式: {e}")
+    elif url and not url.startswith("local://"):
+        logger.warning(f"不支持的共享存储地址: {url}，使用单机模式")
+    return SharedState(backend, prefix=prefix, node_url=node_url)
+
+
+shared_state = create_shared_state()
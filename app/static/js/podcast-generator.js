@@ -21,6 +21,8 @@ document.addEventListener('DOMContentLoaded', function() {
     let currentTokenUsage = null; // 保存当前token使用量
     let currentDialog = null; // 保存当前对话
     let currentModel = null; // 保存当前使用的模型
+    let currentPodcastId = null; // 已创建的播客，修改对话后再次创建时只生成新版本
+    let forceFresh = false; // 重新生成时跳过服务端的脚本缓存
 
     // 实时更新字数统计
     textInput.addEventListener('input', function() {
@@ -62,6 +64,8 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // 生成播客对话
     generateBtn.addEventListener('click', function() {
+        const fresh = forceFresh;
+        forceFresh = false;
         const content = textInput.value.trim();
         
         if (!content) {
@@ -98,7 +102,7 @@ document.addEventListener('DOMContentLoaded', function() {
         fetch('/generate-script', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ text: content, style: dialogStyle.value, participants: parseInt(participants.value), model: model })
+            body: JSON.stringify({ text: content, style: dialogStyle.value, participants: parseInt(participants.value), model: model, compact: true, fresh: fresh })
         })
         .then(r => r.json())
         .then(resp => {
@@ -106,6 +110,9 @@ document.addEventListener('DOMContentLoaded', function() {
             // 将结构化脚本转换为前端显示格式
             const script = resp.script;
             currentScript = script; // 保存当前脚本
+            currentPodcastId = null;
+            // 自动选择模型时记录实际使用的模型
+            if (script.routing) currentModel = script.model || script.routing.model;
             currentTokenUsage = resp.token_usage || {}; // 保存当前token使用量
             
             // 检查是否存在模型错误
@@ -147,7 +154,7 @@ document.addEventListener('DOMContentLoaded', function() {
             }
             
             // 自动保存生成的对话
-            saveGeneratedDialog(script);
+            saveGeneratedDialog(script, content);
         })
             .catch(error => {
                 alert('生成对话时出错：' + error.message);
@@ -157,7 +164,7 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 
     // 自动保存生成的对话到result目录
-    function saveGeneratedDialog(script) {
+    function saveGeneratedDialog(script, sourceText) {
         const dialogText = getDialogText();
         
         // 生成简短摘要作为文件名
@@ -188,13 +195,17 @@ document.addEventListener('DOMContentLoaded', function() {
             body: JSON.stringify({ 
                 content: dialogText, 
                 filename: filename,
-                script: script
+                script: script,
+                source_text: sourceText,
+                style: dialogStyle.value,
+                model: currentModel,
+                token_usage: currentTokenUsage
             })
         })
         .then(r => r.json())
         .then(resp => {
             if (resp.ok) {
-                console.log('对话已自动保存到result目录');
+                console.log('对话已自动保存到result目录:', resp.filename);
             } else {
                 console.log('自动保存失败:', resp.error);
             }
@@ -243,6 +254,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // 重新生成
     regenerateBtn.addEventListener('click', function() {
+        forceFresh = true;
         generateBtn.click();
     });
 
@@ -257,23 +269,46 @@ document.addEventListener('DOMContentLoaded', function() {
         createPodcastBtn.disabled = true;
         loadingIndicator.classList.remove('hidden');
         
-        // 处理对话，生成语音
-        fetch('/process-dialog-tts', {
+        if (currentPodcastId) {
+            updatePodcast();
+            return;
+        }
+        
+        // 批量生成语音，每段完成即返回一行，实时显示进度
+        const buttonText = createPodcastBtn.textContent;
+        const processed = currentDialog.map(item => Object.assign({}, item));
+        let finished = 0;
+        fetch('/batch-tts', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ dialog: currentDialog })
+            body: JSON.stringify({
+                items: currentDialog.map(item => ({ text: item.text, speaker_id: item.role || 'host' })),
+                profile: 'standard'
+            })
         })
-        .then(r => r.json())
-        .then(resp => {
-            if (!resp || !resp.ok) throw new Error(resp && resp.error ? resp.error : '处理对话失败');
+        .then(r => readNdjson(r, line => {
+            if (line.done) return;
+            finished++;
+            createPodcastBtn.textContent = '生成语音 ' + finished + '/' + processed.length;
+            if (line.ok) {
+                processed[line.index].audio_path = line.audio_path;
+                processed[line.index].audio_id = line.audio_id;
+            } else {
+                console.error('第' + (line.index + 1) + '段语音生成失败:', line.error);
+            }
+        }))
+        .then(() => {
+            const failed = processed.filter(item => !item.audio_path).length;
+            if (failed) throw new Error(failed + ' 段语音生成失败');
             
             // 创建播客节目
             return fetch('/create-podcast', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ 
-                    dialog: resp.dialog, 
-                    podcast_title: '播客对话_' + new Date().toISOString().slice(0, 10) 
+                    dialog: processed, 
+                    podcast_title: '播客对话_' + new Date().toISOString().slice(0, 10),
+                    chapters: podcastChapters()
                 })
             });
         })
@@ -281,6 +316,7 @@ document.addEventListener('DOMContentLoaded', function() {
         .then(resp => {
             if (!resp || !resp.ok) throw new Error(resp && resp.error ? resp.error : '创建播客失败');
             
+            currentPodcastId = resp.podcast_id;
             alert('播客音频创建成功！');
             console.log('播客创建成功，路径:', resp.podcast_path);
         })
@@ -290,10 +326,62 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .finally(() => {
             loadingIndicator.classList.add('hidden');
+            createPodcastBtn.textContent = buttonText;
             createPodcastBtn.disabled = false;
         });
     });
 
+    // 提纲模式生成的脚本以章节作为播客章节，其余由服务端按时长自动划分
+    function podcastChapters() {
+        const sections = (currentScript && currentScript.sections) || [];
+        return sections.length ? sections.map(section => ({ title: section.title, start: section.start })) : null;
+    }
+
+    // 对话修改后生成播客新版本：服务端只合成有变化的分段，其余分段复用上一版本的音频
+    function updatePodcast() {
+        fetch('/podcasts/' + encodeURIComponent(currentPodcastId) + '/versions', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                dialog: currentDialog.map(item => ({ role: item.role, speaker: item.speaker, text: item.text })),
+                chapters: podcastChapters()
+            })
+        })
+        .then(r => r.json())
+        .then(resp => {
+            if (!resp || !resp.ok) throw new Error(resp && resp.error ? resp.error : '更新播客失败');
+            
+            alert('播客已更新为第 ' + resp.version + ' 版（' + resp.changed.length + ' 段重新生成，' + resp.reused + ' 段复用）');
+            console.log('播客更新成功，路径:', resp.podcast_path);
+        })
+        .catch(error => {
+            alert('更新播客时出错：' + error.message);
+            console.error('更新播客失败:', error);
+        })
+        .finally(() => {
+            loadingIndicator.classList.add('hidden');
+            createPodcastBtn.disabled = false;
+        });
+    }
+
+    // 逐行读取NDJSON响应，每解析出一行就回调一次
+    function readNdjson(response, onLine) {
+        if (!response.ok) throw new Error('请求失败: ' + response.status);
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        function pump() {
+            return reader.read().then(({ done, value }) => {
+                buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+                const lines = buffer.split('\n');
+                buffer = done ? '' : lines.pop();
+                lines.filter(line => line.trim()).forEach(line => onLine(JSON.parse(line)));
+                if (!done) return pump();
+            });
+        }
+        return pump();
+    }
+
     // 显示生成的对话
     function displayDialog(dialog) {
         dialogOutput.innerHTML = '';
@@ -327,9 +415,18 @@ document.addEventListener('DOMContentLoaded', function() {
                 generateAndPlaySpeech(item.text, item.role, index);
             };
 
+            // 只重新生成这一段，其余对话不变
+            const regenerateItemBtn = document.createElement('button');
+            regenerateItemBtn.className = 'regenerate-segment-btn';
+            regenerateItemBtn.textContent = '🔄 重新生成';
+            regenerateItemBtn.onclick = function() {
+                regenerateSegments(index, index + 1, regenerateItemBtn);
+            };
+
             dialogItem.appendChild(header);
             dialogItem.appendChild(textDiv);
             dialogItem.appendChild(audioBtn);
+            dialogItem.appendChild(regenerateItemBtn);
             list.appendChild(dialogItem);
         });
 
@@ -337,6 +434,62 @@ document.addEventListener('DOMContentLoaded', function() {
         generateBtn.disabled = false;
     }
 
+    // 重新生成 [start, end) 范围内的对话段，用返回的新对话段替换，其余对话不变
+    function regenerateSegments(start, end, button) {
+        const instruction = prompt('修改要求（可留空）：', '');
+        if (instruction === null) return;
+
+        button.disabled = true;
+        loadingIndicator.classList.remove('hidden');
+        const roles = (currentScript && currentScript.roles) || [];
+        fetch('/regenerate-segments', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                script: { roles: roles, segments: currentDialog.map(item => ({ role: item.role, text: item.text })) },
+                start: start,
+                end: end,
+                instruction: instruction.trim() || null,
+                style: dialogStyle.value,
+                model: currentModel || 'deepseek-v3.2'
+            })
+        })
+        .then(r => r.json())
+        .then(resp => {
+            if (!resp || !resp.ok) throw new Error(resp && resp.error ? resp.error : '重新生成失败');
+
+            const roleMap = {};
+            roles.forEach(r => { roleMap[r.id] = r.name || r.id; });
+            const replaced = resp.segments.map(s => ({ role: s.role, speaker: roleMap[s.role] || s.role, text: s.text }));
+            currentDialog.splice(start, end - start, ...replaced);
+            if (currentScript) {
+                currentScript.segments = currentDialog.map(item => ({ role: item.role, text: item.text }));
+                // 段数变化后顺延其后章节的起始序号
+                const delta = replaced.length - (end - start);
+                (currentScript.sections || []).forEach(section => {
+                    if (section.start >= end) section.start += delta;
+                });
+            }
+
+            // 累计本次局部生成的token使用量
+            const usage = resp.token_usage || {};
+            currentTokenUsage = currentTokenUsage || {};
+            ['prompt_tokens', 'completion_tokens', 'total_tokens'].forEach(key => {
+                currentTokenUsage[key] = (currentTokenUsage[key] || 0) + (usage[key] || 0);
+            });
+            displayDialog(currentDialog);
+            displayTokenUsage(currentTokenUsage);
+        })
+        .catch(error => {
+            alert('重新生成对话时出错：' + error.message);
+            console.error('重新生成对话失败:', error);
+            button.disabled = false;
+        })
+        .finally(() => {
+            loadingIndicator.classList.add('hidden');
+        });
+    }
+
     // 生成并播放语音
     function generateAndPlaySpeech(text, role, index) {
         // 显示加载指示器
@@ -347,16 +500,16 @@ document.addEventListener('DOMContentLoaded', function() {
         fetch('/generate-speech', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ text: text, speaker_id: role, audio_format: 'mp3' })
+            body: JSON.stringify({ text: text, speaker_id: role, audio_format: 'mp3', profile: 'preview' })
         })
         .then(r => r.json())
         .then(resp => {
             if (!resp || !resp.ok) throw new Error(resp && resp.error ? resp.error : '生成语音失败');
             
-            // 播放语音
-            const audioPath = resp.audio_path;
-            if (audioPath) {
-                const audio = new Audio(audioPath);
+            // 播放语音（通过音频下载接口获取，支持拖动播放）
+            const audioUrl = resp.audio_url;
+            if (audioUrl) {
+                const audio = new Audio(audioUrl);
                 audio.play().catch(error => {
                     console.error('播放语音失败:', error);
                     alert('播放语音失败，请检查浏览器设置');
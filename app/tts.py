@@ -1,15 +1,143 @@
 import os
+import re
 import json
+import time
 import uuid
 import httpx
+import threading
+import contextvars
 import logging
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait
 from dotenv import load_dotenv
 
+from audio_store import AudioStore, file_digest
+from audio_utils import (CONCAT_FORMATS, audio_duration, audio_payload, concat_audio, ffmpeg_path, range_duration,
+                         split_audio, transcode, write_audio)
+from jobs import JobStore, DONE, FAILED, RUNNING
+from scheduler import PRIORITIES, current_priority, tts_scheduler
+from shared_backend import shared_state
+
 # 获取日志记录器
 logger = logging.getLogger(__name__)
 
+# 音频输出配置：provider_format 与 sample_rate 是向TTS接口请求的参数，
+# 目标格式与 provider_format 不同或指定了码率（kbps）时，在服务端用 ffmpeg 转码
+AUDIO_PROFILES = {
+    "standard": {"name": "标准", "format": "mp3", "provider_format": "mp3", "sample_rate": 24000, "bitrate": None},
+    "preview": {"name": "低码率试听", "format": "mp3", "provider_format": "mp3", "sample_rate": 16000, "bitrate": 32},
+    "speech": {"name": "语音优化Opus", "format": "opus", "provider_format": "wav", "sample_rate": 24000, "bitrate": 24},
+    "archive": {"name": "无损归档", "format": "wav", "provider_format": "wav", "sample_rate": 48000, "bitrate": None},
+}
+DEFAULT_AUDIO_PROFILE = "standard"
+
+# 中英文句末标点（含其后的引号、括号）、英文句点后接空白、换行都作为句子边界
+_SENTENCE_BREAK = re.compile(r'([。！？!?；;…]+[”’」』）)"\']*|\.(?=\s)[”’"\']*|\n+)')
+# 句子本身过长时退而在逗号等停顿处切分
+_CLAUSE_BREAK = re.compile(r'([，,、：:]+)')
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    按中英文句子边界切分文本，标点保留在句尾
+    :param text: 文本
+    :return: 句子列表
+    """
+    parts = _SENTENCE_BREAK.split(text)
+    sentences = []
+    for i in range(0, len(parts), 2):
+        sentence = (parts[i] + (parts[i + 1] if i + 1 < len(parts) else "")).strip()
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+
+def split_long_text(text: str, max_chars: int) -> List[str]:
+    """
+    把过长的文本切成不超过 max_chars 的若干段，尽量在句子边界处切分，相邻短句合并到同一段
+    :param text: 文本
+    :param max_chars: 每段最大字符数
+    :return: 分段列表，文本不超长时只有一段
+    """
+    if len(text) <= max_chars:
+        return [text]
+    units = []
+    for sentence in split_sentences(text):
+        if len(sentence) <= max_chars:
+            units.append(sentence)
+            continue
+        parts = _CLAUSE_BREAK.split(sentence)
+        for i in range(0, len(parts), 2):
+            clause = parts[i] + (parts[i + 1] if i + 1 < len(parts) else "")
+            # 没有停顿标点的超长片段只能按长度硬切
+            units.extend(clause[j:j + max_chars] for j in range(0, len(clause), max_chars) if clause[j:j + max_chars].strip())
+    
+    pieces, current = [], ""
+    for unit in units:
+        # 英文句子之间补回空格，中文不需要
+        joiner = " " if current and current[-1].isascii() and unit[0].isascii() else ""
+        if current and len(current) + len(joiner) + len(unit) > max_chars:
+            pieces.append(current)
+            current = unit
+        else:
+            current += joiner + unit
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+# 合并合成时每轮对话末尾没有句末标点则补上，保证接口在轮次之间断句
+_TURN_END = re.compile(r'[。！？!?；;…]+[”’」』）)"\']*\s*$')
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def turn_boundaries(texts: List[str], sentences: List[Dict]) -> Optional[List[float]]:
+    """
+    根据接口返回的句子时间戳计算相邻两轮对话之间的切分时间点（取两句之间停顿的中点）
+    句子带文本时按累计字数对齐到各轮；不带文本时要求句子数与本地断句结果一致
+    :param texts: 合并合成的各轮对话文本
+    :param sentences: 句子时间戳，包含 begin_time、end_time（毫秒），可带 text 或 words
+    :return: 切分时间点（毫秒），无法对齐（如某一句跨越两轮）时返回 None
+    """
+    if not sentences:
+        return None
+    def sentence_text(sentence: Dict) -> Optional[str]:
+        if sentence.get("text") is not None:
+            return sentence["text"]
+        if sentence.get("words"):
+            return "".join(word.get("text", "") for word in sentence["words"])
+        return None
+    
+    lengths = [sentence_text(sentence) for sentence in sentences]
+    if all(length is not None for length in lengths):
+        sentence_ends, total = [], 0
+        for text in lengths:
+            total += len(_NON_WORD.sub("", text))
+            sentence_ends.append(total)
+        turn_ends, total = [], 0
+        for text in texts:
+            total += len(_NON_WORD.sub("", text))
+            turn_ends.append(total)
+        if sentence_ends[-1] != turn_ends[-1]:
+            return None
+    else:
+        sentence_ends = list(range(1, len(sentences) + 1))
+        turn_ends, total = [], 0
+        for text in texts:
+            total += len(split_sentences(text)) or 1
+            turn_ends.append(total)
+        if total != len(sentences):
+            return None
+    cuts = []
+    for end in turn_ends[:-1]:
+        if end not in sentence_ends:
+            return None
+        index = sentence_ends.index(end)
+        cuts.append((sentences[index]["end_time"] + sentences[index + 1]["begin_time"]) / 2)
+    return cuts if all(a < b for a, b in zip(cuts, cuts[1:])) else None
+
+
 class TTSManager:
     def __init__(self):
         # 加载环境变量
@@ -17,11 +145,17 @@ class TTSManager:
         
         # 千问TTS配置
         self.dashscope_api_key = os.getenv("DASHSCOPE_API_KEY")
-        # 修正TTS API端点URL
-        self.dashscope_tts_endpoint = "https://dashscope.aliyuncs.com/api/v1/services/audio/speech_synthesis"
+        # 修正TTS API端点URL（可通过 DASHSCOPE_TTS_ENDPOINT 覆盖，便于压测时指向本地模拟服务）
+        self.dashscope_tts_endpoint = os.getenv(
+            "DASHSCOPE_TTS_ENDPOINT",
+            "https://dashscope.aliyuncs.com/api/v1/services/audio/speech_synthesis"
+        )
+        
+        # 多实例部署时通过共享存储共享脚本缓存、音频位置、任务状态与说话人配置（见 SHARED_BACKEND_URL）
+        self.shared = shared_state
         
         # 说话人配置（使用千问TTS支持的音色）
-        self.speakers = {
+        self._speakers = {
             "host": {
                 "name": "主持人",
                 "voice_id": "zh_female_qingxin",  # 千问语音合成模型
@@ -44,20 +178,78 @@ class TTSManager:
             }
         }
         
-        # 确保音频输出目录存在
-        self.audio_output_dir = Path(__file__).parent.parent / "audio"
-        self.audio_output_dir.mkdir(exist_ok=True)
+        # 共享存储中没有的说话人写入默认配置，已有的以共享存储为准
+        self.shared.seed_speakers(self._speakers)
+        # 从共享存储读到的说话人配置缓存几秒，逐段合成与清单构建时不必每段都访问共享存储
+        self.speakers_cache_seconds = float(os.getenv("SPEAKERS_CACHE_SECONDS", "5"))
+        self._speakers_cache = None
+        
+        # 任务状态快照在共享存储中的保留时间（秒），其他实例可据此查询或接手任务
+        self.job_snapshot_ttl = int(os.getenv("JOB_SNAPSHOT_TTL", str(7 * 24 * 3600)))
+        
+        # 确保音频输出目录存在（可通过 AUDIO_OUTPUT_DIR 指定其他目录）
+        self.audio_output_dir = Path(os.getenv("AUDIO_OUTPUT_DIR") or Path(__file__).parent.parent / "audio")
+        self.audio_output_dir.mkdir(parents=True, exist_ok=True)
+        
+        # 音频存储：分片目录 + 容量上限（默认2048MB），被播客引用的文件在有效期内（默认30天）不会被淘汰
+        self.audio_store = AudioStore(
+            self.audio_output_dir,
+            max_bytes=int(float(os.getenv("AUDIO_STORE_MAX_MB", "2048")) * 1024 * 1024),
+            pin_ttl_seconds=int(float(os.getenv("AUDIO_PODCAST_TTL_DAYS", "30")) * 24 * 3600)
+        )
+        
+        # 合成任务的分段状态（默认与音频索引放在同一目录），服务重启后可以继续未完成的任务
+        self.job_store = JobStore(Path(os.getenv("TTS_JOB_DB") or self.audio_output_dir / "jobs.db"),
+                                  lease_seconds=float(os.getenv("TTS_JOB_LEASE_SECONDS", "60")))
+        self._active_jobs = set()
+        self._active_podcasts = set()
+        self._jobs_lock = threading.Lock()
+        
+        # TTS传输方式：json（一次性返回base64，默认）、sse（流式分块）、binary（直接返回音频字节流）
+        self.tts_transfer = os.getenv("DASHSCOPE_TTS_TRANSFER", "json").lower()
+        
+        # 超长的单轮对话按句子切分后并行合成再拼接，避免接口长度限制和单段耗时拖慢整期节目
+        self.max_piece_chars = int(os.getenv("TTS_MAX_PIECE_CHARS", "150"))
+        # 分段线程在调度器中排队时一直占着线程，每个优先级各用一个线程池，
+        # 批量任务的分段占满线程时交互请求的分段不必在线程池里排在它们后面
+        piece_workers = int(os.getenv("TTS_PIECE_WORKERS", "4"))
+        self._piece_pools = {
+            level: ThreadPoolExecutor(max_workers=piece_workers, thread_name_prefix=f"tts-piece-{level}")
+            for level in PRIORITIES
+        }
+        
+        # 短对话合并合成：同一音色、不超过 TTS_BATCH_TURN_CHARS 字的多轮对话合并为一次请求（合计不超过 TTS_BATCH_MAX_CHARS 字），
+        # 按接口返回的句子时间戳切回各轮；TTS_BATCH_MAX_CHARS=0 关闭
+        self.batch_max_chars = int(os.getenv("TTS_BATCH_MAX_CHARS", "150"))
+        self.batch_turn_chars = int(os.getenv("TTS_BATCH_TURN_CHARS", "40"))
+        # 合并合成依赖接口返回的句子时间戳：二进制传输没有时间戳，接口或代理不支持时设 TTS_SENTENCE_TIMESTAMPS=false 关闭
+        self._batch_supported = (self.tts_transfer != "binary"
+                                 and os.getenv("TTS_SENTENCE_TIMESTAMPS", "true").lower() in ("1", "true", "yes"))
+        
+        # 未指定章节时，播客按该时长（秒）自动划分章节，在主持人发言处开始新章节
+        self.chapter_seconds = float(os.getenv("PODCAST_CHAPTER_SECONDS", "180"))
         
         logger.info("TTSManager初始化完成")
         logger.info(f"千问API密钥存在: {self.dashscope_api_key is not None}")
         logger.info(f"TTS API端点: {self.dashscope_tts_endpoint}")
     
-    def generate_speech(self, text: str, speaker_id: str, audio_format: str = "mp3") -> Optional[str]:
+    @property
+    def speakers(self) -> Dict[str, Dict]:
+        # 以共享存储为准，其他实例修改的说话人配置在缓存过期后生效；共享存储不可用时使用本地配置
+        cached = self._speakers_cache
+        if cached and time.monotonic() - cached[0] < self.speakers_cache_seconds:
+            return cached[1]
+        speakers = self.shared.load_speakers() or self._speakers
+        self._speakers_cache = (time.monotonic(), speakers)
+        return speakers
+    
+    def generate_speech(self, text: str, speaker_id: str, audio_format: str = "mp3", profile: Optional[str] = None) -> Optional[str]:
         """
         生成语音文件
         :param text: 要转换的文本
         :param speaker_id: 说话人ID
-        :param audio_format: 音频格式
+        :param audio_format: 音频格式（未指定输出配置时使用）
+        :param profile: 输出配置名称，见 AUDIO_PROFILES
         :return: 生成的音频文件路径
         """
         try:
@@ -67,84 +259,47 @@ class TTSManager:
                 return None
             
             # 获取说话人配置
-            speaker = self.speakers.get(speaker_id, self.speakers["host"])
+            speakers = self.speakers
+            speaker = speakers.get(speaker_id, speakers["host"])
             
-            # 生成唯一的文件名
-            import hashlib
-            import time
-            timestamp = int(time.time())
-            text_hash = hashlib.md5(text.encode()).hexdigest()[:8]
-            filename = f"{speaker_id}_{text_hash}_{timestamp}.{audio_format}"
-            output_path = self.audio_output_dir / filename
-            
-            # 构建请求参数
-            request_data = {
-                "model": "sambert-zh-general-v2",  # 千问语音合成模型
-                "input": {
-                    "text": text
-                },
-                "parameters": {
-                    "voice": speaker["voice_id"],
-                    "format": audio_format,
-                    "sample_rate": 24000,
-                    "speed": 1.0,
-                    "pitch": 1.0,
-                    "volume": 1.0
-                }
-            }
+            output = self.resolve_profile(profile, audio_format)
             
-            # 构建请求头
-            headers = {
-                "Authorization": f"Bearer {self.dashscope_api_key}",
-                "Content-Type": "application/json"
-            }
+            # 相同文本、音色与参数生成的音频相同，已存在时直接复用
+            content_id = self._content_id(text, speaker, output)
+            cached_path = self.audio_store.get(content_id) or self.fetch_from_peer(content_id)
+            if cached_path:
+                logger.info(f"命中已生成的语音: {cached_path}")
+                return str(cached_path)
+            output_path = self.audio_store.path_for(content_id, output["format"])
+            # 需要转码时先把接口返回的原始音频写到临时文件
+            synth_path = output_path.with_name(f"{output_path.stem}.src.{output['provider_format']}") if output["transcode"] else output_path
             
-            # 调用千问TTS API
-            logger.info("调用千问TTS API生成语音...")
-            logger.info(f"文本长度: {len(text)}, 前50个字符: {text[:50]}...")
-            logger.info(f"说话人: {speaker['name']} ({speaker['voice_id']})")
-            logger.info(f"请求URL: {self.dashscope_tts_endpoint}")
-            logger.info(f"请求参数: {json.dumps(request_data, ensure_ascii=False)[:200]}...")
+            pieces = split_long_text(text, self.max_piece_chars)
+            if len(pieces) > 1 and output["provider_format"] not in CONCAT_FORMATS:
+                logger.warning(f"{output['provider_format']} 格式无法拼接，长文本整段合成")
+                pieces = [text]
             
-            with httpx.Client() as client:
-                response = client.post(
-                    self.dashscope_tts_endpoint,
-                    json=request_data,
-                    headers=headers,
-                    timeout=30.0
-                )
+            logger.info(f"说话人: {speaker['name']} ({speaker['voice_id']})，文本长度: {len(text)}，分段数: {len(pieces)}")
+            if len(pieces) > 1:
+                digest = self._synthesize_pieces(pieces, speaker, output, synth_path)
+            else:
+                request_data, headers = self._build_tts_request(text, speaker, output)
                 
-                # 检查响应状态
-                logger.info(f"TTS API响应状态码: {response.status_code}")
-                logger.info(f"TTS API响应文本: {response.text[:200]}...")
+                # 调用千问TTS API
+                logger.info("调用千问TTS API生成语音...")
+                logger.info(f"文本长度: {len(text)}, 前50个字符: {text[:50]}...")
+                logger.info(f"请求URL: {self.dashscope_tts_endpoint}，传输方式: {self.tts_transfer}")
+                logger.info(f"请求参数: {json.dumps(request_data, ensure_ascii=False)[:200]}...")
                 
-                if response.status_code == 200:
-                    # 解析响应
-                    response_data = response.json()
-                    logger.info(f"TTS API响应数据: {json.dumps(response_data, ensure_ascii=False)[:200]}...")
-                    
-                    if response_data.get("status_code") == 200:
-                        # 获取音频数据
-                        audio_data = response_data.get("result", {}).get("audio_data")
-                        if audio_data:
-                            # 解码base64音频数据
-                            import base64
-                            audio_bytes = base64.b64decode(audio_data)
-                            # 保存音频数据
-                            with open(output_path, 'wb') as f:
-                                f.write(audio_bytes)
-                            logger.info(f"语音生成成功: {output_path}")
-                            return str(output_path)
-                        else:
-                            logger.error("语音生成失败: 未返回音频数据")
-                            return None
-                    else:
-                        logger.error(f"语音生成失败: {response_data.get('status_message', '未知错误')}")
-                        return None
-                else:
-                    logger.error(f"语音生成失败，状态码: {response.status_code}")
-                    logger.error(f"错误信息: {response.text}")
-                    return None
+                digest = self._synthesize_to_file(request_data, headers, synth_path)
+            if digest and output["transcode"]:
+                digest = self._convert_audio(synth_path, output_path, output)
+            if not digest:
+                return None
+            self.audio_store.add(content_id, output_path, digest=digest)
+            self.shared.publish_audio(content_id, output["format"], output_path.stat().st_size, digest)
+            logger.info(f"语音生成成功: {output_path}")
+            return str(output_path)
                     
         except Exception as e:
             logger.error(f"语音生成失败: {e}")
@@ -152,12 +307,427 @@ class TTSManager:
             logger.error(f"详细错误信息: {traceback.format_exc()}")
             return None
     
-    def process_dialog(self, dialog: List[Dict]) -> List[Dict]:
+    def fetch_from_peer(self, content_id: str) -> Optional[Path]:
+        """
+        本机没有的音频按共享索引从生成它的实例下载，校验摘要后加入本地存储
+        :param content_id: 内容ID
+        :return: 本地文件路径，索引中没有或下载失败时返回 None
+        """
+        location = self.shared.locate_audio(content_id)
+        if not location:
+            return None
+        url = f"{location['url']}/audio/{content_id}"
+        try:
+            with httpx.Client(timeout=30.0) as client, client.stream("GET", url) as response:
+                if response.status_code == 404:
+                    # 对方已淘汰该音频，删除失效的索引
+                    self.shared.forget_audio(content_id)
+                    return None
+                response.raise_for_status()
+                output_path = self.audio_store.path_for(content_id, location["format"])
+                digest = self._write_audio_stream(response.iter_bytes(), output_path)
+        except Exception as e:
+            logger.warning(f"从实例 {location['node']} 获取音频 {content_id} 失败: {e}")
+            return None
+        if not digest or (location.get("digest") and digest != location["digest"]):
+            logger.warning(f"从实例 {location['node']} 获取的音频 {content_id} 校验失败")
+            output_path.unlink(missing_ok=True)
+            return None
+        if location["format"] != "json":
+            kind = "segment"
+        else:
+            kind = "podcast_version" if re.search(r"_v\d+$", content_id) else "podcast"
+        self.audio_store.add(content_id, output_path, kind=kind, digest=digest)
+        logger.info(f"从实例 {location['node']} 获取音频: {content_id}")
+        return output_path
+    
+    def resolve_profile(self, profile: Optional[str], audio_format: str = "mp3") -> Dict:
+        """
+        解析输出配置；未指定配置时按 audio_format 直接向接口请求
+        需要转码但未安装ffmpeg时，退回接口原生格式，不再转码
+        :param profile: 输出配置名称
+        :param audio_format: 未指定配置时使用的音频格式
+        :return: 输出参数，包含 profile、format、provider_format、sample_rate、bitrate、transcode
+        """
+        if profile and profile in AUDIO_PROFILES:
+            output = dict(AUDIO_PROFILES[profile], profile=profile)
+        else:
+            if profile:
+                logger.warning(f"输出配置 {profile} 不存在，使用默认配置")
+            base = AUDIO_PROFILES[DEFAULT_AUDIO_PROFILE]
+            output = dict(base, profile=DEFAULT_AUDIO_PROFILE, format=audio_format or base["format"],
+                          provider_format=audio_format or base["provider_format"])
+        output["transcode"] = output["format"] != output["provider_format"] or bool(output["bitrate"])
+        if output["transcode"] and not ffmpeg_path():
+            logger.warning(f"未安装ffmpeg，输出配置 {output['profile']} 退回接口原生格式 {output['provider_format']}")
+            output.update(format=output["provider_format"], bitrate=None, transcode=False)
+        return output
+    
+    def _convert_audio(self, src_path: Path, output_path: Path, output: Dict) -> Optional[str]:
+        """
+        把接口返回的原始音频转码为输出配置要求的格式，完成后删除原始音频
+        :param src_path: 原始音频
+        :param output_path: 输出文件路径
+        :param output: 输出参数
+        :return: 转码后音频的SHA-1摘要，失败时返回 None
+        """
+        temp_path = output_path.with_name(f"{output_path.name}.{uuid.uuid4().hex[:8]}.part")
+        try:
+            if not transcode(src_path, temp_path, output["format"], output["sample_rate"], output["bitrate"]):
+                return None
+            os.replace(temp_path, output_path)
+            logger.info(f"转码完成: {output['provider_format']} -> {output['format']} ({output['bitrate'] or '默认'} kbps)")
+            return file_digest(output_path)
+        finally:
+            for path in (src_path, temp_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    
+    def _build_tts_request(self, text: str, speaker: Dict, output: Dict) -> Tuple[Dict, Dict[str, str]]:
+        """
+        构建TTS请求参数与请求头
+        :param text: 文本
+        :param speaker: 说话人配置
+        :param output: 输出参数
+        :return: (请求参数, 请求头)
+        """
+        # 构建请求参数
+        request_data = {
+            "model": "sambert-zh-general-v2",  # 千问语音合成模型
+            "input": {
+                "text": text
+            },
+            "parameters": {
+                "voice": speaker["voice_id"],
+                "format": output["provider_format"],
+                "sample_rate": output["sample_rate"],
+                "speed": 1.0,
+                "pitch": 1.0,
+                "volume": 1.0
+            }
+        }
+        
+        # 构建请求头
+        headers = {
+            "Authorization": f"Bearer {self.dashscope_api_key}",
+            "Content-Type": "application/json"
+        }
+        # 流式/二进制传输：音频分块到达即写入磁盘，不再整体解析base64
+        if self.tts_transfer == "sse":
+            headers["X-DashScope-SSE"] = "enable"
+            headers["Accept"] = "text/event-stream"
+        elif self.tts_transfer == "binary":
+            headers["Accept"] = "audio/*, application/json"
+        return request_data, headers
+    
+    def _synthesize_pieces(self, pieces: List[str], speaker: Dict, output: Dict, output_path: Path) -> Optional[str]:
+        """
+        并行合成各分段并按顺序拼接为一个文件，任一分段失败则整体失败
+        :param pieces: 分段文本
+        :param speaker: 说话人配置
+        :param output: 输出参数
+        :param output_path: 拼接后的文件路径
+        :return: 拼接后音频的SHA-1摘要，失败时返回 None
+        """
+        audio_format = output["provider_format"]
+        batch = uuid.uuid4().hex[:8]
+        piece_paths = [output_path.with_name(f"{output_path.stem}.{batch}.p{i}.{audio_format}") for i in range(len(pieces))]
+        futures = [
+            # 分段线程沿用当前请求的优先级与调用方，参与同一调度
+            self._piece_pools[current_priority()].submit(contextvars.copy_context().run, self._synthesize_to_file,
+                                                         *self._build_tts_request(piece, speaker, output), path)
+            for piece, path in zip(pieces, piece_paths)
+        ]
+        try:
+            # 等所有分段结束再清理临时文件，避免仍在写入的分段残留
+            wait(futures)
+            failed = [i for i, future in enumerate(futures) if future.exception() or not future.result()]
+            if failed:
+                for i in failed:
+                    logger.error(f"分段 {i + 1}/{len(pieces)} 合成失败: {futures[i].exception() or '未返回音频数据'}")
+                return None
+            if not concat_audio(piece_paths, output_path, audio_format):
+                return None
+            logger.info(f"{len(pieces)} 个分段并行合成并拼接完成: {output_path}")
+            return file_digest(output_path)
+        finally:
+            for path in piece_paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    
+    def _synthesize_to_file(self, request_data: Dict, headers: Dict[str, str], output_path: Path,
+                            timestamps: Optional[List[Dict]] = None) -> Optional[str]:
+        """
+        调用TTS接口并把音频写入文件，按响应的Content-Type处理三种返回方式：
+        二进制音频流、SSE分块（每个事件携带一段base64音频）、一次性返回base64音频的JSON
+        :param request_data: 请求参数
+        :param headers: 请求头
+        :param output_path: 输出文件路径
+        :param timestamps: 传入列表时写入接口返回的句子时间戳（begin_time、end_time，毫秒），二进制流没有时间戳
+        :return: 音频内容的SHA-1摘要，失败时返回 None
+        """
+        # 经调度器排队后再调用接口，交互请求优先于批量任务，同级按调用方公平轮转
+        cost = max(1.0, len(request_data["input"]["text"]) / 100)
+        with tts_scheduler.slot(cost), httpx.Client() as client:
+            with client.stream("POST", self.dashscope_tts_endpoint, json=request_data, headers=headers, timeout=30.0) as response:
+                # 检查响应状态
+                logger.info(f"TTS API响应状态码: {response.status_code}")
+                if response.status_code != 200:
+                    response.read()
+                    logger.error(f"语音生成失败，状态码: {response.status_code}")
+                    logger.error(f"错误信息: {response.text[:500]}")
+                    return None
+                
+                content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+                logger.info(f"TTS API响应类型: {content_type}")
+                if content_type.startswith("audio/") or content_type == "application/octet-stream":
+                    digest = self._write_audio_stream(response.iter_bytes(), output_path)
+                elif content_type == "text/event-stream":
+                    digest = self._write_audio_stream(self._iter_sse_audio(response.iter_lines(), timestamps), output_path)
+                else:
+                    # 兼容一次性返回base64音频的JSON响应
+                    response_data = json.loads(response.read())
+                    if response_data.get("status_code") != 200:
+                        logger.error(f"语音生成失败: {response_data.get('status_message', '未知错误')}")
+                        return None
+                    audio_data = response_data.get("result", {}).get("audio_data")
+                    digest = self._save_audio_data(audio_data, output_path) if audio_data else None
+                    if timestamps is not None:
+                        timestamps.extend(response_data.get("result", {}).get("sentences") or [])
+                
+                if not digest:
+                    logger.error("语音生成失败: 未返回音频数据")
+                return digest
+    
+    def _iter_sse_audio(self, lines: Iterator[str], timestamps: Optional[List[Dict]] = None) -> Iterator[bytes]:
+        """
+        从SSE事件流中逐段解码音频
+        :param lines: 响应的文本行
+        :param timestamps: 传入列表时收集事件中的句子时间戳（同一句子的多次更新以最后一次为准）
+        :return: 音频数据块
+        """
+        import base64
+        sentences: Dict[int, Dict] = {}
+        for line in lines:
+            if not line.startswith("data:"):
+                continue
+            payload = line[5:].strip()
+            if not payload or payload == "[DONE]":
+                continue
+            event = json.loads(payload)
+            if event.get("code"):
+                raise RuntimeError(f"TTS流式返回错误: {event.get('code')} {event.get('message', '')}")
+            audio_data = ((event.get("output") or {}).get("audio") or {}).get("data") \
+                or (event.get("result") or {}).get("audio_data")
+            sentence = (event.get("output") or {}).get("sentence")
+            if timestamps is not None and sentence and "begin_time" in sentence:
+                sentences[sentence.get("index", sentence["begin_time"])] = sentence
+            if audio_data:
+                yield base64.b64decode(audio_data)
+        if timestamps is not None:
+            timestamps.extend(sentences[key] for key in sorted(sentences))
+    
+    def _write_audio_stream(self, chunks: Iterable[bytes], output_path: Path) -> Optional[str]:
+        """
+        把音频数据块边到达边写入临时文件，完成后原子替换到目标路径，内存占用与音频长度无关
+        :param chunks: 音频数据块
+        :param output_path: 输出文件路径
+        :return: 音频内容的SHA-1摘要，没有收到任何数据时返回 None
+        """
+        import hashlib
+        digest = hashlib.sha1()
+        written = 0
+        temp_path = output_path.with_name(f"{output_path.name}.{uuid.uuid4().hex[:8]}.part")
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in chunks:
+                    if chunk:
+                        f.write(chunk)
+                        digest.update(chunk)
+                        written += len(chunk)
+            if written == 0:
+                os.remove(temp_path)
+                return None
+            os.replace(temp_path, output_path)
+            return digest.hexdigest()
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+    
+    def _save_audio_data(self, audio_data: str, output_path: Path) -> str:
+        """
+        解码base64音频数据并写入文件
+        :param audio_data: base64编码的音频数据
+        :param output_path: 输出文件路径
+        :return: 音频内容的SHA-1摘要
+        """
+        import base64
+        import hashlib
+        audio_bytes = base64.b64decode(audio_data)
+        # 先写临时文件再原子替换，避免并发请求读到写了一半的文件
+        temp_path = output_path.with_name(f"{output_path.name}.{uuid.uuid4().hex[:8]}.part")
+        with open(temp_path, 'wb') as f:
+            f.write(audio_bytes)
+        os.replace(temp_path, output_path)
+        return hashlib.sha1(audio_bytes).hexdigest()
+    
+    def _content_id(self, text: str, speaker: Dict, output: Dict) -> str:
+        """
+        根据文本、音色与输出参数计算内容ID
+        :param text: 文本
+        :param speaker: 说话人配置
+        :param output: 输出参数
+        :return: 内容ID
+        """
+        import hashlib
+        key = "|".join([
+            speaker["voice_id"], speaker.get("style", "default"), output["format"], output["provider_format"],
+            str(output["sample_rate"]), str(output["bitrate"] or ""), text
+        ])
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:24]
+    
+    def synthesize_batched(self, dialog: List[Dict], profile: Optional[str] = None, audio_format: str = "mp3") -> int:
+        """
+        预先合成对话中的短句：同一音色的短句按出现顺序合并为一次请求，再按句子时间戳切回各轮并写入音频存储，
+        之后逐轮调用 generate_speech 时直接命中；无法合并或切分失败的轮次不受影响，仍按原方式单独合成
+        :param dialog: 对话列表，每个元素包含role和text
+        :param profile: 输出配置名称
+        :param audio_format: 音频格式（未指定输出配置时使用）
+        :return: 通过合并合成生成的轮次数
+        """
+        batches = self.plan_batches(dialog, profile, audio_format)
+        if not batches:
+            return 0
+        futures = [
+            self._piece_pools[current_priority()].submit(contextvars.copy_context().run, self.synthesize_batch, batch)
+            for batch in batches
+        ]
+        produced = 0
+        for future in futures:
+            try:
+                produced += future.result()
+            except Exception as e:
+                logger.warning(f"合并合成失败，相关轮次将单独合成: {e}")
+        logger.info(f"合并合成: {len(batches)} 次请求生成 {produced} 轮短句语音")
+        return produced
+    
+    def plan_batches(self, dialog: List[Dict], profile: Optional[str] = None, audio_format: str = "mp3") -> List[Dict]:
+        """
+        为对话中尚未生成语音的短句规划合并请求（只查索引，不调用接口）
+        :param dialog: 对话列表，每个元素包含role和text
+        :param profile: 输出配置名称
+        :param audio_format: 音频格式（未指定输出配置时使用）
+        :return: 合并请求列表，每项包含 speaker、output、turns（(文本, 内容ID) 列表）与 indexes（涉及的对话位置，
+                 含文本与音色都相同的重复轮次）；关闭合并合成或没有可合并的短句时为空列表
+        """
+        if not self.batch_max_chars or not self._batch_supported or not self.dashscope_api_key:
+            return []
+        output = self.resolve_profile(profile, audio_format)
+        if output["provider_format"] not in CONCAT_FORMATS:
+            return []
+        # 按音色分组，同一组内按出现顺序装箱
+        groups: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+        positions: Dict[str, List[int]] = {}
+        speakers = self.speakers
+        for index, item in enumerate(dialog):
+            text = (item.get("text") or "").strip()
+            if not text or len(text) > self.batch_turn_chars:
+                continue
+            speaker = speakers.get(item.get("role", "host"), speakers["host"])
+            content_id = self._content_id(text, speaker, output)
+            if content_id in positions:
+                positions[content_id].append(index)
+                continue
+            if self.audio_store.get(content_id) or self.shared.locate_audio(content_id):
+                continue
+            positions[content_id] = [index]
+            groups.setdefault((speaker["voice_id"], speaker.get("style", "default")), []).append((text, content_id))
+        
+        batches = []
+        for (voice_id, style), turns in groups.items():
+            speaker = {"voice_id": voice_id, "style": style}
+            current, chars = [], 0
+            for text, content_id in turns:
+                if current and chars + len(text) > self.batch_max_chars:
+                    batches.append((speaker, current))
+                    current, chars = [], 0
+                current.append((text, content_id))
+                chars += len(text)
+            batches.append((speaker, current))
+        return [
+            {"speaker": speaker, "output": output, "turns": turns,
+             "indexes": sorted(index for _, content_id in turns for index in positions[content_id])}
+            for speaker, turns in batches if len(turns) > 1
+        ]
+    
+    def synthesize_batch(self, batch: Dict) -> int:
+        """
+        合并合成一组短句并切分为各轮的语音
+        :param batch: plan_batches 返回的一个合并请求
+        :return: 成功写入音频存储的轮次数，失败时返回 0
+        """
+        turns, speaker, output = batch["turns"], batch["speaker"], batch["output"]
+        texts = [text for text, _ in turns]
+        joined = "\n".join(text if _TURN_END.search(text) else text + "。" for text in texts)
+        request_data, headers = self._build_tts_request(joined, speaker, output)
+        request_data["parameters"]["sentence_timestamp_enabled"] = True
+        provider_format = output["provider_format"]
+        first_path = self.audio_store.path_for(turns[0][1], output["format"])
+        batch_path = first_path.with_name(f"{first_path.stem}.batch.{uuid.uuid4().hex[:8]}.{provider_format}")
+        clip_paths = []
+        try:
+            timestamps: List[Dict] = []
+            if not self._synthesize_to_file(request_data, headers, batch_path, timestamps):
+                return 0
+            if not timestamps:
+                # 只影响本次合并，相关轮次改为单独合成；接口一直不返回时间戳时应通过 TTS_SENTENCE_TIMESTAMPS 关闭
+                logger.warning(f"TTS接口没有返回句子时间戳，{len(texts)} 轮对话改为单独合成")
+                return 0
+            cuts = turn_boundaries(texts, timestamps)
+            if cuts is None:
+                logger.warning(f"句子时间戳无法与 {len(texts)} 轮对话对齐，改为单独合成")
+                return 0
+            for _, content_id in turns:
+                output_path = self.audio_store.path_for(content_id, output["format"])
+                clip_paths.append(output_path.with_name(f"{output_path.stem}.src.{provider_format}")
+                                  if output["transcode"] else output_path)
+            if not split_audio(batch_path, clip_paths, cuts, provider_format, output["sample_rate"]):
+                return 0
+            for (_, content_id), clip_path in zip(turns, clip_paths):
+                output_path = self.audio_store.path_for(content_id, output["format"])
+                digest = self._convert_audio(clip_path, output_path, output) if output["transcode"] else file_digest(clip_path)
+                if not digest:
+                    return 0
+                self.audio_store.add(content_id, output_path, digest=digest)
+                self.shared.publish_audio(content_id, output["format"], output_path.stat().st_size, digest)
+            return len(turns)
+        finally:
+            for path in [batch_path] + (clip_paths if output["transcode"] else []):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    
+    def process_dialog(self, dialog: List[Dict], profile: Optional[str] = None, job_id: Optional[str] = None) -> List[Dict]:
         """
         处理对话，为每个对话生成语音
         :param dialog: 对话列表，每个元素包含role、speaker和text
+        :param profile: 输出配置名称
+        :param job_id: 任务ID，指定时逐段记录状态，以同一ID重试只合成未完成或失败的分段
         :return: 带语音文件路径的对话列表
         """
+        if job_id:
+            self.job_store.upsert(job_id, dialog, profile)
+            return self.run_job(job_id)
+        
+        self.synthesize_batched(dialog, profile)
         processed_dialog = []
         
         for item in dialog:
@@ -166,52 +736,436 @@ class TTSManager:
             text = item.get("text", "")
             
             # 生成语音
-            audio_path = self.generate_speech(text, role)
+            audio_path = self.generate_speech(text, role, profile=profile)
             
             # 添加到处理后的对话
             processed_item = {
                 "role": role,
                 "speaker": speaker,
                 "text": text,
-                "audio_path": audio_path
+                "audio_path": audio_path,
+                "audio_id": self.audio_store.content_id_for(audio_path)
             }
             processed_dialog.append(processed_item)
         
         logger.info(f"对话处理完成，共处理 {len(processed_dialog)} 个对话")
         return processed_dialog
     
-    def create_podcast(self, dialog: List[Dict], podcast_title: str) -> Optional[str]:
+    def run_job(self, job_id: str) -> List[Dict]:
+        """
+        执行（或继续执行）合成任务：已完成且音频仍在的分段直接复用，其余分段重新合成
+        :param job_id: 任务ID
+        :return: 带语音文件路径的对话列表
+        """
+        job = self.job_store.get(job_id)
+        if job is None:
+            raise ValueError(f"任务不存在: {job_id}")
+        with self._jobs_lock:
+            # 租约未过期说明任务正由其他进程（如任务工作进程）执行
+            if job_id in self._active_jobs or self.job_store.is_leased(job):
+                raise RuntimeError(f"任务正在执行: {job_id}")
+            self._active_jobs.add(job_id)
+        
+        # 执行期间定期刷新租约，其他进程启动时不会把任务当作已中断
+        renewing = threading.Event()
+
+        def renew():
+            while not renewing.wait(self.job_store.lease_seconds / 4):
+                self.job_store.renew(job_id)
+
+        try:
+            self.job_store.set_status(job_id, RUNNING)
+            threading.Thread(target=renew, daemon=True).start()
+            self.publish_job(job_id)
+            self.synthesize_batched([segment for segment in job["segments"] if segment["status"] != DONE], job["profile"])
+            processed_dialog = []
+            reused = failed = 0
+            for segment in job["segments"]:
+                audio_path = None
+                if segment["status"] == DONE and segment["audio_id"]:
+                    cached_path = self.audio_store.get(segment["audio_id"])
+                    audio_path = str(cached_path) if cached_path else None
+                if audio_path:
+                    reused += 1
+                else:
+                    self.job_store.mark_segment(job_id, segment["index"], RUNNING)
+                    audio_path = self.generate_speech(segment["text"], segment["role"], profile=job["profile"])
+                    if audio_path:
+                        self.job_store.mark_segment(job_id, segment["index"], DONE, audio_path,
+                                                    self.audio_store.content_id_for(audio_path))
+                    else:
+                        failed += 1
+                        self.job_store.mark_segment(job_id, segment["index"], FAILED, error="语音生成失败")
+                    self.publish_job(job_id)
+                
+                processed_dialog.append({
+                    "role": segment["role"],
+                    "speaker": segment["speaker"],
+                    "text": segment["text"],
+                    "audio_path": audio_path,
+                    "audio_id": self.audio_store.content_id_for(audio_path)
+                })
+            
+            self.job_store.set_status(job_id, FAILED if failed else DONE, f"{failed} 个分段生成失败" if failed else None)
+            self.publish_job(job_id)
+            logger.info(f"任务 {job_id} 处理完成，共 {len(processed_dialog)} 段，复用 {reused} 段，失败 {failed} 段")
+            return processed_dialog
+        except Exception as e:
+            self.job_store.set_status(job_id, FAILED, str(e))
+            self.publish_job(job_id)
+            raise
+        finally:
+            renewing.set()
+            with self._jobs_lock:
+                self._active_jobs.discard(job_id)
+    
+    def publish_job(self, job_id: str) -> None:
+        """
+        把任务状态快照写入共享存储，其他实例可以查询进度或接手未完成的任务
+        :param job_id: 任务ID
         """
-        创建完整的播客节目
+        # 单机模式下任务状态本来就在本机任务库中，快照没有读者，不写入
+        if not self.shared.shared:
+            return
+        job = self.job_store.get(job_id)
+        if job is not None:
+            self.shared.set_json("job", job_id, value=dict(job, node=self.shared.node_id), ttl=self.job_snapshot_ttl)
+    
+    def adopt_job(self, job_id: str, stale_seconds: float = 120.0) -> bool:
+        """
+        从共享存储的快照在本机重建其他实例创建的任务，已生成的分段按内容ID从原实例获取，不重复合成
+        :param job_id: 任务ID
+        :param stale_seconds: 快照显示执行中时，超过该时长未更新才视为原实例已退出
+        :return: 是否重建成功
+        """
+        job = self.shared.get_json("job", job_id)
+        if job is None:
+            return False
+        if job["status"] == RUNNING and time.time() - job["updated_at"] < stale_seconds:
+            raise RuntimeError(f"任务正在实例 {job.get('node')} 上执行: {job_id}")
+        self.job_store.upsert(job_id, job["segments"], job["profile"])
+        logger.info(f"从实例 {job.get('node')} 的快照接手任务 {job_id}，共 {len(job['segments'])} 段")
+        return True
+    
+    def create_podcast(self, dialog: List[Dict], podcast_title: str, profile: Optional[str] = None,
+                       chapters: Optional[List[Dict]] = None) -> Optional[str]:
+        """
+        创建完整的播客节目：写入清单（第1版），并把各分段语音拼接为整期音频
+        清单中记录各分段的时长、起始时间与字节区间，以及章节和逐句的文稿同步索引，播放器无需解码即可跳转
         :param dialog: 对话列表，每个元素包含role、speaker、text和audio_path
         :param podcast_title: 播客标题
+        :param profile: 语音使用的输出配置名称
+        :param chapters: 章节，每个元素包含 title 与 start（起始分段序号），如提纲模式脚本的 sections；未指定时按时长自动划分
         :return: 生成的播客文件路径
         """
         try:
             # 生成唯一的文件名
             import hashlib
-            import time
             timestamp = int(time.time())
             title_hash = hashlib.md5(podcast_title.encode()).hexdigest()[:8]
-            filename = f"podcast_{title_hash}_{timestamp}.json"
-            output_path = self.audio_output_dir / filename
+            podcast_id = f"podcast_{title_hash}_{timestamp}"
+            output = self.resolve_profile(profile or DEFAULT_AUDIO_PROFILE)
+            items = [self._podcast_item(item, output) for item in dialog]
             
             # 保存播客信息
             podcast_info = {
+                "podcast_id": podcast_id,
+                "version": 1,
                 "title": podcast_title,
                 "created_at": timestamp,
-                "dialog": dialog
+                "profile": profile or DEFAULT_AUDIO_PROFILE,
+                "audio": self._build_podcast_audio(f"{podcast_id}_v1_audio", items, output, None),
+                "dialog": items
             }
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(podcast_info, f, ensure_ascii=False, indent=2)
-            
+            podcast_info.update(self._build_timeline(items, output, chapters) or {})
+            output_path = self._save_podcast_version(podcast_info)
             logger.info(f"播客创建成功: {output_path}")
             return str(output_path)
         except Exception as e:
             logger.error(f"播客创建失败: {e}")
             return None
     
+    def update_podcast(self, podcast_id: str, dialog: List[Dict], podcast_title: Optional[str] = None,
+                       profile: Optional[str] = None, chapters: Optional[List[Dict]] = None) -> Dict:
+        """
+        按修改后的对话生成播客的新版本：与上一版本按分段内容哈希（文本、音色与输出参数）比较，
+        只合成内容变化的分段，未变化的分段直接从上一版本的整期音频中复制对应的字节区间
+        :param podcast_id: 播客ID
+        :param dialog: 修改后的对话列表，每个元素包含role、speaker和text
+        :param podcast_title: 新标题，未指定时沿用上一版本
+        :param profile: 输出配置名称，未指定时沿用上一版本
+        :param chapters: 章节（见 create_podcast），未指定时按时长自动划分
+        :return: {"podcast_id", "version", "podcast_path", "audio_id", "changed", "removed", "reused"}
+        """
+        with self._jobs_lock:
+            if podcast_id in self._active_podcasts:
+                raise RuntimeError(f"播客正在更新: {podcast_id}")
+            self._active_podcasts.add(podcast_id)
+        try:
+            previous = self.load_podcast(podcast_id)
+            if previous is None:
+                raise ValueError(f"播客不存在: {podcast_id}")
+            profile = profile or previous.get("profile") or DEFAULT_AUDIO_PROFILE
+            output = self.resolve_profile(profile)
+            previous_items = {item["hash"]: item for item in previous["dialog"] if item.get("hash")}
+            # 上一版本整期音频仍在时，其中记录了字节区间的分段可以直接复用
+            reusable = set()
+            if previous.get("audio") and previous.get("profile") == profile and \
+                    (self.audio_store.get(previous["audio"]["content_id"]) or self.fetch_from_peer(previous["audio"]["content_id"])):
+                reusable = {segment_hash for segment_hash, item in previous_items.items() if item.get("size")}
+            
+            items, changed, failed = [], [], 0
+            speakers = self.speakers
+            for index, item in enumerate(dialog):
+                text = item.get("text", "")
+                role = item.get("role", "host")
+                segment_hash = self._content_id(text, speakers.get(role, speakers["host"]), output)
+                if segment_hash not in previous_items:
+                    changed.append(index)
+                if segment_hash in reusable:
+                    audio_path = previous_items[segment_hash].get("audio_path")
+                else:
+                    # 未变化但上一版本没有整期音频的分段会命中已生成的语音，不会重复合成
+                    audio_path = self.generate_speech(text, role, profile=profile)
+                    if not audio_path:
+                        failed += 1
+                items.append(self._podcast_item(
+                    dict(item, audio_path=audio_path, audio_id=self.audio_store.content_id_for(audio_path)), output
+                ))
+            if failed:
+                raise RuntimeError(f"{failed} 段语音生成失败")
+            
+            version = previous.get("version", 1) + 1
+            new_hashes = {item["hash"] for item in items}
+            previous_hashes = set(previous_items)
+            podcast_info = {
+                "podcast_id": podcast_id,
+                "version": version,
+                "parent": previous.get("version", 1),
+                "title": podcast_title or previous.get("title", ""),
+                "created_at": int(time.time()),
+                "profile": profile,
+                "audio": self._build_podcast_audio(f"{podcast_id}_v{version}_audio", items, output, previous),
+                "dialog": items,
+                "changes": {
+                    "changed": changed,
+                    "removed": len(previous_hashes - new_hashes),
+                }
+            }
+            podcast_info.update(self._build_timeline(items, output, chapters) or {})
+            output_path = self._save_podcast_version(podcast_info)
+            reused = len(items) - len(changed)
+            logger.info(f"播客 {podcast_id} 更新为第 {version} 版，{len(changed)} 段有变化，复用 {reused} 段: {output_path}")
+            return {
+                "podcast_id": podcast_id,
+                "version": version,
+                "podcast_path": str(output_path),
+                "audio_id": podcast_info["audio"]["content_id"] if podcast_info["audio"] else None,
+                "changed": changed,
+                "removed": podcast_info["changes"]["removed"],
+                "reused": reused,
+            }
+        finally:
+            with self._jobs_lock:
+                self._active_podcasts.discard(podcast_id)
+    
+    def load_podcast(self, podcast_id: str, version: Optional[int] = None) -> Optional[Dict]:
+        """
+        读取播客清单
+        :param podcast_id: 播客ID
+        :param version: 版本号，未指定时读取最新版本
+        :return: 清单，不存在时返回 None
+        """
+        if version is None:
+            # 多实例部署时以共享存储记录的最新版本为准，本机缓存的最新清单可能已过期
+            latest = self.shared.get_json("podcast", podcast_id)
+            version = latest.get("version") if latest else None
+        content_id = f"{podcast_id}_v{version}" if version else podcast_id
+        path = self.audio_store.get(content_id) or self.fetch_from_peer(content_id)
+        if not path:
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _podcast_item(self, item: Dict, output: Dict) -> Dict:
+        """清单中的一个分段：对话内容、语音文件与内容哈希"""
+        role = item.get("role", "host")
+        text = item.get("text", "")
+        audio_path = item.get("audio_path")
+        speakers = self.speakers
+        return {
+            "role": role,
+            "speaker": item.get("speaker", "主持人"),
+            "text": text,
+            "audio_path": audio_path,
+            "audio_id": item.get("audio_id") or self.audio_store.content_id_for(audio_path),
+            "hash": self._content_id(text, speakers.get(role, speakers["host"]), output),
+        }
+    
+    def _build_podcast_audio(self, audio_id: str, items: List[Dict], output: Dict,
+                             previous: Optional[Dict]) -> Optional[Dict]:
+        """
+        拼接整期音频，并在各分段中记录其在整期音频中的字节区间（offset、size）
+        与上一版本内容哈希相同的分段直接复制上一版本整期音频中的区间，不需要分段语音文件
+        :param audio_id: 整期音频的内容ID
+        :param items: 清单中的分段
+        :param output: 输出参数
+        :param previous: 上一版本的清单
+        :return: {"content_id", "format", "size", "reused_bytes"}，格式不支持拼接或缺少语音时返回 None
+        """
+        audio_format = output["format"]
+        if audio_format not in CONCAT_FORMATS:
+            logger.info(f"{audio_format} 格式不支持直接拼接，不生成整期音频")
+            return None
+        previous_path, previous_fmt, ranges, durations = None, None, {}, {}
+        if previous and previous.get("audio") and previous.get("profile") == output["profile"]:
+            previous_path = self.audio_store.get(previous["audio"]["content_id"]) or \
+                self.fetch_from_peer(previous["audio"]["content_id"])
+            if previous_path:
+                previous_fmt = audio_payload(previous_path, audio_format)[0]
+                ranges = {item["hash"]: (item["offset"], item["size"]) for item in previous["dialog"]
+                          if item.get("hash") and item.get("size")}
+                durations = {item["hash"]: item["duration"] for item in previous["dialog"]
+                             if item.get("hash") and item.get("duration") is not None}
+        
+        parts, fmt, reused_bytes = [], None, 0
+        for index, item in enumerate(items):
+            if item["hash"] in ranges:
+                part_fmt = previous_fmt
+                parts.append((previous_path, *ranges[item["hash"]]))
+                reused_bytes += ranges[item["hash"]][1]
+                item["duration"] = durations.get(item["hash"])
+            else:
+                # 只读取音频存储中的文件，不信任客户端传入的路径
+                path = self.audio_store.get(item["audio_id"]) if item.get("audio_id") else None
+                if not path:
+                    logger.warning(f"第 {index + 1} 段没有可用的语音，不生成整期音频")
+                    return None
+                part_fmt, offset, length = audio_payload(path, audio_format)
+                parts.append((path, offset, length))
+            if fmt is None:
+                fmt = part_fmt
+            elif audio_format == "wav" and part_fmt != fmt:
+                logger.warning("分段WAV的采样参数不一致，不生成整期音频")
+                return None
+        
+        output_path = self.audio_store.path_for(audio_id, audio_format)
+        offsets = write_audio(parts, output_path, audio_format, fmt)
+        if offsets is None:
+            return None
+        for item, offset, (_, _, length) in zip(items, offsets, parts):
+            item["offset"] = offset
+            item["size"] = length
+            if item.get("duration") is None:
+                # 时长只解析刚写入的区间的帧头，不解码
+                item["duration"] = range_duration(output_path, offset, length, audio_format, fmt, output["sample_rate"])
+        digest = file_digest(output_path)
+        size = output_path.stat().st_size
+        self.audio_store.add(audio_id, output_path, digest=digest)
+        self.shared.publish_audio(audio_id, audio_format, size, digest)
+        logger.info(f"整期音频拼接完成: {output_path}，{size} 字节，其中 {reused_bytes} 字节复用自上一版本")
+        return {"content_id": audio_id, "format": audio_format, "size": size, "reused_bytes": reused_bytes}
+    
+    def _build_timeline(self, items: List[Dict], output: Dict, chapters: Optional[List[Dict]] = None) -> Optional[Dict]:
+        """
+        计算播客的时间轴：各分段的起始时间（start）、时长（duration）与同一角色的发言序号（turn），
+        以及章节与逐句的文稿同步索引；没有整期音频时按分段语音文件的帧头/文件头读取时长
+        :param items: 清单中的分段，就地写入 start、duration、turn
+        :param output: 输出参数
+        :param chapters: 章节，每个元素包含 title 与 start（起始分段序号），未指定时按 chapter_seconds 自动划分
+        :return: {"duration", "chapters", "transcript"}，有分段无法读取时长时返回 None
+        """
+        turns: Dict[str, int] = {}
+        elapsed = 0.0
+        for index, item in enumerate(items):
+            turns[item["role"]] = turns.get(item["role"], 0) + 1
+            item["turn"] = turns[item["role"]]
+            if item.get("duration") is None:
+                path = self.audio_store.get(item["audio_id"]) if item.get("audio_id") else None
+                item["duration"] = audio_duration(path, sample_rate=output["sample_rate"]) if path else None
+            if item["duration"] is None:
+                logger.warning(f"第 {index + 1} 段无法读取时长，清单中不记录时间轴")
+                for other in items:
+                    other.pop("start", None)
+                return None
+            item["start"] = round(elapsed, 3)
+            elapsed += item["duration"]
+        
+        # 逐句索引：分段内各句的时间按字数比例估算
+        transcript = []
+        for index, item in enumerate(items):
+            sentences = split_sentences(item["text"]) or [item["text"]]
+            total = sum(len(sentence) for sentence in sentences) or 1
+            position = item["start"]
+            for sentence in sentences:
+                end = position + item["duration"] * len(sentence) / total
+                transcript.append({"segment": index, "start": round(position, 3), "end": round(end, 3), "text": sentence})
+                position = end
+        
+        if chapters:
+            marks = sorted({
+                int(chapter["start"]): chapter.get("title") or "" for chapter in chapters
+                if isinstance(chapter.get("start"), int) and 0 <= chapter["start"] < len(items)
+            }.items())
+            if marks and marks[0][0] != 0:
+                marks.insert(0, (0, "开场"))
+        else:
+            marks, chapter_start = [], 0.0
+            for index, item in enumerate(items):
+                if index == 0 or (item["start"] - chapter_start >= self.chapter_seconds and item["role"] == items[0]["role"]):
+                    marks.append((index, ""))
+                    chapter_start = item["start"]
+        chapter_index = []
+        for n, (start, title) in enumerate(marks):
+            end = marks[n + 1][0] if n + 1 < len(marks) else len(items)
+            last = items[end - 1]
+            chapter_index.append({
+                "title": title or (split_sentences(items[start]["text"]) or [items[start]["text"]])[0][:24],
+                "start_segment": start,
+                "end_segment": end,
+                "start": items[start]["start"],
+                "end": round(last["start"] + last["duration"], 3),
+                **({"offset": items[start]["offset"]} if "offset" in items[start] else {}),
+            })
+        return {"duration": round(elapsed, 3), "chapters": chapter_index, "transcript": transcript}
+    
+    def _save_podcast_version(self, podcast_info: Dict) -> Path:
+        """
+        保存播客清单：每个版本单独保存为 {podcast_id}_v{version}，播客ID本身始终指向最新版本
+        最新版本的清单及其引用的分段语音与整期音频在有效期内不参与淘汰，旧版本的清单与整期音频可以被淘汰
+        :return: 最新版本清单的路径
+        """
+        podcast_id = podcast_info["podcast_id"]
+        version_id = f"{podcast_id}_v{podcast_info['version']}"
+        # 播客引用的语音与最新版本清单在有效期内不参与淘汰；先标记再写入，避免写入清单时触发的淘汰删掉它
+        self.audio_store.release(podcast_id)
+        referenced = [version_id] + [item.get("audio_id") for item in podcast_info["dialog"]]
+        if podcast_info.get("audio"):
+            referenced.append(podcast_info["audio"]["content_id"])
+        self.audio_store.pin(podcast_id, referenced)
+        for content_id, kind in ((version_id, "podcast_version"), (podcast_id, "podcast")):
+            output_path = self.audio_store.path_for(content_id, "json")
+            # 先写临时文件再原子替换，正在下载的旧版本清单不受影响
+            temp_path = output_path.with_name(f"{output_path.name}.{uuid.uuid4().hex[:8]}.part")
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(podcast_info, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, output_path)
+            self.audio_store.add(content_id, output_path, kind=kind)
+            self.shared.publish_audio(content_id, "json", output_path.stat().st_size, None)
+        self.shared.set_json("podcast", podcast_id, value={"version": podcast_info["version"]})
+        return output_path
+    
+    def get_profiles(self) -> Dict[str, Dict]:
+        """
+        获取可用的输出配置
+        :return: 输出配置列表，available 表示当前环境能否按配置输出（需要转码的配置依赖ffmpeg）
+        """
+        has_ffmpeg = ffmpeg_path() is not None
+        return {
+            name: dict(config, available=has_ffmpeg or (config["format"] == config["provider_format"] and not config["bitrate"]))
+            for name, config in AUDIO_PROFILES.items()
+        }
+    
     def get_speakers(self) -> Dict[str, Dict]:
         """
         获取可用的说话人列表
@@ -228,9 +1182,14 @@ class TTSManager:
         :return: 是否更新成功
         """
         try:
-            if speaker_id in self.speakers:
-                self.speakers[speaker_id]["voice_id"] = voice_id
-                self.speakers[speaker_id]["style"] = style
+            # 修改前以共享存储中的最新配置为准，不使用缓存
+            self._speakers_cache = None
+            speakers = self.speakers
+            if speaker_id in speakers:
+                config = dict(speakers[speaker_id], voice_id=voice_id, style=style)
+                self._speakers[speaker_id] = config
+                self.shared.save_speaker(speaker_id, config)
+                self._speakers_cache = None
                 logger.info(f"说话人 {speaker_id} 更新成功: {voice_id}, {style}")
                 return True
             logger.warning(f"说话人 {speaker_id} 不存在")
@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# 任务优先级，数值越小越先执行
+TASK_PRIORITIES = {"interactive": 0, "batch": 1, "background": 2}
+
+DEFAULT_QUEUE_DB = Path(__file__).parent.parent / "data" / "queue.db"
+
+
+class WorkQueue:
+    """
+    基于SQLite的本地任务队列，Web进程提交任务，独立的工作进程领取执行
+    工作进程定期刷新心跳，超时未刷新的任务视为进程已退出，重新排队（超过最大尝试次数则标记失败）
+    已结束的任务保留 retention_seconds 后清理
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, heartbeat_timeout: float = 60.0, max_attempts: int = 3,
+                 retention_seconds: Optional[float] = None):
+        self.db_path = Path(db_path or os.getenv("WORK_QUEUE_DB") or DEFAULT_QUEUE_DB)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        if retention_seconds is None:
+            retention_seconds = float(os.getenv("WORK_QUEUE_RETENTION_SECONDS", "604800"))
+        self.retention_seconds = retention_seconds
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+        # 多进程共享同一个数据库：手动控制事务，写锁冲突时最多等待30秒
+        self._db = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 1,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                worker TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                heartbeat REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_queue ON tasks(status, priority, created_at);
+            CREATE INDEX IF NOT EXISTS idx_tasks_finished ON tasks(finished_at);
+        """)
+
+    def submit(self, kind: str, payload: Dict[str, Any], priority: str = "batch") -> str:
+        """
+        提交任务
+        :param kind: 任务类型
+        :param payload: 任务参数
+        :param priority: 优先级（interactive/batch/background）
+        :return: 任务ID
+        """
+        task_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO tasks (task_id, kind, payload, priority, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (task_id, kind, json.dumps(payload, ensure_ascii=False), TASK_PRIORITIES.get(priority, 1), QUEUED, time.time())
+            )
+        return task_id
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """
+        领取一个待执行的任务（按优先级、提交时间），同时回收心跳超时的任务
+        :param worker_id: 工作进程标识
+        :return: 任务信息，没有待执行任务时返回 None
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                stale = now - self.heartbeat_timeout
+                self._db.execute(
+                    "UPDATE tasks SET status = ?, error = '工作进程退出，超过最大尝试次数', finished_at = ? "
+                    "WHERE status = ? AND heartbeat < ? AND attempts >= ?",
+                    (FAILED, now, RUNNING, stale, self.max_attempts)
+                )
+                requeued = self._db.execute(
+                    "UPDATE tasks SET status = ?, worker = NULL WHERE status = ? AND heartbeat < ?",
+                    (QUEUED, RUNNING, stale)
+                ).rowcount
+                if requeued:
+                    logger.warning(f"{requeued} 个任务的工作进程已无响应，重新排队")
+                row = self._db.execute(
+                    "SELECT * FROM tasks WHERE status = ? ORDER BY priority, created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE tasks SET status = ?, worker = ?, started_at = ?, heartbeat = ?, attempts = attempts + 1 "
+                        "WHERE task_id = ?",
+                        (RUNNING, worker_id, now, now, row["task_id"])
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if self.retention_seconds and now - self._last_purge >= min(self.retention_seconds, 3600):
+            self._last_purge = now
+            self.purge(now - self.retention_seconds)
+        if row is None:
+            return None
+        task = dict(row)
+        task["payload"] = json.loads(task["payload"])
+        return task
+
+    def heartbeat(self, task_id: str, worker_id: str) -> None:
+        with self._lock:
+            self._db.execute("UPDATE tasks SET heartbeat = ? WHERE task_id = ? AND status = ? AND worker = ?",
+                             (time.time(), task_id, RUNNING, worker_id))
+
+    def complete(self, task_id: str, result: Any, worker_id: str) -> bool:
+        """
+        记录任务结果，只有当前领取该任务的工作进程可以写入
+        :return: 是否写入；心跳超时后任务已被其他工作进程重新领取时返回 False
+        """
+        with self._lock:
+            updated = self._db.execute(
+                "UPDATE tasks SET status = ?, result = ?, error = NULL, finished_at = ? "
+                "WHERE task_id = ? AND status = ? AND worker = ?",
+                (DONE, json.dumps(result, ensure_ascii=False), time.time(), task_id, RUNNING, worker_id)
+            ).rowcount
+        if not updated:
+            logger.warning(f"任务 {task_id} 已不归 {worker_id} 执行，丢弃其结果")
+        return bool(updated)
+
+    def fail(self, task_id: str, error: str, worker_id: str) -> bool:
+        """
+        记录任务失败，只有当前领取该任务的工作进程可以写入
+        :return: 是否写入
+        """
+        with self._lock:
+            updated = self._db.execute(
+                "UPDATE tasks SET status = ?, error = ?, finished_at = ? WHERE task_id = ? AND status = ? AND worker = ?",
+                (FAILED, error, time.time(), task_id, RUNNING, worker_id)
+            ).rowcount
+        if not updated:
+            logger.warning(f"任务 {task_id} 已不归 {worker_id} 执行，忽略其失败结果")
+        return bool(updated)
+
+    def purge(self, before: float) -> int:
+        """
+        删除在指定时间之前结束的任务
+        :param before: 时间戳
+        :return: 删除的任务数
+        """
+        with self._lock:
+            deleted = self._db.execute(
+                "DELETE FROM tasks WHERE finished_at < ? AND status IN (?, ?)", (before, DONE, FAILED)
+            ).rowcount
+        if deleted:
+            logger.info(f"清理了 {deleted} 个已结束的任务")
+        return deleted
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询任务状态与结果
+        :param task_id: 任务ID
+        :return: 任务信息，不存在时返回 None
+        """
+        with self._lock:
+            row = self._db.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        task = dict(row)
+        task["payload"] = json.loads(task["payload"])
+        task["result"] = json.loads(task["result"]) if task["result"] else None
+        return task
+
+    def stats(self) -> Dict[str, Any]:
+        """各状态的任务数、排队最久的等待时间与活跃的工作进程"""
+        now = time.time()
+        with self._lock:
+            counts = {row[0]: row[1] for row in self._db.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status")}
+            oldest = self._db.execute("SELECT MIN(created_at) FROM tasks WHERE status = ?", (QUEUED,)).fetchone()[0]
+            workers = [row[0] for row in self._db.execute(
+                "SELECT DISTINCT worker FROM tasks WHERE status = ? AND heartbeat >= ?", (RUNNING, now - self.heartbeat_timeout)
+            )]
+        return {
+            "counts": {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)},
+            "oldest_queued_s": round(now - oldest, 1) if oldest else 0.0,
+            "busy_workers": workers,
+        }
@@ -0,0 +1,126 @@
+"""
+任务工作进程：从本地任务队列领取脚本生成与语音合成任务，在Web进程之外执行
+用法: python worker.py [--id 名称]（通常由 run.py start --workers N 启动）
+"""
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+import threading
+import traceback
+
+from work_queue import TASK_PRIORITIES, WorkQueue
+
+logger = logging.getLogger("worker")
+
+_stopping = threading.Event()
+
+
+def _run_script(payload):
+    from qwen import generate_dialog_script
+    return generate_dialog_script(
+        payload["text"], style=payload.get("style") or "casual", participants=payload.get("participants") or 2,
+        model=payload.get("model") or "deepseek-v3.2", latency_slo=payload.get("latency_slo"),
+        target_minutes=payload.get("target_minutes"), max_tokens=payload.get("max_tokens"),
+        mode=payload.get("mode"), reuse_similar=payload.get("reuse_similar"), fresh=bool(payload.get("fresh"))
+    )
+
+
+def _run_speech(payload):
+    from tts import tts_manager
+    audio_path = tts_manager.generate_speech(
+        payload["text"], payload["speaker_id"], payload.get("audio_format") or "mp3", profile=payload.get("profile")
+    )
+    if not audio_path:
+        raise RuntimeError("语音生成失败")
+    audio_id = tts_manager.audio_store.content_id_for(audio_path)
+    return {"audio_path": audio_path, "audio_id": audio_id, "audio_url": f"/audio/{audio_id}"}
+
+
+def _run_dialog_tts(payload):
+    from tts import tts_manager
+    job_id = payload.get("job_id")
+    dialog = tts_manager.process_dialog(payload["dialog"], profile=payload.get("profile"), job_id=job_id)
+    return {"job_id": job_id, "dialog": dialog, "failed": sum(1 for item in dialog if not item["audio_path"])}
+
+
+_PRIORITY_NAMES = {value: name for name, value in TASK_PRIORITIES.items()}
+
+# 任务类型与处理函数
+HANDLERS = {
+    "script": _run_script,
+    "speech": _run_speech,
+    "dialog_tts": _run_dialog_tts,
+}
+
+
+def run_task(queue: WorkQueue, task, worker_id: str, heartbeat_interval: float = 5.0) -> None:
+    """
+    执行一个任务，执行期间后台线程定期刷新心跳
+    :param queue: 任务队列
+    :param task: 领取到的任务
+    :param worker_id: 领取任务的工作进程标识
+    :param heartbeat_interval: 心跳间隔（秒）
+    """
+    from scheduler import set_priority
+
+    done = threading.Event()
+
+    def beat():
+        while not done.wait(heartbeat_interval):
+            queue.heartbeat(task["task_id"], worker_id)
+
+    beater = threading.Thread(target=beat, daemon=True)
+    beater.start()
+    started = time.perf_counter()
+    try:
+        set_priority(_PRIORITY_NAMES.get(task["priority"], "batch"))
+        result = HANDLERS[task["kind"]](task["payload"])
+        if not queue.complete(task["task_id"], result, worker_id):
+            return
+        logger.info(f"任务完成: {task['task_id']} ({task['kind']})，耗时 {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        logger.error(f"任务失败: {task['task_id']} ({task['kind']}): {e}\n{traceback.format_exc()}")
+        queue.fail(task["task_id"], str(e), worker_id)
+    finally:
+        done.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="播客生成任务工作进程")
+    parser.add_argument("--id", default=str(os.getpid()), help="工作进程标识")
+    parser.add_argument("--poll", type=float, default=1.0, help="队列为空时的最长轮询间隔（秒）")
+    args = parser.parse_args()
+    # 标识带上进程号：重启后同名的工作进程不会被当作领取旧任务的那一个
+    worker_id = f"worker-{args.id}" if args.id == str(os.getpid()) else f"worker-{args.id}-{os.getpid()}"
+
+    # 收到终止信号后执行完当前任务再退出
+    signal.signal(signal.SIGTERM, lambda *_: _stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: _stopping.set())
+
+    # 与Web进程共用日志配置
+    import qwen  # noqa: F401
+
+    queue = WorkQueue()
+    logger.info(f"工作进程 {worker_id} 已启动 (PID={os.getpid()})，任务队列: {queue.db_path}")
+    idle = 0.05
+    while not _stopping.is_set():
+        task = queue.claim(worker_id)
+        if task is None:
+            # 空闲时逐步拉长轮询间隔
+            _stopping.wait(idle)
+            idle = min(idle * 2, args.poll)
+            continue
+        idle = 0.05
+        if task["kind"] not in HANDLERS:
+            queue.fail(task["task_id"], f"未知的任务类型: {task['kind']}", worker_id)
+            continue
+        run_task(queue, task, worker_id)
+    logger.info(f"工作进程 {worker_id} 已退出")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
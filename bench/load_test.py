@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+接口压测：以可配置的并发驱动FastAPI应用，上游使用本地模拟服务
+输出JSON报告（RPS、延迟分位数、事件循环延迟、内存），并可与基线对比
+
+示例：
+  python bench/load_test.py --scenario all --concurrency 8 --requests 50
+  python bench/load_test.py --scenario generate-speech --save-baseline
+  python bench/load_test.py --scenario all --compare
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BENCH_DIR = Path(__file__).parent
+PROJECT_ROOT = BENCH_DIR.parent
+APP_DIR = PROJECT_ROOT / "app"
+BASELINE_DIR = BENCH_DIR / "baselines"
+
+sys.path.insert(0, str(BENCH_DIR))
+from mock_provider import MockConfig, MockProvider  # noqa: E402
+
+SAMPLE_TEXT = (
+    "近日，多地集中清理长期占用公共停车位的僵尸车。据统计，仅一座城市就排查出上万辆长期无人移动的车辆，"
+    "其中不少已经锈迹斑斑、轮胎干瘪。业内人士指出，僵尸车背后既有车主弃车逃避报废成本的问题，也有产权不清、"
+    "处置流程繁琐等制度性难题。部分城市开始试点电子围栏和定期巡查机制，并通过公告、拖移、集中停放等方式处置。"
+    "专家建议，应当建立车辆全生命周期管理制度，降低合法报废的门槛，同时明确物业、街道和交管部门的职责边界。"
+)
+
+SAMPLE_DIALOG = [
+    {"role": "host" if i % 2 == 0 else "guest", "speaker": "主持人" if i % 2 == 0 else "嘉宾",
+     "text": f"第{i + 1}段对话，这是一段用于压测的发言内容，大约有三十来个字。"}
+    for i in range(8)
+]
+
+SCENARIOS = {
+    "generate-script": ("POST", "/generate-script", lambda i: {"text": SAMPLE_TEXT, "style": "casual", "participants": 2}),
+    "generate-speech": ("POST", "/generate-speech", lambda i: {"text": f"{SAMPLE_TEXT[:60]}（{i}）", "speaker_id": "host"}),
+    "process-dialog-tts": ("POST", "/process-dialog-tts", lambda i: {"dialog": SAMPLE_DIALOG}),
+    "create-podcast": ("POST", "/create-podcast", lambda i: {"dialog": SAMPLE_DIALOG, "podcast_title": f"压测播客_{i}"}),
+}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return round(ordered[index], 3)
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": round(max(values), 3) if values else None,
+        "mean": round(sum(values) / len(values), 3) if values else None,
+    }
+
+
+def rss_mb() -> Optional[float]:
+    """当前进程的峰值常驻内存（MB），不支持的平台返回 None"""
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().rss / 1024 / 1024, 2)
+    except ImportError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 单位为字节，Linux 为KB
+        return round(peak / 1024 / 1024 if platform.system() == "Darwin" else peak / 1024, 2)
+    except ImportError:
+        return None
+
+
+class LoopLagProbe:
+    """周期性休眠并记录实际唤醒的延后时间，用于衡量事件循环被阻塞的程度"""
+
+    def __init__(self, interval_ms: float = 10.0):
+        self.interval = interval_ms / 1000.0
+        self.samples: List[float] = []
+        self._task = None
+        self._sleep_started = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._sleep_started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, (loop.time() - self._sleep_started - self.interval) * 1000.0))
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        # 事件循环被持续阻塞时探针可能一次都没被唤醒，需要补记最后一次未完成的休眠
+        if self._sleep_started is not None:
+            overdue = (asyncio.get_running_loop().time() - self._sleep_started - self.interval) * 1000.0
+            if overdue > 0:
+                self.samples.append(overdue)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def load_app(audio_dir: str):
+    """在设置好模拟服务环境变量后导入应用"""
+    os.environ["AUDIO_OUTPUT_DIR"] = audio_dir
+    sys.path.insert(0, str(APP_DIR))
+    import logging
+    from main import app
+    # 压测时只保留警告以上的日志，避免日志输出影响测量
+    logging.getLogger().setLevel(logging.WARNING)
+    return app
+
+
+async def run_scenario(client, name: str, concurrency: int, total: int) -> Dict:
+    import httpx
+    method, path, payload_fn = SCENARIOS[name]
+    latencies: List[float] = []
+    failures = 0
+    errors: Dict[str, int] = {}
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal failures
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=payload_fn(i))
+                ok = response.status_code == 200 and response.json().get("ok", False)
+                if not ok:
+                    key = f"status_{response.status_code}"
+                    errors[key] = errors.get(key, 0) + 1
+            except httpx.HTTPError as e:
+                ok = False
+                key = type(e).__name__
+                errors[key] = errors.get(key, 0) + 1
+            latencies.append((time.perf_counter() - start) * 1000.0)
+            if not ok:
+                failures += 1
+
+    probe = LoopLagProbe()
+    probe.start()
+    tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await probe.stop()
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "failures": failures,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(total / elapsed, 3) if elapsed > 0 else None,
+        "latency_ms": summarize(latencies),
+        "loop_lag_ms": summarize(probe.samples),
+        "memory": {"traced_peak_mb": round(traced_peak / 1024 / 1024, 3), "rss_mb": rss_mb()},
+    }
+
+
+async def run(args) -> Dict:
+    import httpx
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    results = {}
+    provider = None
+    audio_dir = tempfile.mkdtemp(prefix="bench_audio_")
+
+    if args.target:
+        client = httpx.AsyncClient(base_url=args.target, timeout=args.timeout)
+    else:
+        config = MockConfig(args.tts_latency, args.llm_latency, args.jitter, args.error_rate, args.segments, seed=args.seed)
+        provider = MockProvider(config).start()
+        os.environ.update(provider.env())
+        os.environ["DASHSCOPE_TTS_TRANSFER"] = args.tts_transfer
+        app = load_app(audio_dir)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=args.timeout)
+
+    try:
+        for name in names:
+            print(f"运行场景 {name}（并发 {args.concurrency}，请求 {args.requests}）...", flush=True)
+            results[name] = await run_scenario(client, name, args.concurrency, args.requests)
+            summary = results[name]
+            print(f"  RPS={summary['rps']} p50={summary['latency_ms']['p50']}ms p99={summary['latency_ms']['p99']}ms "
+                  f"失败={summary['failures']} 事件循环延迟p99={summary['loop_lag_ms']['p99']}ms", flush=True)
+    finally:
+        await client.aclose()
+        if provider:
+            provider.stop()
+
+    return {
+        "meta": {
+            "created_at": int(time.time()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": args.target or "in-process",
+            "mock": None if args.target else {
+                "tts_latency_ms": args.tts_latency, "llm_latency_ms": args.llm_latency,
+                "jitter_ms": args.jitter, "error_rate": args.error_rate, "segments": args.segments,
+                "tts_transfer": args.tts_transfer,
+            },
+        },
+        "scenarios": results,
+    }
+
+
+def compare(report: Dict, baseline: Dict):
+    """打印当前结果与基线的对比（正数表示变差）"""
+    print("\n与基线对比：", flush=True)
+    for name, current in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            print(f"  {name}: 基线中无此场景", flush=True)
+            continue
+        parts = []
+        for label, cur, old, higher_is_better in (
+            ("RPS", current["rps"], base["rps"], True),
+            ("p50", current["latency_ms"]["p50"], base["latency_ms"]["p50"], False),
+            ("p99", current["latency_ms"]["p99"], base["latency_ms"]["p99"], False),
+            ("lag_p99", current["loop_lag_ms"]["p99"], base["loop_lag_ms"]["p99"], False),
+        ):
+            if cur is None or not old:
+                continue
+            change = (cur - old) / old * 100.0
+            regression = -change if higher_is_better else change
+            parts.append(f"{label} {old}→{cur} ({'+' if regression > 0 else ''}{regression:.1f}%)")
+        print(f"  {name}: " + ", ".join(parts), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="播客对话生成器接口压测")
+    parser.add_argument("--scenario", default="all", choices=["all"] + list(SCENARIOS), help="压测场景")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发数")
+    parser.add_argument("--requests", type=int, default=40, help="每个场景的请求总数")
+    parser.add_argument("--tts-latency", type=float, default=200.0, help="模拟TTS延迟（毫秒）")
+    parser.add_argument("--llm-latency", type=float, default=1500.0, help="模拟对话模型延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=50.0, help="模拟延迟抖动（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟上游错误率（0-1）")
+    parser.add_argument("--segments", type=int, default=12, help="模拟脚本的对话段数")
+    parser.add_argument("--tts-transfer", default="json", choices=["json", "sse", "binary"], help="TTS传输方式")
+    parser.add_argument("--seed", type=int, default=914, help="模拟服务随机种子")
+    parser.add_argument("--timeout", type=float, default=300.0, help="单个请求超时（秒）")
+    parser.add_argument("--target", help="压测已运行的服务（如 http://127.0.0.1:4190），此时不启动模拟服务")
+    parser.add_argument("--output", default=str(PROJECT_ROOT / "bench_output.json"), help="报告输出路径")
+    parser.add_argument("--baseline", default="default", help="基线名称（保存在 bench/baselines 下）")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果保存为基线")
+    parser.add_argument("--compare", action="store_true", help="与已保存的基线对比")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"报告已写入: {args.output}", flush=True)
+
+    baseline_path = BASELINE_DIR / f"{args.baseline}.json"
+    if args.compare:
+        if baseline_path.exists():
+            with open(baseline_path, "r", encoding="utf-8") as f:
+                compare(report, json.load(f))
+        else:
+            print(f"基线不存在: {baseline_path}", flush=True)
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存: {baseline_path}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+热点路径微基准：脚本解析、提示词构建、音频解码写入、播客清单写入
+使用 bench/corpus 下录制的模型输出与按时长生成的音频数据，报告每条路径的 ops/s 与内存分配
+
+示例：
+  python bench/micro.py
+  python bench/micro.py --filter parse --save-baseline
+  python bench/micro.py --compare
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import logging
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+BENCH_DIR = Path(__file__).parent
+PROJECT_ROOT = BENCH_DIR.parent
+APP_DIR = PROJECT_ROOT / "app"
+CORPUS_DIR = BENCH_DIR / "corpus"
+BASELINE_DIR = BENCH_DIR / "baselines"
+
+sys.path.insert(0, str(BENCH_DIR))
+from mock_provider import fake_audio  # noqa: E402
+
+TOKEN_USAGE = {"prompt_tokens": 1800, "completion_tokens": 2400, "total_tokens": 4200}
+
+
+def load_corpus() -> Dict[str, str]:
+    """读取录制的模型输出；超长输出由合法脚本扩展得到"""
+    corpus = {
+        "valid": (CORPUS_DIR / "valid.json").read_text(encoding="utf-8"),
+        "fenced": (CORPUS_DIR / "fenced.txt").read_text(encoding="utf-8"),
+        "truncated": (CORPUS_DIR / "truncated.txt").read_text(encoding="utf-8"),
+    }
+    script = json.loads(corpus["valid"])
+    script["segments"] = script["segments"] * 25
+    corpus["long"] = json.dumps(script, ensure_ascii=False, indent=2)
+    return corpus
+
+
+def audio_payloads() -> Dict[str, str]:
+    """按不同时长生成TTS接口返回的base64音频数据（约5秒、1分钟、5分钟）"""
+    return {
+        "5s": base64.b64encode(fake_audio("字" * 23)).decode("ascii"),
+        "60s": base64.b64encode(fake_audio("字" * 273)).decode("ascii"),
+        "300s": base64.b64encode(fake_audio("字" * 1364)).decode("ascii"),
+    }
+
+
+def measure(fn: Callable[[], object], min_time: float, min_rounds: int) -> Dict[str, float]:
+    """重复执行直到满足最短时间与最少次数，再单独统计一次执行的峰值分配与留存的内存块数"""
+    fn()
+    rounds = 0
+    started = time.perf_counter()
+    while True:
+        fn()
+        rounds += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time and rounds >= min_rounds:
+            break
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    retained_blocks = sum(max(0, s.count_diff) for s in stats)
+
+    return {
+        "rounds": rounds,
+        "ops_per_s": round(rounds / elapsed, 2),
+        "mean_us": round(elapsed / rounds * 1e6, 2),
+        "alloc_peak_kb": round(peak / 1024, 2),
+        "retained_blocks": retained_blocks,
+    }
+
+
+def build_cases(workdir: Path) -> Dict[str, Callable[[], object]]:
+    os.environ["AUDIO_OUTPUT_DIR"] = str(workdir)
+    sys.path.insert(0, str(APP_DIR))
+    import qwen
+    from tts import tts_manager
+    # 只保留警告以上的日志，避免日志输出淹没被测代码本身的开销
+    logging.getLogger().setLevel(logging.WARNING)
+
+    corpus = load_corpus()
+    payloads = audio_payloads()
+    article = corpus["valid"] * 4
+    dialog = [
+        {"role": s["role"], "speaker": "主持人" if s["role"] == "host" else "嘉宾", "text": s["text"],
+         "audio_path": str(workdir / f"{s['role']}_{i:04d}.mp3")}
+        for i, s in enumerate(json.loads(corpus["long"])["segments"])
+    ]
+
+    cases: Dict[str, Callable[[], object]] = {}
+    for name, text in corpus.items():
+        cases[f"parse.{name}"] = (lambda t=text: qwen._parse_script_response(t, TOKEN_USAGE, "qwen-plus"))
+    cases["prompt.system"] = lambda: qwen._get_style_prompt("casual", 3)
+    cases["prompt.user"] = lambda: qwen._build_user_prompt(article, "casual")
+    for name, data in payloads.items():
+        cases[f"audio.decode_write.{name}"] = (
+            lambda d=data, n=name: tts_manager._save_audio_data(d, workdir / f"bench_{n}.mp3"))
+    for name, data in payloads.items():
+        raw = base64.b64decode(data)
+        cases[f"audio.stream_write.{name}"] = (
+            lambda r=raw, n=name: tts_manager._write_audio_stream(
+                (r[i:i + 16384] for i in range(0, len(r), 16384)), workdir / f"bench_stream_{n}.mp3"))
+    cases["podcast.manifest.12"] = lambda: tts_manager.create_podcast(dialog[:12], "微基准播客")
+    cases["podcast.manifest.300"] = lambda: tts_manager.create_podcast(dialog, "微基准播客")
+    return cases
+
+
+def compare(report: Dict, baseline: Dict):
+    """打印当前结果与基线的对比（正数表示变差）"""
+    print("\n与基线对比：", flush=True)
+    for name, current in report["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if not base:
+            print(f"  {name}: 基线中无此路径", flush=True)
+            continue
+        ops_change = (base["ops_per_s"] - current["ops_per_s"]) / base["ops_per_s"] * 100.0
+        alloc_change = ((current["alloc_peak_kb"] - base["alloc_peak_kb"]) / base["alloc_peak_kb"] * 100.0
+                        if base["alloc_peak_kb"] else 0.0)
+        print(f"  {name}: ops/s {base['ops_per_s']}→{current['ops_per_s']} ({ops_change:+.1f}%), "
+              f"峰值分配 {base['alloc_peak_kb']}→{current['alloc_peak_kb']}KB ({alloc_change:+.1f}%)", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="热点路径微基准")
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的路径")
+    parser.add_argument("--min-time", type=float, default=0.5, help="每条路径的最短测量时间（秒）")
+    parser.add_argument("--min-rounds", type=int, default=5, help="每条路径的最少执行次数")
+    parser.add_argument("--output", default=str(PROJECT_ROOT / "bench_micro.json"), help="报告输出路径")
+    parser.add_argument("--baseline", default="micro", help="基线名称（保存在 bench/baselines 下）")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果保存为基线")
+    parser.add_argument("--compare", action="store_true", help="与已保存的基线对比")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict] = {}
+    with tempfile.TemporaryDirectory(prefix="bench_micro_") as workdir:
+        cases = build_cases(Path(workdir))
+        selected: List[str] = [name for name in cases if args.filter in name]
+        for name in selected:
+            results[name] = measure(cases[name], args.min_time, args.min_rounds)
+            r = results[name]
+            print(f"{name:<28} {r['ops_per_s']:>12} ops/s {r['mean_us']:>12} us/op "
+                  f"峰值分配 {r['alloc_peak_kb']:>10} KB 留存块 {r['retained_blocks']:>6}", flush=True)
+
+    report = {
+        "meta": {"created_at": int(time.time()), "python": platform.python_version(), "platform": platform.platform()},
+        "cases": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"报告已写入: {args.output}", flush=True)
+
+    baseline_path = BASELINE_DIR / f"{args.baseline}.json"
+    if args.compare:
+        if baseline_path.exists():
+            with open(baseline_path, "r", encoding="utf-8") as f:
+                compare(report, json.load(f))
+        else:
+            print(f"基线不存在: {baseline_path}", flush=True)
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存: {baseline_path}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+本地模拟服务：模拟千问TTS接口与OpenAI兼容的对话接口
+用于压测时替代真实的上游服务，支持配置延迟、抖动与错误率
+
+单独运行：python bench/mock_provider.py --port 18080 --latency 200 --jitter 50
+"""
+
+import re
+import json
+import time
+import uuid
+import base64
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# MPEG-2 Layer III, 24kHz, 48kbps, 单声道：每帧144字节、576个采样（24ms）
+MP3_FRAME_HEADER = bytes([0xFF, 0xF3, 0x64, 0xC0])
+MP3_FRAME_SIZE = 144
+MP3_FRAME_MS = 24
+
+# 每个字符对应的音频时长（毫秒），用于按文本长度生成音频
+MS_PER_CHAR = 220
+
+# 流式生成时首个分块前的延迟占总延迟的比例
+STREAM_FIRST_TOKEN_SHARE = 0.2
+
+
+class MockConfig:
+    def __init__(self, tts_latency_ms: float = 200.0, llm_latency_ms: float = 1500.0,
+                 jitter_ms: float = 50.0, error_rate: float = 0.0, segments: int = 12,
+                 seed: int = None, trailing_chars: int = 0):
+        self.tts_latency_ms = tts_latency_ms
+        self.llm_latency_ms = llm_latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.segments = segments
+        # 脚本JSON之后追加的多余输出字数，模拟模型写完JSON后继续生成说明文字
+        self.trailing_chars = trailing_chars
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"tts": 0, "llm": 0, "errors": 0}
+
+    def delay(self, base_ms: float):
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        time.sleep(max(0.0, base_ms + jitter) / 1000.0)
+
+    def should_fail(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self.lock:
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.stats["errors"] += 1
+            return failed
+
+    def count(self, kind: str):
+        with self.lock:
+            self.stats[kind] += 1
+
+
+def fake_mp3(duration_ms: int) -> bytes:
+    """生成指定时长的MP3帧序列（帧头合法，帧体为静音填充）"""
+    frames = max(1, duration_ms // MP3_FRAME_MS)
+    frame = MP3_FRAME_HEADER + b"\x00" * (MP3_FRAME_SIZE - len(MP3_FRAME_HEADER))
+    return frame * frames
+
+
+def fake_pcm(duration_ms: int, sample_rate: int = 24000) -> bytes:
+    """生成指定时长的16位单声道静音PCM数据"""
+    return b"\x00\x00" * (sample_rate * duration_ms // 1000)
+
+
+def fake_wav(duration_ms: int, sample_rate: int = 24000) -> bytes:
+    """生成指定时长的16位单声道WAV文件"""
+    pcm = fake_pcm(duration_ms, sample_rate)
+    header = b"RIFF" + (36 + len(pcm)).to_bytes(4, "little") + b"WAVE"
+    header += b"fmt " + (16).to_bytes(4, "little") + (1).to_bytes(2, "little") + (1).to_bytes(2, "little")
+    header += sample_rate.to_bytes(4, "little") + (sample_rate * 2).to_bytes(4, "little")
+    header += (2).to_bytes(2, "little") + (16).to_bytes(2, "little")
+    header += b"data" + len(pcm).to_bytes(4, "little")
+    return header + pcm
+
+
+def fake_audio(text: str, audio_format: str = "mp3", sample_rate: int = 24000) -> bytes:
+    duration_ms = max(MP3_FRAME_MS, len(text) * MS_PER_CHAR)
+    if audio_format == "wav":
+        return fake_wav(duration_ms, sample_rate)
+    if audio_format == "pcm":
+        return fake_pcm(duration_ms, sample_rate)
+    return fake_mp3(duration_ms)
+
+
+def fake_sentences(text: str) -> list:
+    """按句末标点断句，返回与 fake_audio 时长一致的句子时间戳（毫秒）"""
+    sentences, begin = [], 0
+    for index, sentence in enumerate(re.findall(r"[^。！？!?\n]+[。！？!?]*", text)):
+        end = begin + len(sentence) * MS_PER_CHAR
+        if sentence.strip():
+            sentences.append({"index": index, "text": sentence.strip(), "begin_time": begin, "end_time": end})
+        begin = end + MS_PER_CHAR
+    return sentences
+
+
+def fake_script(segments: int = 12, trailing_chars: int = 0) -> str:
+    """生成与真实模型输出结构一致的对话脚本JSON文本，trailing_chars 为JSON之后追加的多余文字"""
+    script = {
+        "roles": [
+            {"id": "host", "name": "主持人", "title": "资深媒体人"},
+            {"id": "guest", "name": "嘉宾", "title": "城市治理专家"}
+        ],
+        "segments": [
+            {
+                "role": "host" if i % 2 == 0 else "guest",
+                "text": f"第{i + 1}段对话。这是一段用于压测的模拟发言，长度接近真实播客里的一轮发言，包含几个短句。大家觉得呢？"
+            }
+            for i in range(segments)
+        ],
+        "notes": "模拟服务生成的脚本"
+    }
+    trailing = ("\n\n以上是根据新闻改写的播客脚本，可以根据需要调整。" * (trailing_chars // 20 + 1))[:trailing_chars]
+    return json.dumps(script, ensure_ascii=False) + trailing
+
+
+def fake_outline(sections: int = 4) -> str:
+    """生成提纲JSON文本（先生成提纲再并行展开章节的模式使用）"""
+    outline = {
+        "roles": [
+            {"id": "host", "name": "主持人", "title": "资深媒体人"},
+            {"id": "guest", "name": "嘉宾", "title": "城市治理专家"}
+        ],
+        "sections": [
+            {"title": f"第{i + 1}章", "beats": ["要点一", "要点二", "要点三"], "roles": ["host", "guest"],
+             "start_role": "host", "end_role": "guest"}
+            for i in range(sections)
+        ]
+    }
+    return json.dumps(outline, ensure_ascii=False)
+
+
+_OUTLINE_SECTIONS = re.compile(r"分为(\d+)个章节")
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: MockConfig = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(body or b"{}")
+        except ValueError:
+            return {}
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self):
+        self._send_json(500, {"code": "InternalError", "message": "mock provider injected error"})
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.config.lock:
+                self._send_json(200, dict(self.config.stats))
+            return
+        self._send_json(404, {"message": "not found"})
+
+    def do_POST(self):
+        data = self._read_json()
+        if self.path.endswith("/services/audio/speech_synthesis"):
+            self._handle_tts(data)
+        elif self.path.endswith("/chat/completions"):
+            self._handle_chat(data)
+        elif self.path.endswith("/services/aigc/text-generation/generation"):
+            self._handle_generation(data)
+        else:
+            self._send_json(404, {"message": "not found"})
+
+    def _handle_tts(self, data: dict):
+        self.config.count("tts")
+        self.config.delay(self.config.tts_latency_ms)
+        if self.config.should_fail():
+            self._send_error()
+            return
+        text = (data.get("input") or {}).get("text", "")
+        params = data.get("parameters") or {}
+        audio_format = params.get("format", "mp3")
+        audio = fake_audio(text, audio_format, int(params.get("sample_rate", 24000)))
+        sentences = fake_sentences(text) if params.get("sentence_timestamp_enabled") else []
+        if (self.headers.get("X-DashScope-SSE") or "").lower() == "enable":
+            self._stream_tts_sse(audio, sentences)
+            return
+        if "audio/" in (self.headers.get("Accept") or ""):
+            self._stream_tts_binary(audio, audio_format)
+            return
+        result = {"audio_data": base64.b64encode(audio).decode("ascii")}
+        if sentences:
+            result["sentences"] = sentences
+        self._send_json(200, {"status_code": 200, "request_id": uuid.uuid4().hex, "result": result})
+
+    def _stream_tts_binary(self, audio: bytes, audio_format: str, chunk_size: int = 16 * 1024):
+        content_type = {"mp3": "audio/mpeg", "wav": "audio/wav"}.get(audio_format, "application/octet-stream")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i in range(0, len(audio), chunk_size):
+            chunk = audio[i:i + chunk_size]
+            self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _stream_tts_sse(self, audio: bytes, sentences: list = (), chunk_size: int = 12 * 1024):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        request_id = uuid.uuid4().hex
+        for i in range(0, len(audio), chunk_size):
+            event = {"request_id": request_id,
+                     "output": {"audio": {"data": base64.b64encode(audio[i:i + chunk_size]).decode("ascii")}}}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        # 句子时间戳以单独的事件下发
+        for sentence in sentences:
+            event = {"request_id": request_id, "output": {"sentence": sentence}}
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self.wfile.write(f"data: {json.dumps({'request_id': request_id, 'output': {'finish_reason': 'stop'}})}\n\n".encode("utf-8"))
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _usage(self, data: dict, content: str) -> dict:
+        prompt_tokens = len(json.dumps(data, ensure_ascii=False)) // 2
+        completion_tokens = len(content) // 2
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def _limit(self, content: str, data: dict) -> tuple:
+        # 按 max_tokens 截断输出（与 _usage 一致，按2个字符一个token计），模拟输出达到长度上限
+        max_tokens = data.get("max_tokens")
+        if max_tokens and len(content) > max_tokens * 2:
+            return content[:max_tokens * 2], "length"
+        return content, "stop"
+
+    def _handle_chat(self, data: dict):
+        self.config.count("llm")
+        # 流式请求只在首个分块前等待一部分延迟，其余延迟分摊到各分块之间，模拟逐字生成
+        self.config.delay(self.config.llm_latency_ms * (STREAM_FIRST_TOKEN_SHARE if data.get("stream") else 1.0))
+        if self.config.should_fail():
+            self._send_error()
+            return
+        prompt = (data.get("messages") or [{}])[-1].get("content", "")
+        outline = _OUTLINE_SECTIONS.search(prompt) if "播客设计提纲" in prompt else None
+        script = fake_outline(int(outline.group(1))) if outline else fake_script(self.config.segments, self.config.trailing_chars)
+        content, finish_reason = self._limit(script, data)
+        usage = self._usage(data, content)
+        model = data.get("model", "mock")
+        if data.get("stream"):
+            self._stream_chat(content, usage, model, finish_reason)
+            return
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+            "usage": usage
+        })
+
+    def _stream_chat(self, content: str, usage: dict, model: str, finish_reason: str = "stop", chunk_chars: int = 16):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+        chunk_delay = self.config.llm_latency_ms * (1 - STREAM_FIRST_TOKEN_SHARE) / max(1, len(content) // chunk_chars) / 1000
+        try:
+            for i in range(0, len(content), chunk_chars):
+                if i:
+                    time.sleep(chunk_delay)
+                chunk = {
+                    "id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {"content": content[i:i + chunk_chars]}, "finish_reason": None}]
+                }
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            final = {
+                "id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}], "usage": usage
+            }
+            self.wfile.write(f"data: {json.dumps(final, ensure_ascii=False)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端拿到完整JSON后提前断开
+            pass
+        self.close_connection = True
+
+    def _handle_generation(self, data: dict):
+        self.config.count("llm")
+        self.config.delay(self.config.llm_latency_ms)
+        if self.config.should_fail():
+            self._send_error()
+            return
+        content, finish_reason = self._limit(
+            fake_script(self.config.segments, self.config.trailing_chars), data.get("parameters") or data
+        )
+        usage = self._usage(data, content)
+        self._send_json(200, {
+            "request_id": uuid.uuid4().hex,
+            "output": {"text": content, "finish_reason": finish_reason},
+            "usage": {"input_tokens": usage["prompt_tokens"], "output_tokens": usage["completion_tokens"],
+                      "total_tokens": usage["total_tokens"]}
+        })
+
+
+class MockProvider:
+    """在后台线程中运行的模拟服务"""
+
+    def __init__(self, config: MockConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or MockConfig()
+        handler = type("BoundMockHandler", (MockHandler,), {"config": self.config})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> dict:
+        """返回让应用指向本模拟服务所需的环境变量"""
+        return {
+            "DASHSCOPE_API_KEY": "mock-dashscope-key",
+            "DASHSCOPE_BASE_URL": f"{self.base_url}/v1",
+            "DASHSCOPE_HTTP_BASE_URL": f"{self.base_url}/api/v1",
+            "DASHSCOPE_TTS_ENDPOINT": f"{self.base_url}/api/v1/services/audio/speech_synthesis",
+        }
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-provider", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="千问TTS/对话接口本地模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--tts-latency", type=float, default=200.0, help="TTS接口基础延迟（毫秒）")
+    parser.add_argument("--llm-latency", type=float, default=1500.0, help="对话接口基础延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=50.0, help="延迟抖动范围（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入错误的比例（0-1）")
+    parser.add_argument("--segments", type=int, default=12, help="模拟脚本的对话段数")
+    parser.add_argument("--trailing-chars", type=int, default=0, help="脚本JSON之后追加的多余输出字数")
+    args = parser.parse_args()
+
+    config = MockConfig(args.tts_latency, args.llm_latency, args.jitter, args.error_rate, args.segments,
+                        trailing_chars=args.trailing_chars)
+    provider = MockProvider(config, args.host, args.port)
+    print(f"模拟服务已启动: {provider.base_url}", flush=True)
+    for key, value in provider.env().items():
+        print(f"  {key}={value}", flush=True)
+    try:
+        provider.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        provider.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
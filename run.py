@@ -22,11 +22,14 @@ class FastAPIManager:
         self.app_dir = self.project_root / "app"
         self.log_dir = self.project_root / "logs"
         self.pid_file = self.project_root / "app.pid"
+        # 任务工作进程的 PID（每行一个）
+        self.workers_pid_file = self.project_root / "workers.pid"
         
         # 创建日志目录
         self.log_dir.mkdir(exist_ok=True)
         
         self.log_file = self.log_dir / "app.log"
+        self.worker_log_file = self.log_dir / "worker.log"
         
     def print_info(self, message):
         print(f"ℹ️  {message}", flush=True)
@@ -79,6 +82,97 @@ class FastAPIManager:
                 return False
         return False
 
+    def _pid_alive(self, pid: int) -> bool:
+        """检查进程是否存在"""
+        try:
+            if platform.system() == "Windows":
+                result = subprocess.run(f"tasklist /fi \"PID eq {pid}\"", shell=True, capture_output=True, text=True)
+                return str(pid) in result.stdout
+            os.kill(pid, 0)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def _read_worker_pids(self):
+        if not self.workers_pid_file.exists():
+            return []
+        try:
+            return [int(line) for line in self.workers_pid_file.read_text().split() if line.strip()]
+        except ValueError:
+            return []
+
+    def running_workers(self):
+        """返回仍在运行的工作进程 PID"""
+        return [pid for pid in self._read_worker_pids() if self._pid_alive(pid)]
+
+    def start_workers(self, count: int) -> bool:
+        """
+        启动任务工作进程（在Web进程之外执行脚本生成与语音合成任务）
+        :param count: 工作进程数量，0 表示不启动
+        """
+        alive = self.running_workers()
+        if alive:
+            self.print_info(f"工作进程已在运行: {len(alive)} 个")
+            return True
+        if count <= 0:
+            self.print_info("未启动工作进程（--workers 0），提交到任务队列的任务将等待执行")
+            return True
+
+        env = os.environ.copy()
+        env['PYTHONIOENCODING'] = 'utf-8'
+        logfh = open(self.worker_log_file, 'a', encoding='utf-8', errors='replace')
+        pids = []
+        try:
+            for i in range(count):
+                cmd = [sys.executable, "worker.py", "--id", str(i + 1)]
+                if platform.system() == "Windows":
+                    process = subprocess.Popen(cmd, cwd=self.app_dir, stdout=logfh, stderr=subprocess.STDOUT,
+                                               creationflags=subprocess.CREATE_NEW_PROCESS_GROUP, env=env)
+                else:
+                    process = subprocess.Popen(cmd, cwd=self.app_dir, stdout=logfh, stderr=subprocess.STDOUT,
+                                               preexec_fn=os.setpgrp, env=env)
+                pids.append(process.pid)
+        except Exception as e:
+            self.print_error(f"启动工作进程失败: {e}")
+            return False
+        finally:
+            logfh.close()
+            self.workers_pid_file.write_text("\n".join(str(pid) for pid in pids))
+        self.print_success(f"已启动 {len(pids)} 个工作进程 (PID: {', '.join(str(pid) for pid in pids)})")
+        self.print_info(f"工作进程日志: {self.worker_log_file}")
+        return True
+
+    def stop_workers(self, timeout: float = 10.0):
+        """停止工作进程：先发送终止信号让其执行完当前任务，超时后强制结束（未完成的任务会重新排队）"""
+        pids = self.running_workers()
+        if not pids:
+            self.workers_pid_file.unlink(missing_ok=True)
+            return
+        self.print_info(f"停止 {len(pids)} 个工作进程...")
+        for pid in pids:
+            try:
+                if platform.system() == "Windows":
+                    subprocess.run(["taskkill", "/PID", str(pid), "/T"], capture_output=True, text=True)
+                else:
+                    os.kill(pid, signal.SIGTERM)
+            except Exception as e:
+                self.print_warning(f"终止工作进程失败 PID={pid}: {e}")
+        deadline = time.time() + timeout
+        while time.time() < deadline and any(self._pid_alive(pid) for pid in pids):
+            time.sleep(0.5)
+        for pid in pids:
+            if self._pid_alive(pid):
+                try:
+                    if platform.system() == "Windows":
+                        subprocess.run(["taskkill", "/PID", str(pid), "/F", "/T"], capture_output=True, text=True)
+                    else:
+                        os.kill(pid, signal.SIGKILL)
+                    self.print_warning(f"工作进程未在 {timeout:.0f} 秒内退出，已强制终止 PID={pid}")
+                except Exception:
+                    pass
+        self.workers_pid_file.unlink(missing_ok=True)
+        self.print_info("工作进程已停止")
+
     def _is_port_in_use(self, host: str = "127.0.0.1", port: int = 4190) -> bool:
         """检查本地端口是否有服务在监听（通过尝试连接）。"""
         try:
@@ -384,7 +478,8 @@ class FastAPIManager:
             self.print_error(f"检查API配置失败: {e}")
             return False
 
-    def start(self, foreground: bool = False, install_deps: bool = True, force: bool = False, monitor: bool = False):
+    def start(self, foreground: bool = False, install_deps: bool = True, force: bool = False, monitor: bool = False,
+              workers: int = 2):
         """启动应用"""
         # 检查API配置
         if not self._check_api_config():
@@ -415,6 +510,7 @@ class FastAPIManager:
         if self.is_running():
             self.print_success("应用已在运行")
             self.print_info("访问地址: http://localhost:914")
+            self.start_workers(workers)
             return True
 
         if self._is_port_in_use():
@@ -487,6 +583,10 @@ class FastAPIManager:
             "--port", "4190"
         ]
         
+        # 启动任务工作进程
+        if not self.start_workers(workers):
+            return False
+
         # 根据模式选择启动方式
         if foreground:
             # 在前台运行 uvicorn（阻塞当前进程），便于在终端直接停止
@@ -498,6 +598,8 @@ class FastAPIManager:
             except Exception as e:
                 self.print_error(f"启动失败: {e}")
                 return False
+            finally:
+                self.stop_workers()
 
         # 后台以子进程方式启动 uvicorn
         if platform.system() == "Windows":
@@ -551,6 +653,7 @@ class FastAPIManager:
                         self.pid_file.unlink(missing_ok=True)
                 except Exception:
                     pass
+                self.stop_workers()
 
                 if exit_code == 0:
                     self.print_success(f"进程正常退出 (PID={process.pid})")
@@ -573,6 +676,7 @@ class FastAPIManager:
             time.sleep(1)
         else:
             self.print_error(f"等待 {max_wait} 秒后服务仍未就绪")
+            self.stop_workers()
             return False
 
         if self.is_running():
@@ -586,12 +690,16 @@ class FastAPIManager:
             return True
         else:
             self.print_error("应用启动失败，请检查日志")
+            self.stop_workers()
             return False
     
     def stop(self):
         """停止应用"""
         self.print_info("正在停止应用...")
         
+        # 先停止工作进程，让其执行完当前任务
+        self.stop_workers()
+        
         # 步骤1: 尝试通过PID文件停止进程
         stopped_by_pid = False
         if self.pid_file.exists():
@@ -683,11 +791,11 @@ class FastAPIManager:
             self.print_success("应用已停止")
             return True
     
-    def restart(self):
+    def restart(self, workers: int = 2):
         """重启应用"""
         self.stop()
         time.sleep(2)
-        return self.start()
+        return self.start(workers=workers)
     
     def status(self):
         """查看应用状态"""
@@ -698,6 +806,11 @@ class FastAPIManager:
             self.print_info("访问地址: http://localhost:914")
         else:
             self.print_info("应用未运行")
+        workers = self.running_workers()
+        if workers:
+            self.print_info(f"工作进程: {len(workers)} 个 (PID: {', '.join(str(pid) for pid in workers)})")
+        else:
+            self.print_info("工作进程未运行")
     
     def show_usage(self):
         """显示使用说明"""
@@ -727,19 +840,22 @@ def main():
     monitor_group.add_argument('--monitor', dest='monitor', action='store_true', help='启动后在父进程中监控后端，后端退出时在控制台输出提示')
     monitor_group.add_argument('--no-monitor', dest='monitor', action='store_false', help='不在父进程中监控后端（后台模式）')
     parser.set_defaults(monitor=False)
+    parser.add_argument('--workers', type=int, default=int(os.getenv("WORKER_COUNT", "2")),
+                        help='任务工作进程数量（默认2，可通过环境变量 WORKER_COUNT 设置，0 表示不启动）')
     args = parser.parse_args()
 
     manager = FastAPIManager()
     command = args.command.lower()
 
     if command == 'start':
-        success = manager.start(foreground=args.foreground, install_deps=args.install_deps, force=args.force, monitor=args.monitor)
+        success = manager.start(foreground=args.foreground, install_deps=args.install_deps, force=args.force, monitor=args.monitor,
+                                workers=args.workers)
         sys.exit(0 if success else 1)
     elif command == "stop":
         success = manager.stop()
         sys.exit(0 if success else 1)
     elif command == "restart":
-        success = manager.restart()
+        success = manager.restart(workers=args.workers)
         sys.exit(0 if success else 1)
     elif command == "status":
         manager.status()